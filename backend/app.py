@@ -1,165 +1,141 @@
 import sys
 import os
 
-# CRITICAL FIX: Azure sets PYTHONPATH with /agents/python FIRST, causing old typing_extensions to be found
-# This MUST happen before ANY other imports, especially before groq/pydantic
-
-# Step 1: Fix PYTHONPATH environment variable immediately
-pythonpath = os.environ.get('PYTHONPATH', '')
-if '/agents/python' in pythonpath:
-    paths = pythonpath.split(':') if ':' in pythonpath else [pythonpath] if pythonpath else []
-    paths = [p for p in paths if '/agents/python' not in str(p)]
-    os.environ['PYTHONPATH'] = ':'.join(paths)
-
-# Step 2: Remove /agents/python from sys.path BEFORE Python processes it
-# This must be done immediately, before any imports
-original_path = sys.path[:]
-sys.path = [p for p in original_path if '/agents/python' not in str(p)]
-
-# Step 3: Ensure site-packages comes first
-import site
-# Get site-packages and move them to front of sys.path
-user_site = site.getusersitepackages()
-site_packages = site.getsitepackages()
-all_site_packages = []
-if site_packages:
-    all_site_packages.extend(site_packages)
-if user_site:
-    all_site_packages.append(user_site)
-
-# Find site-packages and move to front
-for sp in all_site_packages:
-    if os.path.exists(sp):
-        if sp in sys.path:
-            sys.path.remove(sp)
-        sys.path.insert(0, sp)
-
-# Step 4: Pre-import typing_extensions DIRECTLY from site-packages file system
-# We can't rely on find_spec because it finds /agents/python first
-# Instead, directly search for and load the file
-try:
-    import importlib.util
-    import importlib
-    
-    # Remove from modules if already loaded (wrong version)
-    if 'typing_extensions' in sys.modules:
-        del sys.modules['typing_extensions']
-    
-    # Directly search for typing_extensions in site-packages (not using find_spec)
-    typing_ext_file = None
-    typing_ext_package_dir = None
-    
-    # First, ensure we only search in actual site-packages, not /agents/python
-    for sp_path in sys.path:
-        sp_str = str(sp_path)
-        if '/agents/python' not in sp_str and 'site-packages' in sp_str:
-            # Check for package directory first (most common)
-            package_dir = os.path.join(sp_path, 'typing_extensions')
-            if os.path.isdir(package_dir):
-                init_file = os.path.join(package_dir, '__init__.py')
-                if os.path.exists(init_file):
-                    typing_ext_file = init_file
-                    typing_ext_package_dir = package_dir
-                    print(f"Found typing_extensions package at: {package_dir}")
-                    break
-            # Check for single file module
-            single_file = os.path.join(sp_path, 'typing_extensions.py')
-            if os.path.exists(single_file):
-                typing_ext_file = single_file
-                print(f"Found typing_extensions file at: {single_file}")
-                break
-    
-    if typing_ext_file:
-        # Load directly from file
-        spec = importlib.util.spec_from_file_location('typing_extensions', typing_ext_file)
-        if spec and spec.loader:
-            typing_ext = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(typing_ext)
-            sys.modules['typing_extensions'] = typing_ext
-            
-            # Verify Sentinel exists
-            if hasattr(typing_ext, 'Sentinel'):
-                print(f"✓ Successfully pre-loaded typing_extensions with Sentinel from: {typing_ext_file}")
-            else:
-                raise ImportError(f"typing_extensions loaded from {typing_ext_file} but Sentinel attribute not found")
-        else:
-            raise ImportError(f"Could not create spec for typing_extensions from {typing_ext_file}")
-    else:
-        # typing_extensions not found - install it now
-        print("WARNING: typing_extensions not found in site-packages, installing...")
-        import subprocess
-        result = subprocess.run(
-            [sys.executable, '-m', 'pip', 'install', '--no-cache-dir', '--upgrade', 'typing_extensions>=4.10,<5'],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        if result.returncode != 0:
-            print(f"pip install failed: {result.stderr}")
-            raise ImportError(f"Could not install typing_extensions: {result.stderr}")
-        
-        # Retry finding it after installation
-        for sp_path in sys.path:
-            sp_str = str(sp_path)
-            if '/agents/python' not in sp_str and 'site-packages' in sp_str:
-                package_dir = os.path.join(sp_path, 'typing_extensions')
-                init_file = os.path.join(package_dir, '__init__.py')
-                if os.path.exists(init_file):
-                    typing_ext_file = init_file
-                    spec = importlib.util.spec_from_file_location('typing_extensions', typing_ext_file)
-                    if spec and spec.loader:
-                        typing_ext = importlib.util.module_from_spec(spec)
-                        spec.loader.exec_module(typing_ext)
-                        sys.modules['typing_extensions'] = typing_ext
-                        if hasattr(typing_ext, 'Sentinel'):
-                            print(f"✓ Installed and loaded typing_extensions with Sentinel from: {typing_ext_file}")
-                            break
-        
-        # Final fallback: normal import
-        if 'typing_extensions' not in sys.modules or not hasattr(sys.modules['typing_extensions'], 'Sentinel'):
-            sys.path = [p for p in sys.path if '/agents/python' not in str(p)]
-            import typing_extensions
-            if not hasattr(typing_extensions, 'Sentinel'):
-                raise ImportError("Sentinel not found in typing_extensions after installation")
-            # Check it didn't come from /agents/python
-            typing_ext_location = getattr(typing_extensions, '__file__', '')
-            if '/agents/python' in str(typing_ext_location):
-                raise ImportError(f"typing_extensions still loading from wrong location: {typing_ext_location}")
-            print(f"✓ Successfully imported typing_extensions with Sentinel from: {typing_ext_location}")
-        
-except Exception as e:
-    print(f"✗ ERROR loading typing_extensions: {e}")
-    print(f"  PYTHONPATH: {os.environ.get('PYTHONPATH', 'not set')}")
-    print(f"  sys.path (first 10): {sys.path[:10]}")
-    # List all site-packages directories and what's in them
-    for sp in sys.path:
-        if 'site-packages' in str(sp):
-            print(f"  Site-packages path: {sp}")
-            if os.path.exists(sp):
-                try:
-                    contents = os.listdir(sp)
-                    typing_related = [c for c in contents if 'typing' in c.lower()]
-                    if typing_related:
-                        print(f"    Found typing-related: {typing_related}")
-                except:
-                    pass
-    raise
-
-from flask import Flask, request, jsonify
+# The environment (typing_extensions, no /agents/python on the path, dependency versions) is
+# validated once by check_environment.py at build time and before gunicorn starts - not here.
+
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 import requests
+from requests.adapters import HTTPAdapter
 import time
-from typing import List, Dict, Any, Tuple, Optional
-from collections import Counter
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Tuple, Optional, Callable, FrozenSet, NamedTuple, Iterable, Iterator, Awaitable, AsyncIterator
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
 from threading import Lock
 from dotenv import load_dotenv
-from groq import Groq
 from flask_cors import CORS
+import hashlib
+import heapq
+import itertools
 import math
+import numpy as np
+import random
 import re
+import json
+import queue
+import socket
+import sqlite3
+import tempfile
+import threading
+import asyncio
+import atexit
+import contextvars
+import copy
+import logging
+import uuid
+from array import array
+from logging.handlers import QueueHandler, QueueListener
+from catalog import LocalCatalog, normalize_title
+import prometheus_client as prometheus
+from prometheus_client import multiprocess
+from urllib.parse import urlsplit
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait, TimeoutError as FutureTimeoutError
+try:
+    import fcntl
+except ImportError:  # Windows - no flock, so every worker runs its own cache warmer
+    fcntl = None
 
 load_dotenv()
 
+# Structured logging. Request threads only put records on a bounded queue; a background listener
+# thread formats and writes them, so log I/O never sits on the request path.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' or 'text'
+LOG_QUEUE_MAX = int(os.environ.get('LOG_QUEUE_MAX', 10000))  # Records dropped (and counted) beyond this
+LOG_MAX_MESSAGE_CHARS = int(os.environ.get('LOG_MAX_MESSAGE_CHARS', 1000))  # Longer messages are truncated
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))  # Share of per-candidate events kept
+
+LOG_RECORDS_DROPPED = prometheus.Counter('bookrec_log_records_dropped_total', 'Log records dropped on a full queue')
+
+# Correlation id of the request being served; copied into pool threads by submit_in_context
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+class RequestContextFilter(logging.Filter):
+    """Stamps each record with the current request id, on the thread that logged it"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra={'fields': {...}} adds event-specific keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class BoundedQueueHandler(QueueHandler):
+    """Hands records to the listener without blocking: long messages are truncated and records
+    are dropped, not waited on, when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        if len(message) > LOG_MAX_MESSAGE_CHARS:
+            message = f"{message[:LOG_MAX_MESSAGE_CHARS]}... [{len(message) - LOG_MAX_MESSAGE_CHARS} chars truncated]"
+        if record.exc_info and not record.exc_text:
+            # Tracebacks hold frames that must not outlive this thread's stack
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg, record.args, record.exc_info = message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+def configure_logging() -> QueueListener:
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(
+            logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+        )
+    queue_handler = BoundedQueueHandler(queue.Queue(LOG_QUEUE_MAX))
+    queue_handler.addFilter(RequestContextFilter())
+
+    app_logger = logging.getLogger('bookrec')
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+    listener = QueueListener(queue_handler.queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)  # Flushes whatever is still queued
+    return listener
+
+log_listener = configure_logging()
+logger = logging.getLogger('bookrec')
+
+def log_sampled(level: int, message: str, *args):
+    """Log a high-volume (per-candidate) event for roughly LOG_SAMPLE_RATE of calls"""
+    if random.random() < LOG_SAMPLE_RATE and logger.isEnabledFor(level):
+        logger.log(level, message, *args, extra={'fields': {'sample_rate': LOG_SAMPLE_RATE}})
+
+def submit_in_context(executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs):
+    """executor.submit that runs fn with the caller's context variables, so its logs keep the request id"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
 app = Flask(__name__)
 
 # Configure CORS - ALLOW ALL ROUTES to ensure it works
@@ -174,6 +150,23 @@ CORS(app,
      supports_credentials=True,  # Match Azure Portal setting
      max_age=3600)
 
+@app.before_request
+def start_request():
+    """Start the latency timer and bind a correlation id (the caller's X-Request-ID if it sent one)"""
+    g.request_started = time.perf_counter()
+    g.request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+    g.request_id_token = request_id_var.set(g.request_id)
+
+@app.teardown_request
+def end_request(exc):
+    token = g.get('request_id_token')
+    if token is not None:
+        try:
+            request_id_var.reset(token)
+        except ValueError:
+            # Torn down from another context (e.g. after a streamed response); just unbind
+            request_id_var.set('-')
+
 # CRITICAL: Add before_request handler to ensure OPTIONS requests are handled
 @app.before_request
 def handle_preflight():
@@ -197,20 +190,179 @@ def after_request(response):
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization'
     response.headers['Access-Control-Allow-Credentials'] = 'true'  # Match Azure Portal
     response.headers['Access-Control-Max-Age'] = '3600'
+    if g.get('request_id'):
+        response.headers['X-Request-ID'] = g.request_id
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - started)
     return response
 
 if not os.environ.get("GROQ_API_KEY"):
-    print("Warning: GROQ_API_KEY not found in environment variables")
+    logger.warning("GROQ_API_KEY not found in environment variables")
 
-OPEN_LIBRARY_SEARCH = "https://openlibrary.org/search.json"
-OPEN_LIBRARY_WORKS = "https://openlibrary.org/works/"
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Upstream base URLs - overridable so the load test (see loadtest/) can point at local stand-ins
+OPENLIBRARY_BASE_URL = os.environ.get('OPENLIBRARY_BASE_URL', 'https://openlibrary.org').rstrip('/')
+GROQ_BASE_URL = os.environ.get('GROQ_BASE_URL', 'https://api.groq.com').rstrip('/')
+OPEN_LIBRARY_SEARCH = f"{OPENLIBRARY_BASE_URL}/search.json"
+OPEN_LIBRARY_WORKS = f"{OPENLIBRARY_BASE_URL}/works/"
+GROQ_API_URL = f"{GROQ_BASE_URL}/openai/v1/chat/completions"
 
 # Timeout configurations
 GROQ_TIMEOUT = 900  # 15 minutes
 OPENLIB_TIMEOUT = 240  # 6 minutes
+OPENLIB_CONNECT_TIMEOUT = 5
 MAX_RETRIES = 5
 
+# Groq quota and request scheduling
+LLM_REQUESTS_PER_DAY = 14400
+LLM_TOKENS_PER_MINUTE = 20000
+LLM_QUEUE_MAX = int(os.environ.get('LLM_QUEUE_MAX', 64))  # Callers allowed to wait for capacity
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 10))  # Seconds a caller waits before falling back
+LLM_ASYNC_POLL_INTERVAL = 0.05  # Seconds between queue checks for an async caller that isn't first in line
+PRIORITY_PAGE = 0  # Content for the page being returned
+PRIORITY_PREFETCH = 10  # Speculative/background generation
+
+# OpenLibrary client behaviour
+OPENLIB_POOL_SIZE = int(os.environ.get('OPENLIB_POOL_SIZE', 32))  # Keep-alive connections per worker
+OPENLIB_ASYNC_MAX_CONNECTIONS = int(os.environ.get('OPENLIB_ASYNC_MAX_CONNECTIONS', 100))  # Per async worker, all requests
+OPENLIB_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+OPENLIB_BACKOFF_BASE = 0.5  # Seconds, doubled per attempt with full jitter
+OPENLIB_BACKOFF_MAX = 8
+OPENLIB_NOT_FOUND_TTL = 600  # Remember 404s for 10 minutes
+OPENLIB_BREAKER_THRESHOLD = 5  # Consecutive failures before failing fast
+OPENLIB_BREAKER_RESET = 30  # Seconds before letting a trial request through
+
+# Request coalescing - concurrent identical upstream calls share one in-flight fetch
+COALESCE_OPENLIB_WAIT = float(os.environ.get('COALESCE_OPENLIB_WAIT', 30))  # Seconds a duplicate caller waits
+COALESCE_LLM_WAIT = float(os.environ.get('COALESCE_LLM_WAIT', 60))
+
+# Candidate generation
+CANDIDATE_SUBJECTS = 10  # Most common input subjects to search
+CANDIDATES_PER_SUBJECT = 20
+# Concurrent OpenLibrary calls fetching candidates - shared by every request in a worker process on
+# the thread pool, per request on the event loop
+CANDIDATE_FETCH_WORKERS = int(os.environ.get('CANDIDATE_FETCH_WORKERS', 8))
+
+# Cache configuration - the SQLite file is shared by every gunicorn worker on the instance
+# Local catalog built from the OpenLibrary dumps (see catalog.py); offline mode never calls the live API
+LOCAL_CATALOG_PATH = os.environ.get('LOCAL_CATALOG_PATH')
+OPENLIBRARY_OFFLINE = os.environ.get('OPENLIBRARY_OFFLINE', 'false').lower() == 'true'
+
+# In-memory inverted subject index over the local catalog, for top-k retrieval across every work
+SUBJECT_INDEX_ENABLED = os.environ.get('SUBJECT_INDEX_ENABLED', 'true').lower() == 'true'
+SUBJECT_INDEX_TOP_K = int(os.environ.get('SUBJECT_INDEX_TOP_K', 200))  # Candidates kept per result snapshot
+
+# Local title -> work index, so input titles (typos and variants included) resolve without a search call
+TITLE_INDEX_ENABLED = os.environ.get('TITLE_INDEX_ENABLED', 'true').lower() == 'true'
+TITLE_INDEX_MAX_ENTRIES = int(os.environ.get('TITLE_INDEX_MAX_ENTRIES', 200000))  # Titles held in memory per worker
+TITLE_INDEX_CATALOG_ENTRIES = int(os.environ.get('TITLE_INDEX_CATALOG_ENTRIES', 100000))  # Most-published catalog works preloaded
+TITLE_INDEX_MIN_SIMILARITY = float(os.environ.get('TITLE_INDEX_MIN_SIMILARITY', 0.75))  # Trigram similarity a fuzzy match needs
+TITLE_INDEX_MIN_MARGIN = float(os.environ.get('TITLE_INDEX_MIN_MARGIN', 0.1))  # Lead over the runner-up work a fuzzy match needs
+TITLE_INDEX_TTL = int(os.environ.get('TITLE_INDEX_TTL', 30 * 24 * 3600))  # Seconds a stored resolution is trusted
+
+CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', os.path.join(tempfile.gettempdir(), 'book_recommender_cache.sqlite3'))
+WORK_CACHE_MAX_ENTRIES = int(os.environ.get('WORK_CACHE_MAX_ENTRIES', 5000))  # In-process LRU size
+WORK_CACHE_DISK_MAX_ENTRIES = int(os.environ.get('WORK_CACHE_DISK_MAX_ENTRIES', 200000))
+WORK_CACHE_TTL = int(os.environ.get('WORK_CACHE_TTL', 7 * 24 * 3600))  # 1 week
+
+# OpenLibrary search responses (title lookups and subject searches) - these change far less often than the TTL
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 500))  # In-process LRU size
+SEARCH_CACHE_DISK_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_DISK_MAX_ENTRIES', 20000))
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 24 * 3600))  # 1 day
+
+# Subject intern table - persisted so normalization is warm after a restart
+SUBJECT_TABLE_PATH = os.environ.get('SUBJECT_TABLE_PATH', os.path.join(tempfile.gettempdir(), 'book_recommender_subjects.json'))
+SUBJECT_TABLE_MAX_ENTRIES = int(os.environ.get('SUBJECT_TABLE_MAX_ENTRIES', 100000))
+SUBJECT_TABLE_SAVE_INTERVAL = 2000  # New subjects between background saves
+
+# Scored result snapshots, served for later pages and filter changes
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 100))  # In-process snapshots
+RESULT_CACHE_DISK_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_DISK_MAX_ENTRIES', 2000))
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 30 * 60))  # 30 minutes
+RESULT_SNAPSHOT_VERSION = 2  # Part of the result token - bump whenever the snapshot layout changes
+RESULT_SNAPSHOT_SIZE = int(os.environ.get('RESULT_SNAPSHOT_SIZE', 200))  # Ranked candidates kept per snapshot
+SCORE_BATCH_SIZE = 256  # Candidates per vectorized scoring call
+# Work fields kept in the snapshot for decorating a page without re-fetching it
+DECORATION_DETAIL_FIELDS = ('key', 'title', 'subjects', 'first_publish_date', 'author_name', 'component_scores')
+
+# Generated text cache - bump a prompt version whenever its prompt changes
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 2000))
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_DISK_MAX_ENTRIES', 100000))
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 30 * 24 * 3600))  # 30 days
+EXPLANATION_PROMPT_VERSION = 'v1'
+WHY_READ_PROMPT_VERSION = 'v1'
+PAGE_PROMPT_VERSION = 'v1'  # Batched page prompt - its texts are cached under their own keys
+
+# AI enrichment of the current page
+AI_ENRICHMENT_WORKERS = int(os.environ.get('AI_ENRICHMENT_WORKERS', 8))  # Concurrent LLM generations per worker process
+AI_PAGE_DEADLINE = float(os.environ.get('AI_PAGE_DEADLINE', 30))  # Seconds before falling back to template text
+AI_BATCH_MODE = os.environ.get('AI_BATCH_MODE', 'true').lower() == 'true'  # One Groq call per page instead of two per book
+AI_BATCH_TOKENS_PER_FIELD = 300  # Completion budget per requested explanation/why_read
+
+# Startup - heavy clients are created lazily; warm-up builds them in the background right after import
+STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', 'true').lower() == 'true'  # /ready waits for it when on
+
+# Job API - recommendation runs decoupled from the HTTP request that started them (see /api/jobs)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))  # Jobs running at once per worker process
+JOB_QUEUE_MAX = int(os.environ.get('JOB_QUEUE_MAX', 32))  # Jobs waiting for a slot before submissions get a 503
+JOB_TTL = int(os.environ.get('JOB_TTL', 3600))  # Seconds a job's state and result are kept after its last update
+JOB_DISK_MAX_ENTRIES = int(os.environ.get('JOB_DISK_MAX_ENTRIES', 10000))
+JOB_MEMORY_MAX_ENTRIES = 1000  # Only used when there is no shared cache database
+JOB_POLL_INTERVAL = 0.5  # Seconds between state checks in /api/jobs/<id>/events
+JOB_EVENTS_MAX_SECONDS = int(os.environ.get('JOB_EVENTS_MAX_SECONDS', 60))  # Longest events stream before a reconnect
+# Events streams Flask threads hold open at once per worker (the async server streams them on the
+# event loop instead); keep it below the thread count so streams can't starve other requests
+JOB_EVENTS_MAX_STREAMS = int(os.environ.get('JOB_EVENTS_MAX_STREAMS', 1))
+JOB_SAVE_INTERVAL = 1.0  # Seconds between saves of a running job's partial AI text
+JOB_HEARTBEAT_INTERVAL = 5  # Seconds between heartbeats on this worker's unfinished jobs
+JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 60))  # Seconds without a heartbeat before a job counts as lost
+
+# Background cache warmer - one worker per instance (whichever holds the lock file) re-warms the
+# caches for the most requested titles and subjects, plus an optional seed list
+WARMER_ENABLED = os.environ.get('WARMER_ENABLED', 'true').lower() == 'true'
+WARMER_INTERVAL = int(os.environ.get('WARMER_INTERVAL', 900))  # Seconds between warming cycles
+WARMER_INITIAL_DELAY = int(os.environ.get('WARMER_INITIAL_DELAY', 60))  # Let startup and the first requests go first
+WARMER_LOCK_PATH = os.environ.get('WARMER_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'book_recommender_warmer.lock'))
+WARMER_SEED_PATH = os.environ.get('WARMER_SEED_PATH')  # JSON file: {"titles": [...], "subjects": [...]}
+WARMER_TOP_TITLES = int(os.environ.get('WARMER_TOP_TITLES', 20))  # Most requested titles warmed per cycle
+WARMER_TOP_SUBJECTS = int(os.environ.get('WARMER_TOP_SUBJECTS', 20))  # Most searched subjects warmed per cycle
+WARMER_HISTORY_WINDOW = int(os.environ.get('WARMER_HISTORY_WINDOW', 7 * 24 * 3600))  # Requests older than a week are forgotten
+WARMER_OPENLIB_RATE = float(os.environ.get('WARMER_OPENLIB_RATE', 1.0))  # Warmer's own OpenLibrary calls per second
+WARMER_LLM_PER_CYCLE = int(os.environ.get('WARMER_LLM_PER_CYCLE', 20))  # why_read texts generated per cycle
+WARMER_LLM_IDLE_SHARE = 0.5  # Only generate while at least this share of both Groq quotas is unused
+WARMER_REFRESH_SHARE = float(os.environ.get('WARMER_REFRESH_SHARE', 0.25))  # Re-fetch cached entries with less of their TTL left
+
+# Prometheus metrics. With PROMETHEUS_MULTIPROC_DIR set (startup.sh does) every gunicorn worker
+# writes its samples to shared files and /metrics aggregates them; otherwise they are per-process.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+REQUEST_SECONDS = prometheus.Histogram(
+    'bookrec_request_seconds', 'Time to produce a response (to the first byte for streams)',
+    ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+STAGE_SECONDS = prometheus.Histogram(
+    'bookrec_stage_seconds', 'Time spent in each recommendation stage', ['stage'], buckets=LATENCY_BUCKETS)
+UPSTREAM_REQUESTS = prometheus.Counter(
+    'bookrec_upstream_requests_total', 'Calls to OpenLibrary and Groq by outcome', ['host', 'status'])
+UPSTREAM_RETRIES = prometheus.Counter(
+    'bookrec_upstream_retries_total', 'Upstream calls retried after a failed attempt', ['host', 'status'])
+UPSTREAM_SECONDS = prometheus.Histogram(
+    'bookrec_upstream_request_seconds', 'Upstream call latency', ['host'], buckets=LATENCY_BUCKETS)
+LLM_SCHEDULER_REJECTIONS = prometheus.Counter(
+    'bookrec_llm_scheduler_rejections_total', 'Groq calls refused by the local scheduler', ['reason'])
+LLM_SCHEDULER_THROTTLES = prometheus.Counter(
+    'bookrec_llm_scheduler_throttles_total', 'Groq 429s that drained the local token budget')
+# Hit ratio per cache is sum(rate(..{result=~".*_hit"})) / sum(rate(..)) by cache
+COALESCED_CALLS = prometheus.Counter(
+    'bookrec_coalesced_calls_total', 'Coalesced upstream calls by result (leader, shared, timeout)', ['kind', 'result'])
+JOBS = prometheus.Counter('bookrec_jobs_total', 'Recommendation jobs by outcome', ['status'])
+WARMER_ACTIONS = prometheus.Counter(
+    'bookrec_warmer_actions_total', 'Background cache warmer work by action', ['action'])
+CACHE_LOOKUPS = prometheus.Counter(
+    'bookrec_cache_lookups_total', 'Cache lookups by tier that answered', ['cache', 'result'])
+
+def upstream_host(url: str) -> str:
+    return urlsplit(url).netloc or 'unknown'
+
 
 @app.route('/')
 def home():
@@ -226,58 +378,1190 @@ def api_test():
     return jsonify({"status": "ok", "message": "API routes are working", "method": request.method})
 
 
-class RateLimiter:
+class TokenBucket:
+    """Continuously refilling token bucket. Not thread-safe on its own - LocalQuota holds the lock."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.rate = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount tokens are available (0 if they already are)"""
+        self.refill(now)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def adjust(self, amount: float):
+        # May go negative - a request that used more than estimated leaves a debt to refill
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+def shared_db_connection(local: threading.local, db_path: str) -> sqlite3.Connection:
+    """Connection to the shared cache database, one per thread (and per process, since connections must not cross a fork)"""
+    conn = getattr(local, 'conn', None)
+    if conn is None or getattr(local, 'pid', None) != os.getpid():
+        conn = sqlite3.connect(db_path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
+
+class LocalQuota:
+    """Groq requests/day and tokens/minute buckets for this process alone"""
+
     def __init__(self, requests_per_day: int, tokens_per_minute: int):
-        self.daily_limit = requests_per_day
-        self.minute_limit = tokens_per_minute
-        self.daily_requests = 0
-        self.minute_tokens = 0
-        self.last_reset = datetime.now()
-        self.minute_reset = datetime.now()
+        self.request_bucket = TokenBucket(requests_per_day, requests_per_day / 86400)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self._lock = Lock()
+
+    def take(self, estimated_tokens: float) -> float:
+        """Take a request and the tokens if both are available (returns 0), else the seconds until they will be"""
+        with self._lock:
+            now = time.monotonic()
+            wait_for = max(self.request_bucket.wait_time(1, now), self.token_bucket.wait_time(estimated_tokens, now))
+            if wait_for <= 0:
+                self.request_bucket.take(1)
+                self.token_bucket.take(estimated_tokens)
+            return wait_for
+
+    def adjust(self, tokens: float):
+        with self._lock:
+            self.token_bucket.refill(time.monotonic())
+            self.token_bucket.adjust(tokens)
+
+    def drain(self, seconds: float = 0):
+        """Empty the minute budget, leaving it short for another seconds of refill"""
+        with self._lock:
+            self.token_bucket.refill(time.monotonic())
+            self.token_bucket.tokens = min(self.token_bucket.tokens, -seconds * self.token_bucket.rate)
+
+    def levels(self) -> Tuple[float, float]:
+        """(tokens available, requests available)"""
+        with self._lock:
+            now = time.monotonic()
+            self.token_bucket.refill(now)
+            self.request_bucket.refill(now)
+            return self.token_bucket.tokens, self.request_bucket.tokens
+
+class SharedQuota:
+    """LocalQuota's buckets kept in the shared cache database, so all workers on the instance draw on one
+    Groq quota instead of each assuming it has the whole of it.
+
+    Every change refills and updates the buckets in a single IMMEDIATE transaction; levels() only
+    reads. If the database fails, the worker carries on with a per-process LocalQuota.
+    """
+
+    def __init__(self, db_path: str, requests_per_day: int, tokens_per_minute: int):
+        self.db_path = db_path
+        self.capacity = {'requests': float(requests_per_day), 'tokens': float(tokens_per_minute)}
+        self.rate = {'requests': requests_per_day / 86400, 'tokens': tokens_per_minute / 60}
+        self.fallback = LocalQuota(requests_per_day, tokens_per_minute)
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS llm_quota (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )""")
+
+    def _connect(self) -> sqlite3.Connection:
+        return shared_db_connection(self._local, self.db_path)
+
+    def _read(self, conn: sqlite3.Connection, now: float) -> Dict[str, float]:
+        """Both bucket levels refilled to now"""
+        levels = dict(self.capacity)  # A missing row starts full
+        for name, tokens, updated in conn.execute("SELECT name, tokens, updated FROM llm_quota"):
+            if name in levels:
+                levels[name] = min(self.capacity[name], tokens + max(0.0, now - updated) * self.rate[name])
+        return levels
+
+    def _update(self, change: Callable[[Dict[str, float]], Any]) -> Any:
+        """Refill both buckets to now, let change edit the levels in place, and write them back"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = self._read(conn, now)
+            result = change(levels)
+            conn.executemany("INSERT OR REPLACE INTO llm_quota (name, tokens, updated) VALUES (?, ?, ?)",
+                             [(name, tokens, now) for name, tokens in levels.items()])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+
+    def _wait_time(self, levels: Dict[str, float], name: str, amount: float) -> float:
+        return 0.0 if levels[name] >= amount else (amount - levels[name]) / self.rate[name]
+
+    def take(self, estimated_tokens: float) -> float:
+        def take(levels):
+            wait_for = max(self._wait_time(levels, 'requests', 1), self._wait_time(levels, 'tokens', estimated_tokens))
+            if wait_for <= 0:
+                levels['requests'] -= 1
+                levels['tokens'] -= estimated_tokens
+            return wait_for
+        try:
+            return self._update(take)
+        except sqlite3.Error as e:
+            log_sampled(logging.WARNING, "Shared Groq quota unavailable, using this worker's: %s", e)
+            return self.fallback.take(estimated_tokens)
+
+    def adjust(self, tokens: float):
+        def adjust(levels):
+            # May go negative - a request that used more than estimated leaves a debt to refill
+            levels['tokens'] = min(self.capacity['tokens'], levels['tokens'] + tokens)
+        try:
+            self._update(adjust)
+        except sqlite3.Error as e:
+            log_sampled(logging.WARNING, "Shared Groq quota unavailable, using this worker's: %s", e)
+            self.fallback.adjust(tokens)
+
+    def drain(self, seconds: float = 0):
+        def drain(levels):
+            levels['tokens'] = min(levels['tokens'], -seconds * self.rate['tokens'])
+        try:
+            self._update(drain)
+        except sqlite3.Error as e:
+            log_sampled(logging.WARNING, "Shared Groq quota unavailable, using this worker's: %s", e)
+            self.fallback.drain(seconds)
+
+    def levels(self) -> Tuple[float, float]:
+        try:
+            # A plain read - WAL lets it run alongside a writer without taking the write lock
+            levels = self._read(self._connect(), time.time())
+            return levels['tokens'], levels['requests']
+        except sqlite3.Error as e:
+            log_sampled(logging.WARNING, "Shared Groq quota unavailable, using this worker's: %s", e)
+            return self.fallback.levels()
+
+class LLMScheduler:
+    """Priority-aware admission control for Groq requests.
+
+    Requests/day and tokens/minute quotas are smooth token buckets, shared by every worker on the
+    instance when there is a cache database (SharedQuota). Callers - blocking and async alike -
+    queue (bounded) by priority, then arrival order, and wait up to a timeout for capacity instead
+    of failing immediately. Token reservations are reconciled with the usage Groq reports.
+
+    The condition only guards the queue; quota calls (SQLite when shared) happen outside it, so a
+    slow database never holds up callers joining or leaving the queue.
+    """
+
+    def __init__(self, requests_per_day: int, tokens_per_minute: int, max_waiters: int = LLM_QUEUE_MAX,
+                 db_path: Optional[str] = None):
+        self.request_capacity = requests_per_day
+        self.token_capacity = tokens_per_minute
+        self.quota = LocalQuota(requests_per_day, tokens_per_minute)
+        if db_path:
+            try:
+                self.quota = SharedQuota(db_path, requests_per_day, tokens_per_minute)
+            except sqlite3.Error as e:
+                logger.warning("Groq quota is per worker, could not open %s: %s", db_path, e)
+        self.max_waiters = max_waiters
+        self.condition = threading.Condition()
+        self.waiters = []  # Heap of (priority, sequence) tickets, blocking and async callers alike
+        self.sequence = itertools.count()
+        self.stats = Counter()
+
+    def _enqueue(self, priority: int) -> Optional[Tuple[int, int]]:
+        """A ticket in the queue, or None if it is full. Caller holds the condition."""
+        if len(self.waiters) >= self.max_waiters:
+            self.stats['rejected_queue_full'] += 1
+            LLM_SCHEDULER_REJECTIONS.labels('queue_full').inc()
+            return None
+        ticket = (priority, next(self.sequence))
+        heapq.heappush(self.waiters, ticket)
+        return ticket
+
+    def _leave(self, ticket: Tuple[int, int]):
+        self.waiters.remove(ticket)
+        heapq.heapify(self.waiters)
+        self.condition.notify_all()
+
+    def _granted(self):
+        with self.condition:
+            self.stats['granted'] += 1
+
+    def _timed_out(self):
+        with self.condition:
+            self.stats['rejected_timeout'] += 1
+        LLM_SCHEDULER_REJECTIONS.labels('timeout').inc()
+
+    def acquire(self, estimated_tokens: int, priority: int = PRIORITY_PAGE,
+                timeout: float = LLM_QUEUE_TIMEOUT) -> bool:
+        """Wait for quota; returns False if the queue is full or capacity doesn't free up in time"""
+        # A reservation larger than the bucket could never be granted
+        estimated_tokens = min(estimated_tokens, self.token_capacity)
+        deadline = time.monotonic() + timeout
+
+        with self.condition:
+            ticket = self._enqueue(priority)
+            if ticket is None:
+                return False
+        try:
+            while True:
+                with self.condition:
+                    # Only the head of the queue takes quota; everyone else waits for the queue to move
+                    while self.waiters[0] != ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+                    first = self.waiters[0] == ticket
+                wait_for = self.quota.take(estimated_tokens) if first else None
+                if wait_for is not None and wait_for <= 0:
+                    self._granted()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timed_out()
+                    return False
+                with self.condition:
+                    # Woken early by a reconcile that returned tokens
+                    self.condition.wait(min(remaining, wait_for))
+        finally:
+            with self.condition:
+                self._leave(ticket)
+
+    async def acquire_async(self, estimated_tokens: int, priority: int = PRIORITY_PAGE,
+                            timeout: float = LLM_QUEUE_TIMEOUT) -> bool:
+        """acquire for the event loop: holds a place in the same priority queue, but polls and sleeps
+        instead of blocking on the condition. Quota checks (SQLite when shared) run off the loop."""
+        estimated_tokens = min(estimated_tokens, self.token_capacity)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            ticket = self._enqueue(priority)
+            if ticket is None:
+                return False
+        try:
+            while True:
+                with self.condition:
+                    first = self.waiters[0] == ticket
+                wait_for = await asyncio.to_thread(self.quota.take, estimated_tokens) if first else None
+                if wait_for is not None and wait_for <= 0:
+                    self._granted()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timed_out()
+                    return False
+                await asyncio.sleep(min(remaining, wait_for if wait_for is not None else LLM_ASYNC_POLL_INTERVAL))
+        finally:
+            with self.condition:
+                self._leave(ticket)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """Correct a reservation once Groq reports the tokens the request really used"""
+        estimated_tokens = min(estimated_tokens, self.token_capacity)
+        self.quota.adjust(estimated_tokens - actual_tokens)
+        with self.condition:
+            self.stats['reconciled'] += 1
+            self.condition.notify_all()
+
+    def throttle(self, retry_after: Optional[str] = None):
+        """Groq said 429 - drain the minute budget (for Retry-After seconds more, when sent) so queued
+        callers, retries included, back off until it refills"""
+        try:
+            seconds = max(0.0, float(retry_after)) if retry_after else 0.0
+        except ValueError:
+            seconds = 0.0
+        self.quota.drain(seconds)
+        with self.condition:
+            self.stats['throttled'] += 1
+        LLM_SCHEDULER_THROTTLES.inc()
+
+    def is_idle(self, share: float) -> bool:
+        """True when no caller is queued and at least share of both quotas is unused - background work may go"""
+        with self.condition:
+            if self.waiters:
+                return False
+        tokens, requests = self.quota.levels()
+        return tokens >= share * self.token_capacity and requests >= share * self.request_capacity
+
+    def get_stats(self) -> Dict[str, Any]:
+        tokens, requests = self.quota.levels()
+        with self.condition:
+            stats = dict(self.stats)
+            stats.update({
+                'waiting': len(self.waiters),
+                'shared_quota': isinstance(self.quota, SharedQuota),
+                'tokens_available': round(tokens),
+                'requests_available': round(requests)
+            })
+        return stats
+
+class TieredCache:
+    """In-process LRU cache backed by a SQLite (WAL) store shared across gunicorn workers"""
+
+    PRUNE_INTERVAL = 500  # Writes between disk clean-ups
+
+    def __init__(self, namespace: str, max_entries: int, ttl_seconds: float,
+                 db_path: Optional[str] = None, disk_max_entries: Optional[int] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.db_path = db_path
+        self.disk_max_entries = disk_max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = Lock()
+        self._local = threading.local()
+        self._writes_since_prune = 0
+        self.stats = Counter()
+        self.lookups = {result: CACHE_LOOKUPS.labels(namespace, result) for result in ('memory_hit', 'disk_hit', 'miss')}
+
+        if self.db_path:
+            try:
+                conn = self._connect()
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS cache_entries (
+                        namespace TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        PRIMARY KEY (namespace, key)
+                    )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expiry ON cache_entries (namespace, expires_at)")
+            except sqlite3.Error as e:
+                logger.warning("%s cache running memory-only, could not open %s: %s", namespace, self.db_path, e)
+                self.db_path = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return shared_db_connection(self._local, self.db_path)
+
+    def _count(self, *names: str):
+        with self._lock:
+            for name in names:
+                self.stats[name] += 1
+
+    def _remember(self, key: str, value: Any, expires_at: float):
+        if self.max_entries <= 0:
+            return  # Memory tier disabled - every read goes to the shared store
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self.stats['memory_hits'] += 1
+                    self.lookups['memory_hit'].inc()
+                    return entry[1]
+                del self._entries[key]
+                self.stats['expirations'] += 1
+
+        if self.db_path:
+            try:
+                row = self._connect().execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self._count('hits', 'disk_hits')
+                    self.lookups['disk_hit'].inc()
+                    return value
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning("Cache read error (%s): %s", self.namespace, e)
+                self._count('disk_errors')
+
+        self._count('misses')
+        self.lookups['miss'].inc()
+        return None
+
+    def peek(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, seconds until it expires) for a live entry, else None.
+
+        Unlike get this is not a lookup: it leaves the stats, metrics and LRU order alone.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1], entry[0] - now
+        if self.db_path:
+            try:
+                row = self._connect().execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row and row[1] > now:
+                    return json.loads(row[0]), row[1] - now
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning("Cache read error (%s): %s", self.namespace, e)
+                self._count('disk_errors')
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a JSON-serializable value in memory and in the shared store"""
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        self._remember(key, value, expires_at)
+        self._count('sets')
+
+        if self.db_path:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), expires_at)
+                )
+                with self._lock:
+                    self._writes_since_prune += 1
+                    should_prune = self._writes_since_prune >= self.PRUNE_INTERVAL
+                    if should_prune:
+                        self._writes_since_prune = 0
+                if should_prune:
+                    self._prune_disk(conn)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning("Cache write error (%s): %s", self.namespace, e)
+                self._count('disk_errors')
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.db_path:
+            try:
+                self._connect().execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+                )
+            except sqlite3.Error as e:
+                logger.warning("Cache delete error (%s): %s", self.namespace, e)
+                self._count('disk_errors')
+
+    def _prune_disk(self, conn: sqlite3.Connection):
+        """Drop expired rows and keep the shared store under its size limit"""
+        expired = conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time())
+        ).rowcount
+        evicted = 0
+        if self.disk_max_entries:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+            if total > self.disk_max_entries:
+                # Entries closest to expiry are the oldest ones
+                evicted = conn.execute("""
+                    DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                        SELECT key FROM cache_entries WHERE namespace = ? ORDER BY expires_at LIMIT ?
+                    )""", (self.namespace, self.namespace, total - self.disk_max_entries)).rowcount
+        with self._lock:
+            self.stats['disk_expirations'] += max(expired, 0)
+            self.stats['disk_evictions'] += max(evicted, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_ratio'] = round(stats.get('hits', 0) / lookups, 4) if lookups else 0.0
+        return stats
+
+class RequestHistory:
+    """How often each title is requested and each subject searched, for the cache warmer.
+
+    Counts live in the shared cache database so the one worker that warms sees every worker's
+    traffic. Without a database they are per-process. Entries not seen within the window are dropped.
+    """
+
+    def __init__(self, db_path: Optional[str], window_seconds: float):
+        self.db_path = db_path
+        self.window = window_seconds
+        self._counts = {}  # (kind, value) -> [count, last_seen], memory-only mode
+        self._lock = Lock()
+        self._local = threading.local()
+        if self.db_path:
+            try:
+                self._connect().execute("""
+                    CREATE TABLE IF NOT EXISTS request_history (
+                        kind TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        count INTEGER NOT NULL,
+                        last_seen REAL NOT NULL,
+                        PRIMARY KEY (kind, value)
+                    )""")
+            except sqlite3.Error as e:
+                logger.warning("Request history running memory-only, could not open %s: %s", self.db_path, e)
+                self.db_path = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return shared_db_connection(self._local, self.db_path)
+
+    def record(self, kind: str, values: Iterable[str]):
+        """Count one request for each value ('title' or 'subject')"""
+        now = time.time()
+        values = {value.strip() for value in values if isinstance(value, str) and value.strip()}
+        if not values:
+            return
+        if self.db_path:
+            try:
+                self._connect().executemany("""
+                    INSERT INTO request_history (kind, value, count, last_seen) VALUES (?, ?, 1, ?)
+                    ON CONFLICT (kind, value) DO UPDATE SET count = count + 1, last_seen = excluded.last_seen
+                    """, [(kind, value, now) for value in values])
+            except sqlite3.Error as e:
+                logger.warning("Could not record request history: %s", e)
+            return
+        with self._lock:
+            for value in values:
+                entry = self._counts.setdefault((kind, value), [0, now])
+                entry[0] += 1
+                entry[1] = now
+
+    def top(self, kind: str, limit: int) -> List[str]:
+        """The most requested values of a kind within the window, most requested first"""
+        if limit <= 0:
+            return []
+        cutoff = time.time() - self.window
+        if self.db_path:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM request_history WHERE last_seen < ?", (cutoff,))
+                return [row[0] for row in conn.execute(
+                    "SELECT value FROM request_history WHERE kind = ? ORDER BY count DESC, last_seen DESC LIMIT ?",
+                    (kind, limit)
+                )]
+            except sqlite3.Error as e:
+                logger.warning("Could not read request history: %s", e)
+                return []
+        with self._lock:
+            self._counts = {key: entry for key, entry in self._counts.items() if entry[1] >= cutoff}
+            ranked = sorted(((entry[0], entry[1], key[1]) for key, entry in self._counts.items() if key[0] == kind),
+                            reverse=True)
+        return [value for _, _, value in ranked[:limit]]
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, then lets a single trial request through"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
         self.lock = Lock()
 
-    def can_make_request(self, estimated_tokens: int) -> bool:
+    def allow_request(self) -> bool:
         with self.lock:
-            current_time = datetime.now()
-            if current_time - self.last_reset > timedelta(days=1):
-                self.daily_requests = 0
-                self.last_reset = current_time
-            if current_time - self.minute_reset > timedelta(minutes=1):
-                self.minute_tokens = 0
-                self.minute_reset = current_time
-
-            if (self.daily_requests < self.daily_limit and
-                    self.minute_tokens + estimated_tokens <= self.minute_limit):
-                self.daily_requests += 1
-                self.minute_tokens += estimated_tokens
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.trial_in_flight = False
+            if self.state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
                 return True
             return False
 
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning("Circuit breaker opened after %d failures", self.failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+
+class SingleFlightTimeout(TimeoutError):
+    """A duplicate caller gave up waiting for the in-flight call it was coalesced onto"""
+
+class InFlightCall:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key: the first caller runs it, the rest share the outcome.
+
+    Duplicates wait at most timeout seconds, then raise SingleFlightTimeout. An exception raised
+    by the call is re-raised in every caller. share (e.g. copy.copy) gives each duplicate its own
+    copy of a mutable result.
+    """
+
+    def __init__(self, kind: str, timeout: float, share: Optional[Callable[[Any], Any]] = None):
+        self.kind = kind
+        self.timeout = timeout
+        self.share = share or (lambda value: value)
+        self._calls = {}  # key -> InFlightCall (an asyncio task in AsyncSingleFlight)
+        self._lock = Lock()
+        self.stats = Counter()
+
+    def _count(self, result: str):
+        with self._lock:
+            self.stats[result] += 1
+        COALESCED_CALLS.labels(self.kind, result).inc()
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = InFlightCall()
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                self._count('timeout')
+                raise SingleFlightTimeout(f"{self.kind} call still in flight after {self.timeout}s")
+            self._count('shared')
+            if call.error is not None:
+                raise call.error
+            return self.share(call.value)
+
+        self._count('leader')
+        try:
+            call.value = fn(*args, **kwargs)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines on one event loop.
+
+    The call runs as its own task, so the caller that started it being cancelled (a client
+    disconnect, an enrichment deadline) doesn't cancel it for the others.
+    """
+
+    async def do(self, key: str, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), self.timeout)
+            except asyncio.TimeoutError:
+                self._count('timeout')
+                raise SingleFlightTimeout(f"{self.kind} call still in flight after {self.timeout}s") from None
+            self._count('shared')
+            return self.share(result)
+
+        self._count('leader')
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here so an error nobody awaited isn't logged as lost
+
+class OpenLibraryClient:
+    """Pooled OpenLibrary HTTP client with jittered retries, 404 caching and a circuit breaker"""
+
+    def __init__(self, max_retries: int = MAX_RETRIES, timeout: float = OPENLIB_TIMEOUT):
+        self.max_retries = max_retries
+        self.timeout = (OPENLIB_CONNECT_TIMEOUT, timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=OPENLIB_POOL_SIZE, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.breaker = CircuitBreaker(OPENLIB_BREAKER_THRESHOLD, OPENLIB_BREAKER_RESET)
+        self._not_found = {}  # request key -> expiry time
+        self._not_found_lock = Lock()
+        # Callers annotate work documents, so each duplicate gets its own top-level copy
+        self.flight = SingleFlight('openlibrary', COALESCE_OPENLIB_WAIT, share=copy.copy)
+
+    def _request_key(self, url: str, params: Optional[Dict]) -> str:
+        return url + '?' + '&'.join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+
+    def _is_known_missing(self, key: str) -> bool:
+        with self._not_found_lock:
+            expires_at = self._not_found.get(key)
+            if expires_at is None:
+                return False
+            if expires_at > time.monotonic():
+                return True
+            del self._not_found[key]
+            return False
+
+    def _remember_missing(self, key: str):
+        with self._not_found_lock:
+            now = time.monotonic()
+            if len(self._not_found) >= 10000:
+                # Pruned in place - AsyncOpenLibraryClient shares this dict
+                for expired in [k for k, v in self._not_found.items() if v <= now]:
+                    del self._not_found[expired]
+            self._not_found[key] = now + OPENLIB_NOT_FOUND_TTL
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends one"""
+        if retry_after:
+            try:
+                return min(float(retry_after), OPENLIB_BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(OPENLIB_BACKOFF_MAX, OPENLIB_BACKOFF_BASE * (2 ** attempt)))
+
+    def get_json(self, url: str, params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """GET a JSON document, returning None if it is missing or OpenLibrary is unavailable.
+
+        Concurrent requests for the same document share one fetch.
+        """
+        key = self._request_key(url, params)
+        if self._is_known_missing(key):
+            return None
+        try:
+            return self.flight.do(key, self.fetch_json, key, url, params)
+        except SingleFlightTimeout as e:
+            logger.warning("Gave up waiting for %s: %s", url, e)
+            return None
+
+    def fetch_json(self, key: str, url: str, params: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        """The uncoalesced GET behind get_json, with retries"""
+        host = upstream_host(url)
+
+        for attempt in range(self.max_retries):
+            if not self.breaker.allow_request():
+                log_sampled(logging.WARNING, "OpenLibrary circuit open, skipping %s", url)
+                UPSTREAM_REQUESTS.labels(host, 'circuit_open').inc()
+                return None
+
+            retry_after = None
+            start_time = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                logger.warning("OpenLibrary request failed on attempt %d: %s", attempt + 1, e)
+                self.breaker.record_failure()
+                status = 'error'
+            else:
+                status = str(response.status_code)
+                UPSTREAM_SECONDS.labels(host).observe(time.perf_counter() - start_time)
+                if response.ok:
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        logger.warning("Invalid JSON from OpenLibrary for %s", url)
+                        UPSTREAM_REQUESTS.labels(host, 'invalid_json').inc()
+                        self.breaker.record_failure()
+                        return None
+                    UPSTREAM_REQUESTS.labels(host, status).inc()
+                    self.breaker.record_success()
+                    return data
+
+                if response.status_code not in OPENLIB_RETRYABLE_STATUSES:
+                    # The service answered; the document just isn't there (or the request is bad)
+                    UPSTREAM_REQUESTS.labels(host, status).inc()
+                    self.breaker.record_success()
+                    log_sampled(logging.INFO, "OpenLibrary returned %d for %s", response.status_code, url)
+                    if response.status_code == 404:
+                        self._remember_missing(key)
+                    return None
+
+                logger.warning("OpenLibrary returned %d on attempt %d", response.status_code, attempt + 1)
+                self.breaker.record_failure()
+                retry_after = response.headers.get('Retry-After')
+
+            UPSTREAM_REQUESTS.labels(host, status).inc()
+            if attempt < self.max_retries - 1:
+                UPSTREAM_RETRIES.labels(host, status).inc()
+                time.sleep(self.backoff_delay(attempt, retry_after))
+
+        return None
+
+    def search(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.get_json(OPEN_LIBRARY_SEARCH, params)
+
+    def get_work(self, work_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_json(f"{OPEN_LIBRARY_WORKS}{work_id}.json")
+
+class AsyncOpenLibraryClient(OpenLibraryClient):
+    """httpx-based OpenLibraryClient for the async route.
+
+    Shares the sync client's circuit breaker and 404 memory, since both talk to the same upstream.
+    """
+
+    def __init__(self, shared: OpenLibraryClient):
+        self.max_retries = shared.max_retries
+        self.timeout = shared.timeout
+        self.breaker = shared.breaker
+        self._not_found = shared._not_found
+        self._not_found_lock = shared._not_found_lock
+        self.flight = AsyncSingleFlight('openlibrary', COALESCE_OPENLIB_WAIT, share=copy.copy)
+        self._client = None
+        self._client_loop = None
+
+    def client(self):
+        """The httpx.AsyncClient for the running event loop (connections can't move between loops)"""
+        import httpx  # Only the async server needs it
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=OPENLIB_ASYNC_MAX_CONNECTIONS,
+                                    max_keepalive_connections=OPENLIB_POOL_SIZE)
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_json(self, url: str, params: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        key = self._request_key(url, params)
+        if self._is_known_missing(key):
+            return None
+        try:
+            return await self.flight.do(key, self.fetch_json, key, url, params)
+        except SingleFlightTimeout as e:
+            logger.warning("Gave up waiting for %s: %s", url, e)
+            return None
+
+    async def fetch_json(self, key: str, url: str, params: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        import httpx
+        host = upstream_host(url)
+
+        for attempt in range(self.max_retries):
+            if not self.breaker.allow_request():
+                log_sampled(logging.WARNING, "OpenLibrary circuit open, skipping %s", url)
+                UPSTREAM_REQUESTS.labels(host, 'circuit_open').inc()
+                return None
+
+            retry_after = None
+            start_time = time.perf_counter()
+            try:
+                response = await self.client().get(url, params=params)
+            except httpx.HTTPError as e:
+                logger.warning("OpenLibrary request failed on attempt %d: %s", attempt + 1, e)
+                self.breaker.record_failure()
+                status = 'error'
+            else:
+                status = str(response.status_code)
+                UPSTREAM_SECONDS.labels(host).observe(time.perf_counter() - start_time)
+                if response.is_success:
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        logger.warning("Invalid JSON from OpenLibrary for %s", url)
+                        UPSTREAM_REQUESTS.labels(host, 'invalid_json').inc()
+                        self.breaker.record_failure()
+                        return None
+                    UPSTREAM_REQUESTS.labels(host, status).inc()
+                    self.breaker.record_success()
+                    return data
+
+                if response.status_code not in OPENLIB_RETRYABLE_STATUSES:
+                    UPSTREAM_REQUESTS.labels(host, status).inc()
+                    self.breaker.record_success()
+                    log_sampled(logging.INFO, "OpenLibrary returned %d for %s", response.status_code, url)
+                    if response.status_code == 404:
+                        self._remember_missing(key)
+                    return None
+
+                logger.warning("OpenLibrary returned %d on attempt %d", response.status_code, attempt + 1)
+                self.breaker.record_failure()
+                retry_after = response.headers.get('Retry-After')
+
+            UPSTREAM_REQUESTS.labels(host, status).inc()
+            if attempt < self.max_retries - 1:
+                UPSTREAM_RETRIES.labels(host, status).inc()
+                await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+
+        return None
+
+    async def search(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self.get_json(OPEN_LIBRARY_SEARCH, params)
+
+    async def get_work(self, work_id: str) -> Optional[Dict[str, Any]]:
+        return await self.get_json(f"{OPEN_LIBRARY_WORKS}{work_id}.json")
+
+def make_result_token(book_titles: List[str], filters: Optional[Dict] = None) -> str:
+    """Result cache key - digest of the normalized input titles, in order, and any pushed-down filters"""
+    normalized = [' '.join(str(title).lower().split()) for title in book_titles]
+    key = [RESULT_SNAPSHOT_VERSION, normalized]
+    if filters:
+        key.append(filters)
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+def passes_filters(book: Dict, filters: Dict) -> bool:
+    if not book:
+        return False
+
+    if filters.get('genre'):
+        if not book.get('genres') or filters['genre'] not in book['genres']:
+            return False
+
+    if filters.get('yearRange'):
+        min_year, max_year = filters['yearRange']
+        if not book.get('year') or book['year'] < min_year or book['year'] > max_year:
+            return False
+
+    if filters.get('minScore') is not None:
+        if not book.get('similarity_score') or book['similarity_score'] < filters['minScore']:
+            return False
+
+    return True
+
 def apply_filters(recommendations: List[Dict], filters: Dict) -> List[Dict]:
     if not filters or not recommendations:
         return recommendations
 
-    filtered_books = []
-    for book in recommendations:
-        if not book:
-            continue
+    return [book for book in recommendations if passes_filters(book, filters)]
 
+def pushdown_filters(filters: Optional[Dict]) -> Dict[str, Any]:
+    """The request filters that retrieval can apply early, normalized; empty if there are none"""
+    pushed = {}
+    if not filters:
+        return pushed
+    try:
         if filters.get('genre'):
-            if not book.get('genres') or filters['genre'] not in book['genres']:
-                continue
-
+            pushed['genre'] = str(filters['genre'])
         if filters.get('yearRange'):
             min_year, max_year = filters['yearRange']
-            if not book.get('year') or book['year'] < min_year or book['year'] > max_year:
-                continue
-
+            pushed['yearRange'] = [int(min_year), int(max_year)]
         if filters.get('minScore') is not None:
-            if not book.get('similarity_score') or book['similarity_score'] < filters['minScore']:
-                continue
+            pushed['minScore'] = float(filters['minScore'])
+    except (TypeError, ValueError):
+        # Malformed filters are left to apply_filters rather than narrowing retrieval
+        return {}
+    return pushed
+
+def search_doc_passes_filters(doc: Dict, filters: Dict) -> bool:
+    """apply_filters' genre and yearRange checks, run on a search doc before its work is fetched"""
+    doc_filters = {name: filters[name] for name in ('genre', 'yearRange') if filters.get(name)}
+    if not doc_filters:
+        return True
+    return passes_filters({
+        'genres': doc.get('subject', [])[:5] if doc.get('subject') else [],
+        'year': doc.get('first_publish_year')
+    }, doc_filters)
+
+def min_score_allows(score: float, filters: Dict) -> bool:
+    """Whether a (fraction) score, or an upper bound on one, can still reach the minScore filter"""
+    return filters.get('minScore') is None or round(score * 100, 1) >= filters['minScore']
+
+# Stopwords to remove from subjects for better matching
+SUBJECT_STOPWORDS = frozenset(['fiction', 'novel', 'book', 'literature', 'story', 'stories', 'the', 'and', 'of', 'in'])
+SUBJECT_PUNCTUATION = re.compile(r'[^\w\s]')
+
+def normalize_subject_text(subject: str, stopwords: FrozenSet[str] = SUBJECT_STOPWORDS) -> str:
+    """Lowercase, strip punctuation and drop stopwords from a subject string"""
+    if not subject:
+        return ""
+    subject = SUBJECT_PUNCTUATION.sub('', subject.lower())
+    words = [w for w in subject.split() if w not in stopwords]
+    return " ".join(words).strip()
+
+def subject_id(text: str) -> int:
+    """Stable 64-bit id for a subject string.
 
-        filtered_books.append(book)
+    Ids are derived from the text rather than handed out sequentially, so an evicted and
+    re-interned subject always gets the same id and sets built earlier stay comparable.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
 
-    return filtered_books
+class SubjectEntry(NamedTuple):
+    raw_id: int                  # Id of the raw subject string
+    id: int                      # Id of the normalized subject
+    normalized: str
+    tokens: Tuple[str, ...]      # Normalized words
+
+EMPTY_SUBJECT = SubjectEntry(subject_id(''), subject_id(''), '', ())
+
+class SubjectTable:
+    """Process-wide, bounded intern table mapping raw subject strings to ids and normalized tokens"""
+
+    def __init__(self, stopwords: FrozenSet[str], max_entries: int, path: Optional[str] = None):
+        self.stopwords = stopwords
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = {}  # raw subject -> SubjectEntry, in insertion order
+        self._lock = Lock()
+        self._unsaved = 0
+        self._saving = False
+        # Plain counters - lookups are lock-free, so these are approximate under concurrency
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.path:
+            self.load()
+
+    def lookup(self, subject: str) -> SubjectEntry:
+        entry = self._entries.get(subject)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        if not subject:
+            return EMPTY_SUBJECT
+
+        self.misses += 1
+        normalized = normalize_subject_text(subject, self.stopwords)
+        entry = SubjectEntry(subject_id(subject), subject_id(normalized), normalized, tuple(normalized.split()))
+        self._insert(subject, entry)
+        return entry
+
+    def raw_id(self, subject: Any) -> Any:
+        """Id for exact (un-normalized) subject comparisons; empty and non-string values pass through"""
+        return self.lookup(subject).raw_id if subject and isinstance(subject, str) else subject
+
+    def _insert(self, subject: str, entry: SubjectEntry):
+        save_now = False
+        with self._lock:
+            if subject in self._entries:
+                return
+            if len(self._entries) >= self.max_entries:
+                # Drop the oldest tenth in one go so eviction cost is amortized
+                for key in list(self._entries)[:max(1, self.max_entries // 10)]:
+                    del self._entries[key]
+                    self.evictions += 1
+            self._entries[subject] = entry
+            self._unsaved += 1
+            if self.path and self._unsaved >= SUBJECT_TABLE_SAVE_INTERVAL and not self._saving:
+                self._saving = save_now = True
+        if save_now:
+            threading.Thread(target=self.save, daemon=True).start()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load subject table from %s: %s", self.path, e)
+            return
+        if data.get('stopwords') != sorted(self.stopwords):
+            logger.info("Subject table on disk was built with different stopwords, ignoring it")
+            return
+        for subject, normalized in list(data.get('subjects', {}).items())[-self.max_entries:]:
+            self._entries[subject] = SubjectEntry(
+                subject_id(subject), subject_id(normalized), normalized, tuple(normalized.split())
+            )
+        logger.info("Loaded %d subjects from %s", len(self._entries), self.path)
+
+    def save(self):
+        """Atomically write the table so the next process starts warm"""
+        try:
+            with self._lock:
+                subjects = {subject: entry.normalized for subject, entry in self._entries.items()}
+                self._unsaved = 0
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'stopwords': sorted(self.stopwords), 'subjects': subjects}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save subject table to %s: %s", self.path, e)
+        finally:
+            self._saving = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+subject_table = SubjectTable(SUBJECT_STOPWORDS, SUBJECT_TABLE_MAX_ENTRIES, SUBJECT_TABLE_PATH)
+if subject_table.path:
+    atexit.register(subject_table.save)
+
+@dataclass(frozen=True)
+class ReaderProfile:
+    """Everything scoring needs to know about the input books, computed once per request"""
+    subjects: Tuple[str, ...]                # Raw subjects of all input books, in order
+    subject_set: FrozenSet[str]              # Raw subjects, deduplicated
+    subject_set_lower: FrozenSet[str]        # Lowercased subjects, used for explanations
+    raw_subject_ids: FrozenSet[Any]          # Interned ids of the raw subjects
+    clean_subjects: Tuple[str, ...]          # Normalized, non-empty subjects, in order
+    primary_subject_ids: FrozenSet[int]      # Ids of the first 3 normalized subjects
+    all_subject_ids: FrozenSet[int]          # Ids of all normalized subjects
+    term_counts: Dict[str, int]              # Normalized subject word -> occurrences
+    favorite_genres: Tuple[str, ...]         # First 3 subjects of each input book, deduplicated, in order
+    years: Tuple[int, ...]
+    mean_year: Optional[float]
+    authors: FrozenSet[str]                  # Lowercased first author of each input book
+    author_last_names: FrozenSet[str]
+    fingerprint: str                         # Stable digest of every input the scores and prompts use
+
+    @classmethod
+    def from_input_books(cls, input_books: List[Dict[str, Any]], subjects_table: SubjectTable,
+                         extract_year: Callable[[str], Optional[int]]) -> 'ReaderProfile':
+        subjects = []
+        favorite_genres = []
+        for input_book in input_books:
+            if isinstance(input_book.get('subjects'), list):
+                subjects.extend(input_book['subjects'])
+                favorite_genres.extend(input_book['subjects'][:3])
+
+        entries = [subjects_table.lookup(s) for s in subjects]
+        clean_entries = [entry for entry in entries if entry.normalized]
+        clean_subjects = [entry.normalized for entry in clean_entries]
+        term_counts = Counter(word for entry in entries for word in entry.tokens)
+
+        years = []
+        authors = set()
+        author_last_names = set()
+        for input_book in input_books:
+            year = extract_year(input_book.get('first_publish_date', ''))
+            if year:
+                years.append(year)
+            if input_book.get('author_name'):
+                author = input_book['author_name'][0] if isinstance(input_book['author_name'], list) else input_book['author_name']
+                if author:
+                    authors.add(author.lower())
+                    author_last_names.add(re.split(r'[\s,]+', author.lower())[-1])
+
+        favorite_genres = list(dict.fromkeys(favorite_genres))
+        # Raw subjects determine the cleaned ones and the shared genres in the explanation prompt
+        fingerprint_source = json.dumps([subjects, favorite_genres, sorted(years), sorted(authors)], default=str)
+        return cls(
+            subjects=tuple(subjects),
+            subject_set=frozenset(subjects),
+            subject_set_lower=frozenset(s.lower() for s in subjects if s),
+            raw_subject_ids=frozenset(subjects_table.raw_id(s) for s in subjects),
+            clean_subjects=tuple(clean_subjects),
+            primary_subject_ids=frozenset(entry.id for entry in clean_entries[:3]),
+            all_subject_ids=frozenset(entry.id for entry in clean_entries),
+            term_counts=dict(term_counts),
+            favorite_genres=tuple(favorite_genres),
+            years=tuple(years),
+            mean_year=sum(years) / len(years) if years else None,
+            authors=frozenset(authors),
+            author_last_names=frozenset(author_last_names),
+            fingerprint=hashlib.sha1(fingerprint_source.encode('utf-8')).hexdigest()[:16]
+        )
 
 class LightweightBookRecommender:
     """A memory-efficient book recommendation engine without ML dependencies"""
@@ -293,9 +1577,12 @@ class LightweightBookRecommender:
         }
         
         # Stopwords to remove from subjects for better matching
-        self.common_words = set(['fiction', 'novel', 'book', 'literature', 'story', 'stories', 'the', 'and', 'of', 'in'])
+        self.common_words = set(SUBJECT_STOPWORDS)
+        
+        # Normalized subjects are memoized process-wide
+        self.subjects = subject_table
         
-        print("Lightweight Book Recommender initialized successfully")
+        logger.info("Lightweight Book Recommender initialized successfully")
     
     def extract_year(self, date_str: str) -> Optional[int]:
         """Extract publication year from date string"""
@@ -312,18 +1599,12 @@ class LightweightBookRecommender:
     
     def normalize_subject(self, subject: str) -> str:
         """Clean and normalize a subject/genre string"""
-        if not subject:
-            return ""
-        
-        # Lowercase and remove special characters
-        subject = subject.lower()
-        subject = re.sub(r'[^\w\s]', '', subject)
-        
-        # Remove common words
-        words = [w for w in subject.split() if w not in self.common_words]
-        
-        return " ".join(words).strip()
+        return self.subjects.lookup(subject).normalized
     
+    def build_reader_profile(self, input_books: List[Dict[str, Any]]) -> ReaderProfile:
+        """Precompute the input-side features used when scoring every candidate"""
+        return ReaderProfile.from_input_books(input_books, self.subjects, self.extract_year)
+
     def calculate_subject_match(self, book_subjects: List[str], input_subjects: List[str]) -> float:
         """Calculate improved subject/genre matching score"""
         if not book_subjects or not input_subjects:
@@ -339,22 +1620,21 @@ class LightweightBookRecommender:
         if not book_subj_clean or not input_subj_clean:
             return 0.0
         
-        # Calculate weighted Jaccard similarity
-        # - Primary subjects (first 3) get higher weight
+        return self._weighted_subject_jaccard(book_subj_clean, set(input_subj_clean[:3]), set(input_subj_clean))
+    
+    def _weighted_subject_jaccard(self, book_subj_clean: List[Any], primary_input: FrozenSet[Any],
+                                  all_input: FrozenSet[Any]) -> float:
+        """Weighted Jaccard similarity of normalized subjects - primary subjects (first 3) get higher weight"""
         primary_weight = 0.7
         secondary_weight = 0.3
         
         primary_book = set(book_subj_clean[:3])
-        primary_input = set(input_subj_clean[:3])
-        secondary_book = set(book_subj_clean[3:])
-        secondary_input = set(input_subj_clean[3:])
+        all_book = set(book_subj_clean)
         
         # Calculate similarities
         primary_intersection = len(primary_book.intersection(primary_input))
         primary_union = len(primary_book.union(primary_input))
         
-        all_book = primary_book.union(secondary_book)
-        all_input = primary_input.union(secondary_input)
         all_intersection = len(all_book.intersection(all_input))
         all_union = len(all_book.union(all_input))
         
@@ -386,6 +1666,10 @@ class LightweightBookRecommender:
                 if word:
                     input_terms[word] += 1
         
+        return self._term_specificity(book_terms, input_terms)
+    
+    def _term_specificity(self, book_terms: Dict[str, int], input_terms: Dict[str, int]) -> float:
+        """Score shared subject terms, weighting the less common ones higher"""
         # Find shared terms that are relatively uncommon
         shared_terms = set(book_terms.keys()).intersection(set(input_terms.keys()))
         
@@ -411,7 +1695,9 @@ class LightweightBookRecommender:
             return 0.5  # Neutral score if years unknown
             
         avg_year = sum(input_years) / len(input_years)
-        
+        return self._year_bucket(book_year, avg_year)
+    
+    def _year_bucket(self, book_year: int, avg_year: float) -> float:
         # Implement a sigmoid-like function for year difference
         # This gives more weight to books from similar time periods
         year_diff = abs(book_year - avg_year)
@@ -427,7 +1713,8 @@ class LightweightBookRecommender:
         else:
             return 0.2  # Different historical era
     
-    def calculate_author_relation(self, book: Dict[str, Any], input_books: List[Dict[str, Any]]) -> float:
+    def calculate_author_relation(self, book: Dict[str, Any], input_books: List[Dict[str, Any]],
+                                  profile: Optional[ReaderProfile] = None) -> float:
         """Calculate similarity based on author relationships"""
         # Extract author info
         book_author = None
@@ -436,28 +1723,18 @@ class LightweightBookRecommender:
             
         if not book_author:
             return 0.0
+        
+        if profile is None:
+            profile = self.build_reader_profile(input_books)
             
         # Check for exact author match - strong signal
-        for input_book in input_books:
-            input_author = None
-            if input_book.get('author_name'):
-                input_author = input_book['author_name'][0] if isinstance(input_book['author_name'], list) else input_book['author_name']
-                
-            if input_author and input_author.lower() == book_author.lower():
-                return 1.0  # Same author
+        if book_author.lower() in profile.authors:
+            return 1.0  # Same author
         
         # Check for partial author name match (e.g., last name)
         book_author_parts = re.split(r'[\s,]+', book_author.lower())
-        for input_book in input_books:
-            input_author = None
-            if input_book.get('author_name'):
-                input_author = input_book['author_name'][0] if isinstance(input_book['author_name'], list) else input_book['author_name']
-                
-            if input_author:
-                input_author_parts = re.split(r'[\s,]+', input_author.lower())
-                # Check for last name match
-                if book_author_parts and input_author_parts and book_author_parts[-1] == input_author_parts[-1]:
-                    return 0.5  # Same last name
+        if book_author_parts[-1] in profile.author_last_names:
+            return 0.5  # Same last name
         
         # Default modest score - could be improved with more data
         return 0.1
@@ -476,35 +1753,44 @@ class LightweightBookRecommender:
         
         return score
     
-    def calculate_enhanced_similarity(self, book: Dict[str, Any], input_books: List[Dict[str, Any]]) -> Tuple[float, Dict[str, float]]:
+    def calculate_enhanced_similarity(self, book: Dict[str, Any], input_books: List[Dict[str, Any]],
+                                      profile: Optional[ReaderProfile] = None) -> Tuple[float, Dict[str, float]]:
         """Calculate enhanced similarity score between candidate book and input books"""
+        if profile is None:
+            profile = self.build_reader_profile(input_books)
+        
         # Calculate individual feature scores
         scores = {}
         
-        # Subject match score
+        # Intern the candidate's subjects once for both subject scores
         book_subjects = book.get('subjects', [])
-        all_input_subjects = []
-        for input_book in input_books:
-            if 'subjects' in input_book and isinstance(input_book['subjects'], list):
-                all_input_subjects.extend(input_book['subjects'])
-                
-        scores['subject_match'] = self.calculate_subject_match(book_subjects, all_input_subjects)
+        entries = [self.subjects.lookup(s) for s in book_subjects] if book_subjects else []
+        
+        # Subject match score - compared as integer ids
+        book_subj_ids = [entry.id for entry in entries if entry.normalized]
+        if book_subj_ids and profile.clean_subjects:
+            scores['subject_match'] = self._weighted_subject_jaccard(
+                book_subj_ids, profile.primary_subject_ids, profile.all_subject_ids
+            )
+        else:
+            scores['subject_match'] = 0.0
         
         # Subject depth score
-        scores['subject_depth'] = self.calculate_subject_depth(book_subjects, all_input_subjects)
+        if book_subjects and profile.subjects:
+            book_terms = Counter(word for entry in entries for word in entry.tokens)
+            scores['subject_depth'] = self._term_specificity(book_terms, profile.term_counts)
+        else:
+            scores['subject_depth'] = 0.0
         
         # Year relevance
         book_year = self.extract_year(book.get('first_publish_date', ''))
-        input_years = []
-        for input_book in input_books:
-            year = self.extract_year(input_book.get('first_publish_date', ''))
-            if year:
-                input_years.append(year)
-                
-        scores['year_relevance'] = self.calculate_year_relevance(book_year, input_years)
+        if book_year and profile.mean_year is not None:
+            scores['year_relevance'] = self._year_bucket(book_year, profile.mean_year)
+        else:
+            scores['year_relevance'] = 0.5  # Neutral score if years unknown
         
         # Author relation
-        scores['author_relation'] = self.calculate_author_relation(book, input_books)
+        scores['author_relation'] = self.calculate_author_relation(book, input_books, profile)
         
         # Popularity score
         scores['popularity'] = self.calculate_popularity(book)
@@ -517,24 +1803,157 @@ class LightweightBookRecommender:
                 
         return final_score, scores
     
+    def calculate_enhanced_similarity_batch(self, books: List[Dict[str, Any]], input_books: List[Dict[str, Any]],
+                                            profile: Optional[ReaderProfile] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Score a whole candidate set at once with array operations.
+
+        Subjects and subject terms are encoded into vocabularies shared by the batch, so the
+        set overlaps behind subject_match and subject_depth become index lookups and
+        bincounts. Results match calculate_enhanced_similarity book for book (subject_depth
+        sums its terms in a different order, so it can differ in the last float bit).
+        """
+        n = len(books)
+        if profile is None:
+            profile = self.build_reader_profile(input_books)
+
+        subject_vocab = {}
+        term_vocab = {}
+        input_primary_ids = {subject_vocab.setdefault(s, len(subject_vocab)) for s in profile.primary_subject_ids}
+        input_all_ids = {subject_vocab.setdefault(s, len(subject_vocab)) for s in profile.all_subject_ids}
+        input_term_counts = {
+            term_vocab.setdefault(word, len(term_vocab)): count for word, count in profile.term_counts.items()
+        }
+
+        # Flattened (row, id) incidence lists for every candidate
+        primary_rows, primary_ids = [], []
+        all_rows, all_ids = [], []
+        term_rows, term_ids, term_counts = [], [], []
+        has_subjects = np.zeros(n, dtype=bool)
+        for row, book in enumerate(books):
+            book_subjects = book.get('subjects', [])
+            if not book_subjects:
+                continue
+            has_subjects[row] = True
+            entries = [self.subjects.lookup(s) for s in book_subjects]
+            clean = [entry.id for entry in entries if entry.normalized]
+
+            primary = {subject_vocab.setdefault(s, len(subject_vocab)) for s in clean[:3]}
+            everything = {subject_vocab.setdefault(s, len(subject_vocab)) for s in clean}
+            primary_rows.extend([row] * len(primary))
+            primary_ids.extend(primary)
+            all_rows.extend([row] * len(everything))
+            all_ids.extend(everything)
+
+            book_terms = Counter()
+            for entry in entries:
+                for word in entry.tokens:
+                    book_terms[term_vocab.setdefault(word, len(term_vocab))] += 1
+            term_rows.extend([row] * len(book_terms))
+            term_ids.extend(book_terms.keys())
+            term_counts.extend(book_terms.values())
+
+        scores = {}
+
+        # Subject match - weighted Jaccard over primary (first 3) and all subjects
+        in_primary = np.zeros(len(subject_vocab), dtype=bool)
+        in_primary[list(input_primary_ids)] = True
+        in_all = np.zeros(len(subject_vocab), dtype=bool)
+        in_all[list(input_all_ids)] = True
+        primary_rows = np.asarray(primary_rows, dtype=np.intp)
+        primary_ids = np.asarray(primary_ids, dtype=np.intp)
+        all_rows = np.asarray(all_rows, dtype=np.intp)
+        all_ids = np.asarray(all_ids, dtype=np.intp)
+
+        primary_intersection = np.bincount(primary_rows, weights=in_primary[primary_ids], minlength=n)
+        primary_union = np.bincount(primary_rows, minlength=n) + len(input_primary_ids) - primary_intersection
+        all_intersection = np.bincount(all_rows, weights=in_all[all_ids], minlength=n)
+        all_union = np.bincount(all_rows, minlength=n) + len(input_all_ids) - all_intersection
+
+        primary_score = np.divide(primary_intersection, primary_union,
+                                  out=np.zeros(n), where=primary_union > 0)
+        all_score = np.divide(all_intersection, all_union, out=np.zeros(n), where=all_union > 0)
+        subject_match = (0.7 * primary_score) + (0.3 * all_score)
+        if not profile.clean_subjects:
+            subject_match[:] = 0.0
+        subject_match[~has_subjects] = 0.0
+        scores['subject_match'] = subject_match
+
+        # Subject depth - specificity of shared terms
+        input_counts = np.zeros(len(term_vocab), dtype=np.int64)
+        for term_id, count in input_term_counts.items():
+            input_counts[term_id] = count
+        term_rows = np.asarray(term_rows, dtype=np.intp)
+        term_ids = np.asarray(term_ids, dtype=np.intp)
+        term_counts = np.asarray(term_counts, dtype=np.int64)
+        shared = input_counts[term_ids] > 0
+        shared_rows = term_rows[shared]
+        specificity = np.bincount(
+            shared_rows, weights=1.0 / (term_counts[shared] + input_counts[term_ids[shared]]), minlength=n
+        )
+        shared_terms = np.bincount(shared_rows, minlength=n)
+        subject_depth = np.minimum(
+            np.divide(specificity, shared_terms, out=np.zeros(n), where=shared_terms > 0), 1.0
+        )
+        if not profile.subjects:
+            subject_depth[:] = 0.0
+        scores['subject_depth'] = subject_depth
+
+        # Year relevance - bucketed distance from the mean input year
+        book_years = np.fromiter(
+            ((self.extract_year(book.get('first_publish_date', '')) or 0) for book in books), dtype=np.float64, count=n
+        )
+        if profile.mean_year is not None:
+            year_diff = np.abs(book_years - profile.mean_year)
+            year_relevance = np.select(
+                [year_diff <= 5, year_diff <= 20, year_diff <= 50, year_diff <= 100],
+                [1.0, 0.8, 0.6, 0.4],
+                default=0.2
+            )
+            year_relevance[book_years == 0] = 0.5
+        else:
+            year_relevance = np.full(n, 0.5)
+        scores['year_relevance'] = year_relevance
+
+        # Author relation - exact author (1.0), shared last name (0.5), otherwise 0.1
+        scores['author_relation'] = np.fromiter(
+            (self.calculate_author_relation(book, input_books, profile) for book in books), dtype=np.float64, count=n
+        )
+
+        # Popularity - share of available popularity signals
+        edition_counts = np.fromiter((float(book.get('edition_count', 0)) for book in books), dtype=np.float64, count=n)
+        publisher_counts = np.fromiter(
+            (len(book.get('publisher', [])) if isinstance(book.get('publisher', []), list) else 0 for book in books),
+            dtype=np.float64, count=n
+        )
+        page_counts = np.fromiter(
+            (float(book.get('number_of_pages_median', 0)) for book in books), dtype=np.float64, count=n
+        )
+        signals = (edition_counts > 0).astype(np.int64) + (publisher_counts > 0) + (page_counts > 0)
+        scores['popularity'] = signals / 3
+
+        final_scores = np.zeros(n)
+        for feature, feature_scores in scores.items():
+            if feature in self.weights:
+                final_scores += feature_scores * self.weights[feature]
+
+        return final_scores, scores
+
     def generate_detailed_explanation(self, book: Dict[str, Any], input_books: List[Dict[str, Any]], 
-                                     score: float, component_scores: Dict[str, float]) -> str:
+                                     score: float, component_scores: Dict[str, float],
+                                     profile: Optional[ReaderProfile] = None) -> str:
         """Generate detailed explanation of why this book was recommended"""
         reasons = []
         
         # Subject match explanation
         if component_scores.get('subject_match', 0) > 0.6:
             # Find the most notable shared subjects
+            if profile is None:
+                profile = self.build_reader_profile(input_books)
             book_subjects = book.get('subjects', [])
-            all_input_subjects = []
-            for input_book in input_books:
-                if isinstance(input_book.get('subjects', []), list):
-                    all_input_subjects.extend(input_book['subjects'])
                     
             # Get shared subjects
             book_set = set([s.lower() for s in book_subjects if s])
-            input_set = set([s.lower() for s in all_input_subjects if s])
-            shared = book_set.intersection(input_set)
+            shared = book_set.intersection(profile.subject_set_lower)
             
             if shared:
                 examples = list(shared)[:3]
@@ -570,25 +1989,551 @@ class LightweightBookRecommender:
         
         return explanation
 
+class SubjectIndex:
+    """In-memory inverted index from normalized subject id to the catalog works tagged with it.
+
+    top_k is exact under the enhanced scorer's weights, MaxScore style: subject match and year
+    relevance come straight from the posting lists for every work sharing a subject with the
+    reader, the remaining components are bounded, and works are hydrated and fully scored in
+    descending bound order only until no remaining bound can beat the current k-th best score.
+    Bounds assume works are hydrated from the same catalog (LocalCatalog.get_work).
+    """
+
+    DEPTH_BOUND = 0.5  # Each shared term contributes 1 / (book count + input count) <= 1/2
+    BLOCK_SIZE = 64  # Works hydrated and scored per batch
+
+    WORK_ID_PATTERN = re.compile(r'^OL(\d+)W$')
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = weights
+        self.primary_postings = {}  # subject id -> doc numbers with it among their first 3 subjects
+        self.all_postings = {}      # subject id -> doc numbers with it anywhere
+        self.work_numbers = np.zeros(0, dtype=np.int64)  # doc -> numeric part of the OL work id
+        self.years = np.zeros(0, dtype=np.int32)
+        self.primary_counts = np.zeros(0, dtype=np.int32)
+        self.all_counts = np.zeros(0, dtype=np.int32)
+        self.author_ids = np.zeros(0, dtype=np.int32)  # doc -> index into author_names, -1 if unknown
+        self.author_names = []
+        self.has_editions = np.zeros(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.work_numbers)
+
+    def build(self, rows, extract_year: Callable[[str], Optional[int]],
+              stopwords: FrozenSet[str] = SUBJECT_STOPWORDS):
+        """Index (work id, subjects, first publish date, first author, edition count) rows"""
+        numbers, years = array('q'), array('i')
+        primary_counts, all_counts, authors, has_editions = array('i'), array('i'), array('i'), array('b')
+        primary_postings, all_postings = {}, {}
+        author_index = {}
+        subject_ids = {}  # raw subject -> normalized id (None if it normalizes to nothing), for this build only
+
+        for work_id, subjects, first_publish_date, author, edition_count in rows:
+            match = self.WORK_ID_PATTERN.match(work_id or '')
+            if not match:
+                continue
+            clean = []
+            for subject in subjects:
+                if subject not in subject_ids:
+                    normalized = normalize_subject_text(subject, stopwords)
+                    subject_ids[subject] = subject_id(normalized) if normalized else None
+                if subject_ids[subject] is not None:
+                    clean.append(subject_ids[subject])
+            if not clean:
+                continue  # Shares no subject with anyone, so it can never be retrieved
+
+            doc = len(numbers)
+            primary, everything = set(clean[:3]), set(clean)
+            for sid in primary:
+                primary_postings.setdefault(sid, array('i')).append(doc)
+            for sid in everything:
+                all_postings.setdefault(sid, array('i')).append(doc)
+            numbers.append(int(match.group(1)))
+            years.append(extract_year(first_publish_date or '') or 0)
+            primary_counts.append(len(primary))
+            all_counts.append(len(everything))
+            authors.append(author_index.setdefault(author, len(author_index)) if author else -1)
+            has_editions.append(1 if edition_count else 0)
+
+        self.primary_postings = {sid: np.frombuffer(docs, dtype=np.int32) for sid, docs in primary_postings.items()}
+        self.all_postings = {sid: np.frombuffer(docs, dtype=np.int32) for sid, docs in all_postings.items()}
+        self.work_numbers = np.frombuffer(numbers, dtype=np.int64)
+        self.years = np.frombuffer(years, dtype=np.int32)
+        self.primary_counts = np.frombuffer(primary_counts, dtype=np.int32)
+        self.all_counts = np.frombuffer(all_counts, dtype=np.int32)
+        self.author_ids = np.frombuffer(authors, dtype=np.int32)
+        self.author_names = list(author_index)
+        self.has_editions = np.frombuffer(has_editions, dtype=np.int8).astype(bool)
+
+    def upper_bounds(self, profile: ReaderProfile, author_relation: Callable[[str], float],
+                     exclude_ids: set, exclude_authors: set) -> Tuple[np.ndarray, np.ndarray]:
+        """(docs sharing a subject with the reader, upper bound on each one's score)"""
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0))
+        if not profile.clean_subjects:
+            return empty
+        all_lists = [self.all_postings[sid] for sid in profile.all_subject_ids if sid in self.all_postings]
+        if not all_lists:
+            return empty
+
+        docs, all_intersection = np.unique(np.concatenate(all_lists), return_counts=True)
+        primary_lists = [self.primary_postings[sid] for sid in profile.primary_subject_ids if sid in self.primary_postings]
+        if primary_lists:
+            primary_intersection = np.bincount(
+                np.searchsorted(docs, np.concatenate(primary_lists)), minlength=len(docs)
+            )
+        else:
+            primary_intersection = np.zeros(len(docs), dtype=np.int64)
+
+        # Same weighted Jaccard as calculate_enhanced_similarity_batch, exact
+        primary_union = self.primary_counts[docs] + len(profile.primary_subject_ids) - primary_intersection
+        all_union = self.all_counts[docs] + len(profile.all_subject_ids) - all_intersection
+        subject_match = (
+            0.7 * np.divide(primary_intersection, primary_union, out=np.zeros(len(docs)), where=primary_union > 0)
+            + 0.3 * np.divide(all_intersection, all_union, out=np.zeros(len(docs)), where=all_union > 0)
+        )
+
+        # Year relevance, exact
+        years = self.years[docs]
+        if profile.mean_year is not None:
+            year_diff = np.abs(years - profile.mean_year)
+            year_relevance = np.select(
+                [year_diff <= 5, year_diff <= 20, year_diff <= 50, year_diff <= 100],
+                [1.0, 0.8, 0.6, 0.4],
+                default=0.2
+            )
+            year_relevance[years == 0] = 0.5
+        else:
+            year_relevance = np.full(len(docs), 0.5)
+
+        # Author relation from the catalog's first author, once per distinct author
+        author_ids = self.author_ids[docs]
+        author_scores = np.zeros(len(self.author_names) + 1)  # Last slot is "no author" (-1)
+        keep = np.ones(len(docs), dtype=bool)
+        for author_id in np.unique(author_ids):
+            if author_id < 0:
+                continue
+            name = self.author_names[author_id]
+            if name in exclude_authors:
+                keep &= author_ids != author_id
+            author_scores[author_id] = author_relation(name)
+        author_bound = author_scores[author_ids]
+
+        # Popularity, exact: catalog works carry an edition count but no publisher or page count signals
+        popularity = self.has_editions[docs] / 3
+
+        excluded_numbers = [int(m.group(1)) for m in map(self.WORK_ID_PATTERN.match, exclude_ids) if m]
+        if excluded_numbers:
+            keep &= ~np.isin(self.work_numbers[docs], excluded_numbers)
+
+        bound = (
+            self.weights.get('subject_match', 0) * subject_match
+            + self.weights.get('subject_depth', 0) * (self.DEPTH_BOUND if profile.subjects else 0.0)
+            + self.weights.get('year_relevance', 0) * year_relevance
+            + self.weights.get('author_relation', 0) * author_bound
+            + self.weights.get('popularity', 0) * popularity
+        )
+        return docs[keep], bound[keep]
+
+    def top_k(self, profile: ReaderProfile, k: int, score_works: Callable[[List[str]], List[Optional[float]]],
+              author_relation: Callable[[str], float], exclude_ids: set, exclude_authors: set,
+              keep: Optional[Callable[[str], bool]] = None, min_score: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Best k (work id, score) pairs, best first; score_works gives exact scores (None if unavailable).
+
+        keep drops works before they are scored. min_score (percent, as in the minScore filter)
+        stops the scan at the first work whose bound can't reach it.
+        """
+        docs, bound = self.upper_bounds(profile, author_relation, exclude_ids, exclude_authors)
+        if min_score is not None:
+            reachable = np.round(bound * 100, 1) >= min_score
+            docs, bound = docs[reachable], bound[reachable]
+        order = np.argsort(-bound, kind='stable')
+
+        heap = []  # (score, -rank, work id) - min-heap of the best k so far
+        scored = 0
+        for start in range(0, len(order), self.BLOCK_SIZE):
+            block = order[start:start + self.BLOCK_SIZE]
+            # Ties go to the earlier rank, so a bound equal to the k-th score can't get in either
+            if len(heap) >= k and bound[block[0]] <= heap[0][0]:
+                break
+            ranks = {f"OL{number}W": start + offset for offset, number in enumerate(self.work_numbers[docs[block]])}
+            work_ids = [work_id for work_id in ranks if keep is None or keep(work_id)]
+            for work_id, score in zip(work_ids, score_works(work_ids) if work_ids else []):
+                if score is None or (min_score is not None and round(score * 100, 1) < min_score):
+                    continue
+                item = (score, -ranks[work_id], work_id)
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+            scored += len(block)
+
+        logger.debug("Subject index: %d matching works, %d fully scored for top %d", len(docs), scored, k)
+        return [(work_id, score) for score, _, work_id in sorted(heap, reverse=True)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'works': len(self),
+            'subjects': len(self.all_postings),
+            'postings': int(sum(len(docs) for docs in self.all_postings.values()))
+        }
+
+class TitleIndex:
+    """In-memory title -> work index with trigram fuzzy matching, for resolving input titles locally.
+
+    Filled from past resolutions (kept in the shared cache database, so they survive restarts and
+    reach every worker) and from the most-published catalog works. Past resolutions expire after
+    ttl_seconds; catalog entries don't. An exact normalized match is a dict lookup; otherwise the
+    entry sharing the most trigrams wins if its Dice similarity is at least min_similarity and at
+    least min_margin above the best entry for any other work. Callers fall back to a live search
+    on a miss and add() its answer. A full index drops its expired entries, then the least recently
+    used ones, until EVICT_SHARE of it is free.
+    """
+
+    ARTICLES = re.compile(r'^(the|a|an) ')
+    RUNNER_UP_SCAN = 8  # Best-scoring entries searched for another work; a work can sit under several titles
+    EVICT_SHARE = 0.1  # Share of max_entries freed whenever the index fills up
+
+    def __init__(self, db_path: Optional[str], max_entries: int = TITLE_INDEX_MAX_ENTRIES,
+                 min_similarity: float = TITLE_INDEX_MIN_SIMILARITY, min_margin: float = TITLE_INDEX_MIN_MARGIN,
+                 ttl_seconds: float = TITLE_INDEX_TTL):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.ttl = ttl_seconds
+        self._positions = {}  # normalized title -> entry number
+        self._entries = []  # entry number -> (work id, title, first author)
+        self._expires = array('d')  # entry number -> expiry time (inf for catalog entries)
+        self._last_used = array('d')  # entry number -> when it was indexed or last matched
+        self._gram_counts = array('H')  # entry number -> distinct trigrams in its title
+        self._postings = {}  # trigram -> entry numbers
+        self._lock = Lock()
+        self._local = threading.local()
+        self.stats = Counter()
+        if self.db_path:
+            try:
+                conn = self._connect()
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS title_index (
+                        title_norm TEXT PRIMARY KEY,
+                        work_id TEXT NOT NULL,
+                        title TEXT NOT NULL,
+                        author TEXT,
+                        expires_at REAL NOT NULL DEFAULT 0
+                    )""")
+                if 'expires_at' not in {row[1] for row in conn.execute("PRAGMA table_info(title_index)")}:
+                    # Stored before resolutions expired - the default treats those rows as expired
+                    conn.execute("ALTER TABLE title_index ADD COLUMN expires_at REAL NOT NULL DEFAULT 0")
+            except sqlite3.Error as e:
+                logger.warning("Title index running memory-only, could not open %s: %s", self.db_path, e)
+                self.db_path = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _connect(self) -> sqlite3.Connection:
+        return shared_db_connection(self._local, self.db_path)
+
+    @classmethod
+    def normalize(cls, title: str) -> str:
+        return cls.ARTICLES.sub('', normalize_title(title))
+
+    @staticmethod
+    def trigrams(key: str) -> set:
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def load(self, catalog: Optional[LocalCatalog] = None, catalog_entries: int = TITLE_INDEX_CATALOG_ENTRIES):
+        """Index the unexpired stored resolutions, then the most-published catalog works"""
+        if self.db_path:
+            now = time.time()
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM title_index WHERE expires_at <= ?", (now,))
+                rows = conn.execute(
+                    "SELECT title_norm, work_id, title, author, expires_at FROM title_index"
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning("Could not read the title index: %s", e)
+                rows = []
+            for key, work_id, title, author, expires_at in rows:
+                self._insert(key, (work_id, title, author), expires_at)
+        # Catalog works only fill the room left - they must not evict stored resolutions
+        catalog_entries = min(catalog_entries, self.max_entries - len(self._entries))
+        if catalog and catalog_entries > 0:
+            for work_id, title, author in catalog.iter_titles(catalog_entries):
+                self._insert(self.normalize(title), (work_id, title, author), math.inf, replace=False)
+
+    def _insert(self, key: str, entry: Tuple[str, str, Optional[str]], expires_at: float,
+                replace: bool = True) -> bool:
+        """Index entry under key; False if the key is taken (and replace is off)"""
+        if not key or self.max_entries <= 0:
+            return False
+        now = time.time()
+        with self._lock:
+            position = self._positions.get(key)
+            if position is not None:
+                if not replace:
+                    return False
+                self._entries[position] = entry
+                self._expires[position] = expires_at
+                self._last_used[position] = now
+                return True
+            if len(self._entries) >= self.max_entries:
+                self._make_room(now)
+            position = len(self._entries)
+            grams = self.trigrams(key)
+            self._positions[key] = position
+            self._entries.append(entry)
+            self._expires.append(expires_at)
+            self._last_used.append(now)
+            self._gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                self._postings.setdefault(gram, array('I')).append(position)
+            return True
+
+    def _make_room(self, now: float):
+        """Drop every expired entry, then least recently used ones until EVICT_SHARE of the index is free.
+
+        Kept entries are renumbered in their original order (so ties still go to the earlier entry)
+        and the postings are remapped rather than rebuilt from the titles. Called with the lock held.
+        """
+        count = len(self._entries)
+        expires = np.frombuffer(self._expires, dtype=np.float64).copy()
+        last_used = np.frombuffer(self._last_used, dtype=np.float64).copy()
+        expired = expires <= now
+        # Expired entries first, then the rest by last use; lexsort is stable, so older entries go first on ties
+        order = np.lexsort((last_used, ~expired))
+        target = self.max_entries - max(1, int(self.max_entries * self.EVICT_SHARE))
+        dropped = max(count - target, int(expired.sum()))
+        keep = np.sort(order[dropped:])
+        remap = np.full(count, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        self._positions = {key: int(remap[position]) for key, position in self._positions.items()
+                           if remap[position] >= 0}
+        self._entries = [self._entries[position] for position in keep.tolist()]
+        self._expires = array('d', expires[keep].tobytes())
+        self._last_used = array('d', last_used[keep].tobytes())
+        self._gram_counts = array('H', np.frombuffer(self._gram_counts, dtype=np.uint16)[keep].tobytes())
+        postings = {}
+        for gram, positions in self._postings.items():
+            moved = remap[np.frombuffer(positions, dtype=np.uint32)]
+            moved = moved[moved >= 0]
+            if len(moved):
+                postings[gram] = array('I', moved.astype(np.uint32).tobytes())
+        self._postings = postings
+
+        expirations = int(expired.sum())
+        self.stats['expirations'] += expirations
+        self.stats['evictions'] += dropped - expirations
+
+    def add(self, title: str, doc: Dict[str, Any]):
+        """Remember that title resolved to the search doc, under both the title and the work's own title.
+
+        The resolution is trusted for ttl_seconds from now; re-adding one renews it.
+        """
+        work_id = (doc.get('key') or '').split('/')[-1]
+        if not work_id:
+            return
+        entry = (work_id, doc.get('title') or title, (doc.get('author_name') or [None])[0])
+        expires_at = time.time() + self.ttl
+        added = [key for key in {self.normalize(title), self.normalize(entry[1])}
+                 if self._insert(key, entry, expires_at)]
+        if added and self.db_path:
+            try:
+                self._connect().executemany(
+                    "INSERT OR REPLACE INTO title_index (title_norm, work_id, title, author, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(key, *entry, expires_at) for key in added]
+                )
+            except sqlite3.Error as e:
+                logger.warning("Could not store title index entry: %s", e)
+
+    def lookup(self, title: str) -> Optional[Dict[str, Any]]:
+        """Search doc (key, title, author_name) for an unexpired exact or confident fuzzy match, else None"""
+        key = self.normalize(title)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            position = self._positions.get(key)
+            if position is not None:
+                if self._expires[position] <= now:
+                    # Let the live search confirm it - its answer renews the entry
+                    self.stats['expired'] += 1
+                    return None
+                self.stats['exact_hits'] += 1
+                self._last_used[position] = now
+                return self.search_doc(self._entries[position])
+
+            grams = self.trigrams(key)
+            postings = [self._postings[gram] for gram in grams if gram in self._postings]
+            best_score = runner_up = 0.0
+            if postings:
+                # Shared trigrams per candidate entry, then Dice similarity with expired entries zeroed;
+                # argmax keeps the earliest entry on ties. Buffer views are copied straight away - a
+                # live one would block appends.
+                positions, shared = np.unique(np.concatenate([np.frombuffer(p, dtype=np.uint32) for p in postings]),
+                                              return_counts=True)
+                gram_counts = np.frombuffer(self._gram_counts, dtype=np.uint16)[positions]
+                live = np.frombuffer(self._expires, dtype=np.float64)[positions] > now
+                scores = np.where(live, 2 * shared / (len(grams) + gram_counts), 0.0)
+                best_index = int(np.argmax(scores))
+                best, best_score = int(positions[best_index]), float(scores[best_index])
+                if best_score >= self.min_similarity:
+                    runner_up = self.runner_up_score(positions, scores, self._entries[best][0])
+            if best_score < self.min_similarity:
+                self.stats['misses'] += 1
+                return None
+            if best_score - runner_up < self.min_margin:
+                self.stats['ambiguous'] += 1
+                return None
+            self.stats['fuzzy_hits'] += 1
+            self._last_used[best] = now
+            entry = self._entries[best]
+        logger.info("Resolved %r to %r by fuzzy title match (%.2f, runner-up %.2f)",
+                    title, entry[1], best_score, runner_up)
+        return self.search_doc(entry)
+
+    def runner_up_score(self, positions: np.ndarray, scores: np.ndarray, work_id: str) -> float:
+        """Best score among the top RUNNER_UP_SCAN entries for a work other than work_id (0 if none)"""
+        if len(scores) > self.RUNNER_UP_SCAN:
+            top = np.argpartition(-scores, self.RUNNER_UP_SCAN - 1)[:self.RUNNER_UP_SCAN]
+        else:
+            top = np.arange(len(scores))
+        for index in top[np.argsort(-scores[top], kind='stable')]:
+            if self._entries[int(positions[index])][0] != work_id:
+                return float(scores[index])
+        return 0.0
+
+    @staticmethod
+    def search_doc(entry: Tuple[str, str, Optional[str]]) -> Dict[str, Any]:
+        work_id, title, author = entry
+        doc = {'key': f"/works/{work_id}", 'title': title}
+        if author:
+            doc['author_name'] = [author]
+        return doc
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({'entries': len(self._entries), 'trigrams': len(self._postings)})
+        return stats
+
+# (book_id, author, search doc, work details, position) - position is where a sequential scan of
+# the retrieval results would find the book, and breaks score ties
+Candidate = Tuple[str, str, Dict, Dict, tuple]
+
 class BookRecommender:
     def __init__(self):
-        self.rate_limiter = RateLimiter(14400, 20000)
-        try:
-            self.groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-            print("Successfully initialized Groq client")
-        except Exception as e:
-            print(f"Warning: Could not initialize Groq client: {e}")
-            self.groq_client = None
+        self.rate_limiter = LLMScheduler(LLM_REQUESTS_PER_DAY, LLM_TOKENS_PER_MINUTE, db_path=CACHE_DB_PATH)
+        # Created on first use (or by warm_up) - see groq_client
+        self._groq_client = None
+        self._groq_client_attempted = False
+        self._groq_client_lock = Lock()
+        self._async_groq_client = None
+        self._async_groq_client_attempted = False
+        self.warmed_up = threading.Event()
+        self._background_tasks = set()  # Async generations left running past a deadline
+        self.llm_flight = SingleFlight('llm', COALESCE_LLM_WAIT)
+        self.llm_flight_async = AsyncSingleFlight('llm', COALESCE_LLM_WAIT)
 
         try:
             self.lightweight_recommender = LightweightBookRecommender()
-            print("Successfully initialized Lightweight Book Recommender")
+            logger.info("Successfully initialized Lightweight Book Recommender")
             self.use_enhanced_algorithm = True
         except Exception as e:
-            print(f"Warning: Could not initialize Lightweight Book Recommender: {e}")
-            print("Falling back to basic similarity algorithm")
+            logger.warning("Could not initialize Lightweight Book Recommender, falling back to basic similarity "
+                           "algorithm: %s", e)
             self.use_enhanced_algorithm = False
 
+        self.openlibrary = OpenLibraryClient()
+        self.openlibrary_async = AsyncOpenLibraryClient(self.openlibrary)
+        self.catalog = LocalCatalog.open_if_exists(LOCAL_CATALOG_PATH)
+        if OPENLIBRARY_OFFLINE and not self.catalog:
+            logger.warning("OPENLIBRARY_OFFLINE is set but no local catalog is available")
+        self.subject_index = None  # Set once the background build finishes
+        if self.catalog and SUBJECT_INDEX_ENABLED and self.use_enhanced_algorithm:
+            threading.Thread(target=self.build_subject_index, name='subject-index', daemon=True).start()
+        self.title_index = TitleIndex(CACHE_DB_PATH) if TITLE_INDEX_ENABLED else None
+        if self.title_index:
+            threading.Thread(target=self.build_title_index, name='title-index', daemon=True).start()
+        self.work_cache = TieredCache(
+            'works',
+            max_entries=WORK_CACHE_MAX_ENTRIES,
+            ttl_seconds=WORK_CACHE_TTL,
+            db_path=CACHE_DB_PATH,
+            disk_max_entries=WORK_CACHE_DISK_MAX_ENTRIES
+        )
+        self.result_cache = TieredCache(
+            'results',
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=RESULT_CACHE_TTL,
+            db_path=CACHE_DB_PATH,
+            disk_max_entries=RESULT_CACHE_DISK_MAX_ENTRIES
+        )
+        self.llm_cache = TieredCache(
+            'llm',
+            max_entries=LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=LLM_CACHE_TTL,
+            db_path=CACHE_DB_PATH,
+            disk_max_entries=LLM_CACHE_DISK_MAX_ENTRIES
+        )
+        self.search_cache = TieredCache(
+            'search',
+            max_entries=SEARCH_CACHE_MAX_ENTRIES,
+            ttl_seconds=SEARCH_CACHE_TTL,
+            db_path=CACHE_DB_PATH,
+            disk_max_entries=SEARCH_CACHE_DISK_MAX_ENTRIES
+        )
+        # Popular titles and subjects, for the cache warmer
+        self.history = RequestHistory(CACHE_DB_PATH, WARMER_HISTORY_WINDOW) if WARMER_ENABLED else None
+
+    @property
+    def groq_client(self):
+        """Groq SDK client, or None if it can't be created.
+
+        Importing the SDK (and pydantic under it) is most of the app's import time, so it happens
+        here rather than at module import.
+        """
+        if not self._groq_client_attempted:
+            with self._groq_client_lock:
+                if not self._groq_client_attempted:
+                    self._groq_client = self._create_groq_client('Groq')
+                    self._groq_client_attempted = True
+        return self._groq_client
+
+    @property
+    def async_groq_client(self):
+        """AsyncGroq SDK client for the async route, created on first use like groq_client"""
+        if not self._async_groq_client_attempted:
+            with self._groq_client_lock:
+                if not self._async_groq_client_attempted:
+                    self._async_groq_client = self._create_groq_client('AsyncGroq')
+                    self._async_groq_client_attempted = True
+        return self._async_groq_client
+
+    def _create_groq_client(self, client_class: str):
+        try:
+            import groq
+            client = getattr(groq, client_class)(api_key=os.environ.get("GROQ_API_KEY"), base_url=GROQ_BASE_URL)
+            logger.info("Successfully initialized %s client", client_class)
+            return client
+        except Exception as e:
+            logger.warning("Could not initialize %s client: %s", client_class, e)
+            return None
+
+    def warm_up(self):
+        """Build the lazily created clients before the first request needs them"""
+        start_time = time.perf_counter()
+        try:
+            self.groq_client
+            self.async_groq_client
+        finally:
+            self.warmed_up.set()
+        logger.info("Warm-up finished in %.2fs", time.perf_counter() - start_time)
+
     def extract_year(self, date_str: str) -> Optional[int]:
         if not date_str:
             return None
@@ -601,49 +2546,593 @@ class BookRecommender:
                 return int(year_match.group())
             return None
 
+    @STAGE_SECONDS.labels('hydrate').time()
     def get_book_details(self, book_id: str) -> Dict[str, Any]:
-        try:
-            print(f"Fetching details for book ID: {book_id}")
-            for attempt in range(MAX_RETRIES):
-                try:
-                    work_response = requests.get(
-                        f"{OPEN_LIBRARY_WORKS}{book_id}.json",
-                        timeout=OPENLIB_TIMEOUT                        
-                    )
-                    if not work_response.ok:
-                        print(f"Failed to fetch book details: {work_response.status_code}")
-                        print(f"Response content: {work_response.text}")
-                        if attempt < MAX_RETRIES - 1:
-                            time.sleep(2 ** attempt)
-                            continue
-                        return None
+        # Callers annotate the returned dict (component_scores), so never hand out the cached object
+        cached = self.work_cache.get(book_id)
+        if cached is not None:
+            return dict(cached)
+
+        if self.catalog:
+            # Already on local disk, so not worth a cache entry
+            work_data = self.catalog.get_work(book_id)
+            if work_data is not None:
+                return work_data
+        if OPENLIBRARY_OFFLINE:
+            return None
+        return self.fetch_book_details(book_id)
+
+    def fetch_book_details(self, book_id: str) -> Optional[Dict[str, Any]]:
+        """Work details from the live API, stored in the work cache with a fresh expiry"""
+        log_sampled(logging.INFO, "Fetching details for book ID: %s", book_id)
+        work_data = self.openlibrary.get_work(book_id)
+        if work_data:
+            self.work_cache.set(book_id, dict(work_data))
+        return work_data
 
-                    work_data = work_response.json()
+    async def get_book_details_async(self, book_id: str) -> Dict[str, Any]:
+        with STAGE_SECONDS.labels('hydrate').time():
+            # Cache reads and writes can hit SQLite, so they run on worker threads like the catalog
+            cached = await asyncio.to_thread(self.work_cache.get, book_id)
+            if cached is not None:
+                return dict(cached)
+
+            if self.catalog:
+                work_data = await asyncio.to_thread(self.catalog.get_work, book_id)
+                if work_data is not None:
                     return work_data
+            if OPENLIBRARY_OFFLINE:
+                return None
 
-                except requests.exceptions.Timeout:
-                    print(f"Timeout on attempt {attempt + 1}")
-                    if attempt == MAX_RETRIES - 1:
-                        return None
-                    time.sleep(2 ** attempt)
-                except Exception as e:
-                    print(f"Error on attempt {attempt + 1}: {str(e)}")
-                    if attempt == MAX_RETRIES - 1:
-                        return None
-                    time.sleep(2 ** attempt)
+            log_sampled(logging.INFO, "Fetching details for book ID: %s", book_id)
+            work_data = await self.openlibrary_async.get_work(book_id)
+            if work_data:
+                await asyncio.to_thread(self.work_cache.set, book_id, dict(work_data))
+            return work_data
 
-            return None
+    @STAGE_SECONDS.labels('subject_search').time()
+    def search_subject(self, subject: str, limit: int = CANDIDATES_PER_SUBJECT,
+                       filters: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Return the OpenLibrary search docs for a subject, or an empty list on failure.
+
+        genre and yearRange filters narrow the query itself, so every returned slot can be used.
+        """
+        filters = filters or {}
+        year_range = filters.get('yearRange')
+        if self.catalog:
+            docs = self.catalog.search_subject(subject, limit, genre=filters.get('genre'), year_range=year_range)
+            if docs or OPENLIBRARY_OFFLINE:
+                return docs
+        elif OPENLIBRARY_OFFLINE:
+            return []
+
+        data = self.cached_search(self.subject_search_params(subject, limit, filters))
+        if not data:
+            logger.warning("OpenLibrary subject search failed for %s", subject)
+            return []
+        return data.get('docs', [])
+
+    async def search_subject_async(self, subject: str, limit: int = CANDIDATES_PER_SUBJECT,
+                                   filters: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        with STAGE_SECONDS.labels('subject_search').time():
+            filters = filters or {}
+            if self.catalog:
+                docs = await asyncio.to_thread(self.catalog.search_subject, subject, limit,
+                                               genre=filters.get('genre'), year_range=filters.get('yearRange'))
+                if docs or OPENLIBRARY_OFFLINE:
+                    return docs
+            elif OPENLIBRARY_OFFLINE:
+                return []
+
+            data = await self.cached_search_async(self.subject_search_params(subject, limit, filters))
+            if not data:
+                logger.warning("OpenLibrary subject search failed for %s", subject)
+                return []
+            return data.get('docs', [])
+
+    @staticmethod
+    def subject_search_params(subject: str, limit: int, filters: Dict) -> Dict[str, Any]:
+        """OpenLibrary search parameters for a subject, with the genre and yearRange filters in the query"""
+        year_range = filters.get('yearRange')
+        query = f'subject:{subject}'
+        if filters.get('genre'):
+            query += ' AND subject:"{}"'.format(filters['genre'].replace('"', ''))
+        if year_range:
+            query += f' AND first_publish_year:[{year_range[0]} TO {year_range[1]}]'
+        return {
+            'q': query,
+            'fields': 'key,title,author_name,first_publish_year,subject,cover_i',
+            'limit': limit
+        }
+
+    def fetch_candidates(self, subjects: List[str], input_book_ids: set, input_authors: set,
+                         filters: Optional[Dict] = None) -> Iterator[Candidate]:
+        """Search subjects and hydrate candidate works concurrently, yielding candidates as they become ready.
+
+        Work fetches start as soon as each subject search returns. A candidate is yielded once its
+        work details have arrived and no unfinished earlier subject search could still claim it, so
+        scoring overlaps retrieval. Docs failing the genre or yearRange filter are dropped before
+        their work is fetched. The time spent waiting on OpenLibrary is the retrieve stage.
+        """
+        filters = filters or {}
+        seen_books = {}  # book_id -> [position, author, search doc]
+        searches = {}  # future -> subject index
+        detail_futures = {}  # future -> book_id
+        fetched = {}  # book_id -> work details, held until its position is final
+        searches_done = [False] * len(subjects)
+        first_pending = 0  # Lowest subject index whose search hasn't finished
+        waited = 0.0
+
+        pending = set()
+        try:
+            for subject_idx, subject in enumerate(subjects):
+                future = submit_in_context(candidate_executor, self.search_subject, subject, CANDIDATES_PER_SUBJECT,
+                                           filters)
+                searches[future] = subject_idx
+                pending.add(future)
+            while pending:
+                started = time.perf_counter()
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                waited += time.perf_counter() - started
+                for future in done:
+                    if future in searches:
+                        subject_idx = searches[future]
+                        for book_id in self.collect_search_docs(seen_books, subject_idx, future.result(),
+                                                                input_book_ids, input_authors, filters):
+                            detail = submit_in_context(candidate_executor, self.get_book_details, book_id)
+                            detail_futures[detail] = book_id
+                            pending.add(detail)
+                        searches_done[subject_idx] = True
+                    elif future.result():
+                        fetched[detail_futures[future]] = future.result()
+
+                while first_pending < len(subjects) and searches_done[first_pending]:
+                    first_pending += 1
+                # Only an earlier subject's search could still move a book to a better position
+                for book_id in [book_id for book_id in fetched if seen_books[book_id][0][0] < first_pending]:
+                    position, author, b = seen_books[book_id]
+                    yield book_id, author, b, fetched.pop(book_id), position
+        finally:
+            # Also runs if the consumer stops early: this request's queued fetches are dropped from the
+            # shared pool, and those already running finish in the background
+            for future in pending:
+                future.cancel()
+            STAGE_SECONDS.labels('retrieve').observe(waited)
+
+    async def fetch_candidates_async(self, subjects: List[str], input_book_ids: set, input_authors: set,
+                                     filters: Optional[Dict] = None) -> List[Candidate]:
+        """fetch_candidates on the event loop, with at most CANDIDATE_FETCH_WORKERS calls in flight"""
+        filters = filters or {}
+        seen_books = {}
+        detail_tasks = {}
+        limiter = asyncio.Semaphore(CANDIDATE_FETCH_WORKERS)
+
+        async def limited(call, *args):
+            async with limiter:
+                return await call(*args)
+
+        async def search(subject_idx: int, subject: str):
+            return subject_idx, await limited(self.search_subject_async, subject, CANDIDATES_PER_SUBJECT, filters)
+
+        searches = [asyncio.ensure_future(search(subject_idx, subject)) for subject_idx, subject in enumerate(subjects)]
+        try:
+            for next_search in asyncio.as_completed(searches):
+                subject_idx, docs = await next_search
+                for book_id in self.collect_search_docs(seen_books, subject_idx, docs, input_book_ids,
+                                                        input_authors, filters):
+                    detail_tasks[book_id] = asyncio.ensure_future(limited(self.get_book_details_async, book_id))
+
+            candidates = []
+            for book_id, (position, author, b) in sorted(seen_books.items(), key=lambda item: item[1][0]):
+                book_details = await detail_tasks[book_id]
+                if book_details:
+                    candidates.append((book_id, author, b, book_details, position))
+        finally:
+            for task in searches + list(detail_tasks.values()):
+                task.cancel()
+
+        return candidates
+
+    @staticmethod
+    def collect_search_docs(seen_books: Dict[str, list], subject_idx: int, docs: List[Dict], input_book_ids: set,
+                            input_authors: set, filters: Dict) -> List[str]:
+        """Record one subject's search docs in seen_books (book_id -> [position, author, doc]).
+
+        Returns the ids seen for the first time, whose work details still need fetching.
+        """
+        new_books = []
+        for doc_idx, b in enumerate(docs):
+            book_id = b.get('key', '').split('/')[-1]
+            author = b.get('author_name', ['Unknown'])[0] if b.get('author_name') else 'Unknown'
+            if not book_id or book_id in input_book_ids or author in input_authors:
+                continue
+            if not search_doc_passes_filters(b, filters):
+                continue
+
+            position = (subject_idx, doc_idx)
+            if book_id in seen_books:
+                # Keep the occurrence a sequential scan would have found first
+                if position < seen_books[book_id][0]:
+                    seen_books[book_id] = [position, author, b]
+                continue
+
+            seen_books[book_id] = [position, author, b]
+            new_books.append(book_id)
+        return new_books
+
+    def build_subject_index(self):
+        start_time = time.time()
+        try:
+            index = SubjectIndex(self.lightweight_recommender.weights)
+            index.build(self.catalog.iter_index_rows(), self.lightweight_recommender.extract_year)
+        except Exception as e:
+            logger.exception("Could not build subject index: %s", e)
+            return
+        self.subject_index = index
+        logger.info("Subject index built in %.1fs", time.time() - start_time, extra={'fields': index.get_stats()})
+
+    def build_title_index(self):
+        start_time = time.time()
+        try:
+            self.title_index.load(self.catalog)
         except Exception as e:
-            print(f"Error fetching book details: {str(e)}")
+            logger.exception("Could not load title index: %s", e)
+            return
+        logger.info("Title index loaded in %.1fs", time.time() - start_time, extra={'fields': self.title_index.get_stats()})
+
+    def fetch_candidates_from_index(self, input_books: List[Dict], profile: ReaderProfile, input_book_ids: set,
+                                    input_authors: set, filters: Optional[Dict] = None) -> List[Candidate]:
+        """Top SUBJECT_INDEX_TOP_K catalog works for the reader that pass the filters, as fetch_candidates tuples"""
+        filters = filters or {}
+        details = {}
+        docs = {}
+
+        def keep(work_id: str) -> bool:
+            docs[work_id] = self.catalog.search_doc(work_id) or {}
+            return search_doc_passes_filters(docs[work_id], filters)
+
+        def score_works(work_ids: List[str]) -> List[Optional[float]]:
+            books = []
+            for work_id in work_ids:
+                # Straight from the catalog - the index's score bounds are computed from its fields
+                book_details = self.catalog.get_work(work_id)
+                if book_details:
+                    details[work_id] = book_details
+                    books.append(book_details)
+            with STAGE_SECONDS.labels('score').time():
+                scores, _ = self.lightweight_recommender.calculate_enhanced_similarity_batch(books, input_books, profile)
+            scores = iter(scores)
+            return [float(next(scores)) if work_id in details else None for work_id in work_ids]
+
+        def author_relation(name: str) -> float:
+            return self.lightweight_recommender.calculate_author_relation({'author_name': [name]}, input_books, profile)
+
+        ranked = self.subject_index.top_k(
+            profile, SUBJECT_INDEX_TOP_K, score_works, author_relation, input_book_ids, input_authors,
+            keep=keep if filters.get('genre') or filters.get('yearRange') else None,
+            min_score=filters.get('minScore')
+        )
+        candidates = []
+        for rank, (work_id, _) in enumerate(ranked):
+            doc = docs.get(work_id) or self.catalog.search_doc(work_id) or {}
+            author = doc.get('author_name', ['Unknown'])[0] if doc.get('author_name') else 'Unknown'
+            candidates.append((work_id, author, doc, details[work_id], (rank,)))
+        return candidates
+
+    def build_reader_profile(self, input_books: List[Dict]) -> ReaderProfile:
+        """Precompute input-book features once per request"""
+        if hasattr(self, 'use_enhanced_algorithm') and self.use_enhanced_algorithm:
+            return self.lightweight_recommender.build_reader_profile(input_books)
+        return ReaderProfile.from_input_books(input_books, subject_table, self.extract_year)
+
+    @STAGE_SECONDS.labels('resolve').time()
+    def resolve_input_books(self, book_titles: List[str]) -> Tuple[List[Dict], set, set]:
+        """Look up each title and fetch its work details.
+
+        Returns (input work details, input work ids, input first authors).
+        """
+        input_books = []
+        input_book_ids = set()
+        input_authors = set()
+
+        for title in book_titles:
+            logger.info("Processing book: %s", title)
+            data = self.search_title(title)
+
+            if data is None:
+                logger.warning("OpenLibrary API error for %s", title)
+                continue
+
+            if data.get('docs'):
+                book = data['docs'][0]
+                book_id = book.get('key', '').split('/')[-1]
+                input_book_ids.add(book_id)
+                if book.get('author_name'):
+                    input_authors.add(book.get('author_name')[0])
+                book_details = self.get_book_details(book_id)
+                if book_details:
+                    input_books.append(book_details)
+                else:
+                    logger.warning("Could not get details for book: %s", title)
+
+        return input_books, input_book_ids, input_authors
+
+    async def resolve_input_books_async(self, book_titles: List[str]) -> Tuple[List[Dict], set, set]:
+        """resolve_input_books with every title looked up (and then hydrated) concurrently"""
+        with STAGE_SECONDS.labels('resolve').time():
+            for title in book_titles:
+                logger.info("Processing book: %s", title)
+            searches = await asyncio.gather(*(self.search_title_async(title) for title in book_titles))
+
+            matches = []
+            input_book_ids = set()
+            input_authors = set()
+            for title, data in zip(book_titles, searches):
+                if data is None:
+                    logger.warning("OpenLibrary API error for %s", title)
+                elif data.get('docs'):
+                    book = data['docs'][0]
+                    book_id = book.get('key', '').split('/')[-1]
+                    input_book_ids.add(book_id)
+                    if book.get('author_name'):
+                        input_authors.add(book.get('author_name')[0])
+                    matches.append((title, book_id))
+
+            details = await asyncio.gather(*(self.get_book_details_async(book_id) for _, book_id in matches))
+            input_books = []
+            for (title, _), book_details in zip(matches, details):
+                if book_details:
+                    input_books.append(book_details)
+                else:
+                    logger.warning("Could not get details for book: %s", title)
+
+            return input_books, input_book_ids, input_authors
+
+    def search_title(self, title: str) -> Optional[Dict[str, Any]]:
+        """Best search match for a title - title index first, then the local catalog, then the live API"""
+        doc = self.title_index.lookup(title) if self.title_index else None
+        if doc is not None:
+            return {'docs': [doc]}
+        if self.catalog:
+            docs = self.catalog.search_title(title, limit=1)
+            if docs or OPENLIBRARY_OFFLINE:
+                return self.remember_title(title, {'docs': docs})
+        elif OPENLIBRARY_OFFLINE:
+            return {'docs': []}
+
+        return self.remember_title(title, self.cached_search(self.title_search_params(title)))
+
+    async def search_title_async(self, title: str) -> Optional[Dict[str, Any]]:
+        doc = await asyncio.to_thread(self.title_index.lookup, title) if self.title_index else None
+        if doc is not None:
+            return {'docs': [doc]}
+        if self.catalog:
+            docs = await asyncio.to_thread(self.catalog.search_title, title, limit=1)
+            if docs or OPENLIBRARY_OFFLINE:
+                return await asyncio.to_thread(self.remember_title, title, {'docs': docs})
+        elif OPENLIBRARY_OFFLINE:
+            return {'docs': []}
+
+        data = await self.cached_search_async(self.title_search_params(title))
+        return await asyncio.to_thread(self.remember_title, title, data)
+
+    def remember_title(self, title: str, data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Add a search's best match to the title index, so the next lookup of the title stays local"""
+        if self.title_index and data and data.get('docs'):
+            self.title_index.add(title, data['docs'][0])
+        return data
+
+    @staticmethod
+    def title_search_params(title: str) -> Dict[str, Any]:
+        return {'q': title, 'fields': 'key,title,author_name,first_publish_year,subject,cover_i', 'limit': 1}
+
+    @staticmethod
+    def search_cache_key(params: Dict[str, Any]) -> str:
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def cached_search(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """OpenLibrary search through the search cache - only the docs are kept, failures are not cached"""
+        cached = self.search_cache.get(self.search_cache_key(params))
+        if cached is not None:
+            return cached
+        return self.fetch_search(params)
+
+    def fetch_search(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Live OpenLibrary search, stored in the search cache with a fresh expiry; None on failure"""
+        data = self.openlibrary.search(params)
+        if data is None:
+            return None
+        data = {'docs': data.get('docs', [])}
+        self.search_cache.set(self.search_cache_key(params), data)
+        return data
+
+    async def cached_search_async(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self.search_cache_key(params)
+        cached = await asyncio.to_thread(self.search_cache.get, key)
+        if cached is not None:
+            return cached
+        data = await self.openlibrary_async.search(params)
+        if data is None:
+            return None
+        data = {'docs': data.get('docs', [])}
+        await asyncio.to_thread(self.search_cache.set, key, data)
+        return data
+
+    @STAGE_SECONDS.labels('build').time()
+    def build_recommendations(self, book_titles: List[str], filters: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """Run resolve -> retrieve -> score -> select top-k and return a ranked snapshot, best first.
+
+        The snapshot holds no filter or page state, so it can be cached and re-sliced for later
+        pages and filter changes. Entries carry the trimmed work details they were scored on but
+        no generated text - decorate_recommendations does that for the page actually returned.
+        Pushed-down filters (see pushdown_filters) narrow retrieval, and the snapshot records them.
+        Returns None if no input book could be resolved.
+        """
+        filters = filters or {}
+        input_books, input_book_ids, input_authors = self.resolve_input_books(book_titles)
+        if not input_books:
             return None
 
-    def calculate_similarity_score(self, candidate_book: Dict, input_books: List[Dict]) -> float:
+        logger.info("Successfully processed %d books", len(input_books))
+        profile = self.build_reader_profile(input_books)
+
+        candidates = self.iter_candidates(input_books, profile, input_book_ids, input_authors, filters)
+        return self.ranked_snapshot(book_titles, filters, input_books, profile, candidates)
+
+    async def build_recommendations_async(self, book_titles: List[str],
+                                          filters: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """build_recommendations for the async route: upstream calls are awaited, ranking is shared"""
+        with STAGE_SECONDS.labels('build').time():
+            filters = filters or {}
+            input_books, input_book_ids, input_authors = await self.resolve_input_books_async(book_titles)
+            if not input_books:
+                return None
+
+            logger.info("Successfully processed %d books", len(input_books))
+            profile = self.build_reader_profile(input_books)
+
+            with STAGE_SECONDS.labels('retrieve').time():
+                if self.subject_index is not None:
+                    # CPU-bound and local - keep it off the event loop
+                    candidates = await asyncio.to_thread(
+                        self.fetch_candidates_from_index, input_books, profile, input_book_ids, input_authors, filters
+                    )
+                else:
+                    subjects = self.candidate_subjects(input_books)
+                    await asyncio.to_thread(self.record_subjects, subjects)
+                    candidates = await self.fetch_candidates_async(subjects, input_book_ids, input_authors, filters)
+            # NumPy batch scoring - off the event loop too
+            return await asyncio.to_thread(self.ranked_snapshot, book_titles, filters, input_books, profile, candidates)
+
+    def ranked_snapshot(self, book_titles: List[str], filters: Dict, input_books: List[Dict], profile: ReaderProfile,
+                        candidates: Iterable[Candidate]) -> Dict[str, Any]:
+        """Score -> select top-k stages of build_recommendations, shared by the sync and async paths"""
+        scored = ((candidate, score) for candidate, score in self.iter_scored(candidates, input_books, profile)
+                  if min_score_allows(score, filters))
+        ranked = [self.rank_entry(candidate, score) for candidate, score in self.select_top_k(scored, RESULT_SNAPSHOT_SIZE)]
+        return {'book_titles': book_titles, 'filters': filters, 'input_books': input_books, 'recommendations': ranked}
+
+    def iter_candidates(self, input_books: List[Dict], profile: ReaderProfile, input_book_ids: set,
+                        input_authors: set, filters: Optional[Dict] = None) -> Iterable[Candidate]:
+        """Retrieve stage: (book_id, author, search doc, work details, position) candidates.
+
+        From the subject index this is its finished top-k list; from subject searches candidates
+        stream in as their work details arrive, so scoring starts before retrieval is done.
+        """
+        if self.subject_index is not None:
+            # Rank the whole local catalog rather than a few search pages per subject
+            with STAGE_SECONDS.labels('retrieve').time():
+                return self.fetch_candidates_from_index(input_books, profile, input_book_ids, input_authors, filters)
+
+        subjects = self.candidate_subjects(input_books)
+        self.record_subjects(subjects)
+        return self.fetch_candidates(subjects, input_book_ids, input_authors, filters)
+
+    def record_subjects(self, subjects: List[str]):
+        if self.history:
+            self.history.record('subject', subjects)
+
+    @staticmethod
+    def candidate_subjects(input_books: List[Dict]) -> List[str]:
+        """The CANDIDATE_SUBJECTS most common subjects across the input books"""
+        all_subjects = []
+        for book in input_books:
+            subjects = book.get('subjects', [])
+            all_subjects.extend(subjects)
+        return [subject for (subject, _) in Counter(all_subjects).most_common(CANDIDATE_SUBJECTS)]
+
+    def iter_scored(self, candidates: Iterable[Candidate], input_books: List[Dict],
+                    profile: ReaderProfile) -> Iterator[Tuple[Candidate, float]]:
+        """Score stage: (candidate, score) pairs, scored in vectorized batches as candidates arrive"""
+        batch = []
+        for candidate in candidates:
+            batch.append(candidate)
+            if len(batch) >= SCORE_BATCH_SIZE:
+                yield from zip(batch, self.score_candidates([c[3] for c in batch], input_books, profile))
+                batch = []
+        if batch:
+            yield from zip(batch, self.score_candidates([c[3] for c in batch], input_books, profile))
+
+    @staticmethod
+    def select_top_k(scored: Iterable[Tuple[Candidate, float]], k: int) -> List[Tuple[Candidate, float]]:
+        """Best k (candidate, score) pairs by displayed score, ties in candidate position order.
+
+        Positions follow a sequential scan, so the result doesn't depend on the order candidates arrive in.
+        """
+        return heapq.nsmallest(k, scored, key=lambda item: (-round(item[1] * 100, 1), item[0][4]))
+
+    def rank_entry(self, candidate: Candidate, score: float) -> Dict[str, Any]:
+        """Snapshot entry for a scored candidate - everything filters and decoration need, no text yet"""
+        book_id, author, b, book_details, _ = candidate
+        return {
+            'id': book_id,
+            'title': b.get('title', ''),
+            'author': author,
+            'year': b.get('first_publish_year'),
+            'genres': b.get('subject', [])[:5] if b.get('subject') else [],
+            'similarity_score': round(score * 100, 1),
+            'score': score,
+            'cover_id': b.get('cover_i'),
+            'details': {field: book_details[field] for field in DECORATION_DETAIL_FIELDS if field in book_details}
+        }
+
+    @STAGE_SECONDS.labels('decorate').time()
+    def decorate_recommendations(self, entries: List[Dict], input_books: List[Dict],
+                                 profile: ReaderProfile) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """Decorate stage: explanation, why_read and cover for the entries actually being returned.
+
+        Returns the response recommendations and the work details they were built from, by id.
+        """
+        recommendations = []
+        details = {}
+        for entry in entries:
+            book_details = dict(entry['details'])
+            details[entry['id']] = book_details
+            cover_id = entry.get('cover_id')
+            recommendations.append({
+                'id': entry['id'],
+                'title': entry['title'],
+                'author': entry['author'],
+                'year': entry['year'],
+                'genres': entry['genres'],
+                'similarity_score': entry['similarity_score'],
+                'explanation': self.generate_explanation(book_details, input_books, entry['similarity_score'], profile),
+                'why_read': self.generate_reading_recommendation(book_details, input_books),
+                'cover_url': f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None,
+            })
+        return recommendations, details
+
+    @STAGE_SECONDS.labels('score').time()
+    def score_candidates(self, candidate_books: List[Dict], input_books: List[Dict],
+                         profile: Optional[ReaderProfile] = None) -> List[float]:
+        """Score a list of candidates, using the vectorized scorer when available"""
+        if profile is None:
+            profile = self.build_reader_profile(input_books)
+        if hasattr(self, 'use_enhanced_algorithm') and self.use_enhanced_algorithm and candidate_books:
+            try:
+                scores, component_scores = self.lightweight_recommender.calculate_enhanced_similarity_batch(
+                    candidate_books, input_books, profile
+                )
+                for i, book in enumerate(candidate_books):
+                    book['component_scores'] = {
+                        feature: float(values[i]) for feature, values in component_scores.items()
+                    }
+                return [float(score) for score in scores]
+            except Exception as e:
+                logger.exception("Error using batch scoring, falling back to per-book scoring: %s", e)
+
+        return [self.calculate_similarity_score(book, input_books, profile) for book in candidate_books]
+
+    def calculate_similarity_score(self, candidate_book: Dict, input_books: List[Dict],
+                                   profile: Optional[ReaderProfile] = None) -> float:
         """Calculate similarity score between candidate book and input books"""
+        if profile is None:
+            profile = self.build_reader_profile(input_books)
         # Use lightweight algorithm if available
         if hasattr(self, 'use_enhanced_algorithm') and self.use_enhanced_algorithm:
             try:
                 score, component_scores = self.lightweight_recommender.calculate_enhanced_similarity(
-                    candidate_book, input_books
+                    candidate_book, input_books, profile
                 )
                 
                 # Store component scores for later explanation generation
@@ -651,8 +3140,7 @@ class BookRecommender:
                 
                 return score
             except Exception as e:
-                print(f"Error using lightweight algorithm: {str(e)}")
-                print("Falling back to basic similarity algorithm")
+                logger.exception("Error using lightweight algorithm, falling back to basic similarity: %s", e)
                 # Fall back to basic algorithm on error
         
         # Basic algorithm (your original implementation)
@@ -661,27 +3149,18 @@ class BookRecommender:
             'year_match': 0.2
         }
     
-        input_subjects = set()
-        for b in input_books:
-            if 'subjects' in b and isinstance(b['subjects'], list):
-                input_subjects.update(b['subjects'])
+        input_subjects = profile.raw_subject_ids
     
         candidate_subjects = set()
         if 'subjects' in candidate_book and isinstance(candidate_book['subjects'], list):
-            candidate_subjects.update(candidate_book['subjects'])
+            candidate_subjects.update(subject_table.raw_id(s) for s in candidate_book['subjects'])
     
         subject_similarity = len(input_subjects & candidate_subjects) / max(len(input_subjects | candidate_subjects), 1)
     
         candidate_year = self.extract_year(candidate_book.get('first_publish_date', ''))
-        input_years = []
-        for ib in input_books:
-            year = self.extract_year(ib.get('first_publish_date', ''))
-            if year:
-                input_years.append(year)
     
-        if input_years and candidate_year:
-            avg_year = sum(input_years) / len(input_years)
-            year_similarity = 1 / (1 + abs(candidate_year - avg_year) / 100)
+        if profile.mean_year is not None and candidate_year:
+            year_similarity = 1 / (1 + abs(candidate_year - profile.mean_year) / 100)
         else:
             year_similarity = 0
     
@@ -691,43 +3170,36 @@ class BookRecommender:
         )
         return score
 
-    def generate_explanation(self, book: Dict, input_books: List[Dict], similarity_score: float) -> str:
-        """Generate explanation of why this book was recommended"""
+    def generate_explanation(self, book: Dict, input_books: List[Dict], similarity_score: float,
+                             profile: Optional[ReaderProfile] = None) -> str:
+        """Generate explanation of why this book was recommended (similarity_score is a percentage, 0-100)"""
+        if profile is None:
+            profile = self.build_reader_profile(input_books)
         # Use enhanced explanation if component scores are available
         if 'component_scores' in book and hasattr(self, 'use_enhanced_algorithm') and self.use_enhanced_algorithm:
             try:
                 explanation = self.lightweight_recommender.generate_detailed_explanation(
-                    book, input_books, similarity_score * 100, book['component_scores']
+                    book, input_books, similarity_score, book['component_scores'], profile
                 )
                 return explanation
             except Exception as e:
-                print(f"Error generating enhanced explanation: {str(e)}")
+                logger.warning("Error generating enhanced explanation: %s", e)
                 # Fall back to basic explanation on error
         
         # Basic explanation (your original implementation)
         explanations = []
     
         book_subjects = set(book.get('subjects', []) if isinstance(book.get('subjects', []), list) else [])
-        input_subjects = set()
-        for input_book in input_books:
-            if isinstance(input_book.get('subjects', []), list):
-                input_subjects.update(input_book.get('subjects', []))
     
-        shared_subjects = book_subjects & input_subjects
+        shared_subjects = book_subjects & profile.subject_set
         if shared_subjects:
             subject_examples = list(shared_subjects)[:3]
             explanations.append(f"shares genres like {', '.join(subject_examples)}")
     
         book_year = self.extract_year(book.get('first_publish_date', ''))
-        input_years = []
-        for input_book in input_books:
-            year = self.extract_year(input_book.get('first_publish_date', ''))
-            if year:
-                input_years.append(year)
     
-        if input_years and book_year:
-            avg_year = sum(input_years) / len(input_years)
-            year_diff = abs(book_year - avg_year)
+        if profile.mean_year is not None and book_year:
+            year_diff = abs(book_year - profile.mean_year)
             if year_diff <= 20:
                 explanations.append("was published around the same time")
             elif year_diff <= 50:
@@ -772,22 +3244,45 @@ class BookRecommender:
         recommendation = ' and '.join(parts) + '.'
         return recommendation
 
-    def call_groq_api(self, prompt: str, max_tokens: int = 512) -> Optional[str]:
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[str]:
+        """Retry-After header of a failed Groq call, if the error carries a response"""
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+        return headers.get('retry-after') if headers is not None else None
+
+    @staticmethod
+    def llm_call_key(prompt: str, max_tokens: int) -> str:
+        return hashlib.sha256(f"{max_tokens}:{prompt}".encode('utf-8')).hexdigest()
+
+    def call_groq_api(self, prompt: str, max_tokens: int = 512, priority: int = PRIORITY_PAGE) -> Optional[str]:
+        """Completion text for a prompt, or None. Identical prompts already in flight share that generation."""
+        try:
+            return self.llm_flight.do(self.llm_call_key(prompt, max_tokens), self.request_completion,
+                                      prompt, max_tokens, priority)
+        except SingleFlightTimeout as e:
+            logger.warning("Gave up waiting for a duplicate Groq generation: %s", e)
+            return None
+
+    def request_completion(self, prompt: str, max_tokens: int = 512, priority: int = PRIORITY_PAGE) -> Optional[str]:
         try:
             if not self.groq_client:
-                print("Groq client not initialized")
+                logger.warning("Groq client not initialized")
                 return None
 
-            estimated_tokens = len(prompt.split()) + max_tokens
-
-            if not self.can_make_request(estimated_tokens):
-                print("Rate limit reached, falling back to basic generation")
-                return None
+            # Roughly 4 characters per token for the prompt, plus the full completion budget
+            estimated_tokens = len(prompt) // 4 + max_tokens
+            host = upstream_host(GROQ_BASE_URL)
 
             max_retries = 5
             for attempt in range(max_retries):
+                # Every attempt is a separate request against the quota
+                if not self.rate_limiter.acquire(estimated_tokens, priority):
+                    logger.warning("Rate limit reached, falling back to basic generation")
+                    return None
+
+                status = None
                 try:
-                    print(f"Making Groq API call, attempt {attempt + 1}")
+                    logger.debug("Making Groq API call, attempt %d", attempt + 1)
                     start_time = time.time()
 
                     # Set a longer timeout for the API call
@@ -802,48 +3297,247 @@ class BookRecommender:
                         timeout=GROQ_TIMEOUT  # 150 second timeout
                     )
 
-                    response_time = time.time() - start_time
-                    print(f"Groq API response received in {response_time:.2f} seconds")
+                    response_time = time.time() - start_time
+                    logger.info("Groq API response received in %.2f seconds", response_time)
+                    status = '200'
+                    UPSTREAM_REQUESTS.labels(host, status).inc()
+                    UPSTREAM_SECONDS.labels(host).observe(response_time)
+
+                    content = self.completion_text(chat_completion, estimated_tokens)
+                    if content:
+                        return content
+
+                except Exception as e:
+                    logger.warning("Groq API attempt %d failed: %s", attempt + 1, e)
+                    if status is None:
+                        status = str(getattr(e, 'status_code', None) or 'error')
+                        UPSTREAM_REQUESTS.labels(host, status).inc()
+                    if getattr(e, 'status_code', None) == 429:  # groq.RateLimitError
+                        self.rate_limiter.throttle(self.retry_after(e))
+                    if attempt < max_retries - 1:
+                        # No sleep here - the retry waits in the scheduler until the quota allows it
+                        UPSTREAM_RETRIES.labels(host, status).inc()
+                    else:
+                        logger.error("All Groq retries failed")
+                        return None
+
+            return None
+
+        except Exception as e:
+            logger.exception("Unexpected error in request_completion: %s", e)
+            return None
+
+    async def call_groq_api_async(self, prompt: str, max_tokens: int = 512,
+                                  priority: int = PRIORITY_PAGE) -> Optional[str]:
+        """call_groq_api on the AsyncGroq client: same quota, retries, metrics and coalescing, but never blocks the loop"""
+        try:
+            return await self.llm_flight_async.do(self.llm_call_key(prompt, max_tokens),
+                                                  self.request_completion_async, prompt, max_tokens, priority)
+        except SingleFlightTimeout as e:
+            logger.warning("Gave up waiting for a duplicate Groq generation: %s", e)
+            return None
+
+    async def request_completion_async(self, prompt: str, max_tokens: int = 512,
+                                       priority: int = PRIORITY_PAGE) -> Optional[str]:
+        try:
+            if not self.async_groq_client:
+                logger.warning("Groq client not initialized")
+                return None
+
+            estimated_tokens = len(prompt) // 4 + max_tokens
+            host = upstream_host(GROQ_BASE_URL)
+
+            max_retries = 5
+            for attempt in range(max_retries):
+                if not await self.rate_limiter.acquire_async(estimated_tokens, priority):
+                    logger.warning("Rate limit reached, falling back to basic generation")
+                    return None
+
+                status = None
+                try:
+                    logger.debug("Making Groq API call, attempt %d", attempt + 1)
+                    start_time = time.time()
+                    chat_completion = await self.async_groq_client.chat.completions.create(
+                        messages=[{
+                            "role": "user",
+                            "content": prompt
+                        }],
+                        model="groq/compound",
+                        temperature=0.7,
+                        max_tokens=max_tokens,
+                        timeout=GROQ_TIMEOUT
+                    )
+
+                    response_time = time.time() - start_time
+                    logger.info("Groq API response received in %.2f seconds", response_time)
+                    status = '200'
+                    UPSTREAM_REQUESTS.labels(host, status).inc()
+                    UPSTREAM_SECONDS.labels(host).observe(response_time)
+
+                    content = self.completion_text(chat_completion, estimated_tokens)
+                    if content:
+                        return content
+
+                except Exception as e:
+                    logger.warning("Groq API attempt %d failed: %s", attempt + 1, e)
+                    if status is None:
+                        status = str(getattr(e, 'status_code', None) or 'error')
+                        UPSTREAM_REQUESTS.labels(host, status).inc()
+                    if getattr(e, 'status_code', None) == 429:  # groq.RateLimitError
+                        self.rate_limiter.throttle(self.retry_after(e))
+                    if attempt < max_retries - 1:
+                        UPSTREAM_RETRIES.labels(host, status).inc()
+                    else:
+                        logger.error("All Groq retries failed")
+                        return None
+
+            return None
+
+        except Exception as e:
+            logger.exception("Unexpected error in request_completion_async: %s", e)
+            return None
+
+    def completion_text(self, chat_completion, estimated_tokens: int) -> Optional[str]:
+        """Reconcile the reservation with the reported usage and return the reply text.
 
-                    if chat_completion.choices and chat_completion.choices[0].message.content:
-                        content = chat_completion.choices[0].message.content.strip()
-                        if len(content) > 10:  # Ensure we have meaningful content
-                            return content
-                        else:
-                            raise Exception("Response too short")
+        Raises on a reply too short to be meaningful, so the caller's retry path handles it.
+        """
+        usage = getattr(chat_completion, 'usage', None)
+        if usage and usage.total_tokens:
+            self.rate_limiter.reconcile(estimated_tokens, usage.total_tokens)
 
-                except Exception as e:
-                    print(f"Groq API attempt {attempt + 1} failed: {str(e)}")
-                    if attempt < max_retries - 1:
-                        sleep_time = 10 * (2 ** attempt)  # Longer wait between retries
-                        print(f"Waiting {sleep_time} seconds before retry")
-                        time.sleep(sleep_time)
-                    else:
-                        print("All retries failed")
-                        return None
+        if chat_completion.choices and chat_completion.choices[0].message.content:
+            content = chat_completion.choices[0].message.content.strip()
+            if len(content) > 10:  # Ensure we have meaningful content
+                return content
+            else:
+                raise Exception("Response too short")
+        return None
+
+    def call_groq_api_stream(self, prompt: str, on_delta: Callable[[str], None], max_tokens: int = 512,
+                             priority: int = PRIORITY_PAGE) -> Optional[str]:
+        """Token-streamed completion: on_delta gets each content fragment, the full text is returned.
 
+        Single attempt - once fragments have been forwarded a retry would duplicate them.
+        """
+        if not self.groq_client:
+            logger.warning("Groq client not initialized")
             return None
 
+        estimated_tokens = len(prompt) // 4 + max_tokens
+        if not self.rate_limiter.acquire(estimated_tokens, priority):
+            logger.warning("Rate limit reached, falling back to basic generation")
+            return None
+
+        host = upstream_host(GROQ_BASE_URL)
+        start_time = time.perf_counter()
+        parts = []
+        try:
+            stream = self.groq_client.chat.completions.create(
+                messages=[{
+                    "role": "user",
+                    "content": prompt
+                }],
+                model="groq/compound",
+                temperature=0.7,
+                max_tokens=max_tokens,
+                timeout=GROQ_TIMEOUT,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    on_delta(chunk.choices[0].delta.content)
+                # Groq reports usage on the final chunk
+                usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+                if usage and usage.total_tokens:
+                    self.rate_limiter.reconcile(estimated_tokens, usage.total_tokens)
         except Exception as e:
-            print(f"Unexpected error in call_groq_api: {str(e)}")
+            logger.warning("Groq streaming call failed: %s", e)
+            UPSTREAM_REQUESTS.labels(host, str(getattr(e, 'status_code', None) or 'error')).inc()
+            if getattr(e, 'status_code', None) == 429:  # groq.RateLimitError
+                self.rate_limiter.throttle(self.retry_after(e))
             return None
+        UPSTREAM_REQUESTS.labels(host, '200').inc()
+        UPSTREAM_SECONDS.labels(host).observe(time.perf_counter() - start_time)
+
+        content = ''.join(parts).strip()
+        return content if len(content) > 10 else None
 
     def can_make_request(self, estimated_tokens: int) -> bool:
-        return self.rate_limiter.can_make_request(estimated_tokens)
+        """Non-blocking quota check"""
+        return self.rate_limiter.acquire(estimated_tokens, timeout=0)
 
-    def generate_similarity_explanation_with_ai(self, book: Dict, input_books: List[Dict], similarity_score: float) -> str:
-        shared_subjects = set(book.get('subjects', [])) & set(sum([b.get('subjects', []) for b in input_books], []))
+    def work_id(self, book: Dict) -> Optional[str]:
+        """OpenLibrary work id (e.g. OL45883W) of a work details record"""
+        key = book.get('key') or ''
+        return key.split('/')[-1] or None
 
-        book_year = self.extract_year(book.get('first_publish_date', ''))
-        input_years = []
-        for input_book in input_books:
-            year = self.extract_year(input_book.get('first_publish_date', ''))
-            if year:
-                input_years.append(year)
+    def explanation_cache_key(self, book: Dict, profile: ReaderProfile, similarity_score: float) -> Optional[str]:
+        """Keyed on everything explanation_prompt renders: the book, the reader profile and the score"""
+        work_id = self.work_id(book)
+        if not work_id:
+            return None
+        return f"explanation:{EXPLANATION_PROMPT_VERSION}:{work_id}:{profile.fingerprint}:{similarity_score:.1f}"
+
+    def why_read_cache_key(self, book: Dict) -> Optional[str]:
+        work_id = self.work_id(book)
+        return f"why_read:{WHY_READ_PROMPT_VERSION}:{work_id}" if work_id else None
+
+    def page_cache_key(self, field: str, book: Dict, profile: Optional[ReaderProfile] = None,
+                       similarity_score: Optional[float] = None) -> Optional[str]:
+        """Cache key for a field generated by the batched page prompt (explanation keys need the profile and score)"""
+        work_id = self.work_id(book)
+        if not work_id:
+            return None
+        if field == 'explanation':
+            return f"page_explanation:{PAGE_PROMPT_VERSION}:{work_id}:{profile.fingerprint}:{similarity_score:.1f}"
+        return f"page_why_read:{PAGE_PROMPT_VERSION}:{work_id}"
+
+    def generate_similarity_explanation_with_ai(self, book: Dict, input_books: List[Dict], similarity_score: float,
+                                                profile: Optional[ReaderProfile] = None,
+                                                on_delta: Optional[Callable[[str], None]] = None) -> str:
+        if profile is None:
+            profile = self.build_reader_profile(input_books)
+
+        cache_key = self.explanation_cache_key(book, profile, similarity_score)
+        cached = self.llm_cache.get(cache_key) if cache_key else None
+        if cached:
+            return cached
+
+        prompt = self.explanation_prompt(book, profile, similarity_score)
+        if on_delta:
+            response = self.call_groq_api_stream(prompt, on_delta, max_tokens=256)
+        else:
+            response = self.call_groq_api(prompt, max_tokens=256)
+        if response:
+            if cache_key:
+                self.llm_cache.set(cache_key, response.strip())
+            return response.strip()
+        return self.generate_explanation(book, input_books, similarity_score, profile)
+
+    async def generate_similarity_explanation_with_ai_async(self, book: Dict, input_books: List[Dict],
+                                                            similarity_score: float, profile: ReaderProfile) -> str:
+        cache_key = self.explanation_cache_key(book, profile, similarity_score)
+        cached = await asyncio.to_thread(self.llm_cache.get, cache_key) if cache_key else None
+        if cached:
+            return cached
+
+        response = await self.call_groq_api_async(self.explanation_prompt(book, profile, similarity_score),
+                                                  max_tokens=256)
+        if response:
+            if cache_key:
+                await asyncio.to_thread(self.llm_cache.set, cache_key, response.strip())
+            return response.strip()
+        return self.generate_explanation(book, input_books, similarity_score, profile)
+
+    def explanation_prompt(self, book: Dict, profile: ReaderProfile, similarity_score: float) -> str:
+        shared_subjects = set(book.get('subjects', [])) & profile.subject_set
 
-        avg_year = sum(input_years) / len(input_years) if input_years else None
+        book_year = self.extract_year(book.get('first_publish_date', ''))
+        avg_year = profile.mean_year
 
-        prompt = f"""Analyze why this book matches the reader's preferences:
+        return f"""Analyze why this book matches the reader's preferences:
         Book Details:
         Title: {book.get('title', '')}
         Author: {book.get('author_name', ['Unknown'])[0] if book.get('author_name') else 'Unknown'}
@@ -851,17 +3545,46 @@ class BookRecommender:
         Shared Genres: {', '.join(list(shared_subjects)[:3])}
         Similarity Score: {similarity_score:.1f}%
         Reader's Preferences:
-        - Favorite Genres: {', '.join(list(set(sum([b.get('subjects', [])[:3] for b in input_books], []))))}
+        - Favorite Genres: {', '.join(profile.favorite_genres)}
         - Preferred Era: Around {int(avg_year) if avg_year else 'Unknown'}
         Explain why this book would appeal to the reader based on these matches. Use 2nd person like you and your. Please don't mention the date. Focus on specific connections and shared elements. Keep it concise (4-5 sentences) and analytical."""
 
-        response = self.call_groq_api(prompt, max_tokens=256)
+    def generate_reading_recommendation_with_ai(self, book: Dict, input_books: List[Dict],
+                                                on_delta: Optional[Callable[[str], None]] = None,
+                                                priority: int = PRIORITY_PAGE) -> str:
+        # why_read depends only on the book, so it is shared by every reader
+        cache_key = self.why_read_cache_key(book)
+        cached = self.llm_cache.get(cache_key) if cache_key else None
+        if cached:
+            return cached
+
+        prompt = self.why_read_prompt(book)
+        if on_delta:
+            response = self.call_groq_api_stream(prompt, on_delta, priority=priority)
+        else:
+            response = self.call_groq_api(prompt, priority=priority)
+        if response:
+            if cache_key:
+                self.llm_cache.set(cache_key, response.strip())
+            return response.strip()
+        return self.generate_reading_recommendation(book, input_books)
+
+    async def generate_reading_recommendation_with_ai_async(self, book: Dict, input_books: List[Dict]) -> str:
+        cache_key = self.why_read_cache_key(book)
+        cached = await asyncio.to_thread(self.llm_cache.get, cache_key) if cache_key else None
+        if cached:
+            return cached
+
+        response = await self.call_groq_api_async(self.why_read_prompt(book))
         if response:
+            if cache_key:
+                await asyncio.to_thread(self.llm_cache.set, cache_key, response.strip())
             return response.strip()
-        return self.generate_explanation(book, input_books, similarity_score)
+        return self.generate_reading_recommendation(book, input_books)
 
-    def generate_reading_recommendation_with_ai(self, book: Dict, input_books: List[Dict]) -> str:
-        prompt = f"""Create a detailed and compelling recommendation for why someone should read this book:
+    @staticmethod
+    def why_read_prompt(book: Dict) -> str:
+        return f"""Create a detailed and compelling recommendation for why someone should read this book:
         Title: {book.get('title', '')}
         Author: {book.get('author_name', ['Unknown'])[0] if book.get('author_name') else 'Unknown'}
         Year: {book.get('first_publish_date', 'Unknown')}
@@ -877,28 +3600,778 @@ class BookRecommender:
         Provide specific details and compelling reasons.
         Aim for 4-6 sentences that paint a vivid picture of the reading experience."""
 
-        response = self.call_groq_api(prompt)
-        if response:
-            return response.strip()
-        return self.generate_reading_recommendation(book, input_books)
+    def generate_page_with_ai(self, books: List[Tuple[Dict, float]], input_books: List[Dict],
+                              profile: ReaderProfile, fields: Tuple[str, ...] = ('explanation', 'why_read'),
+                              priority: int = PRIORITY_PAGE) -> Dict[str, Dict[str, str]]:
+        """Explanation and why_read text for a page of (book details, score) pairs in a single Groq call.
+
+        Cached text is reused and only the missing fields are requested. Returns texts keyed by
+        work id; a field is absent when it could be neither found in the cache nor parsed from the reply.
+        Texts are cached under page_cache_key, apart from the single-book prompts' entries.
+        """
+        results, wanted, prompt = self.page_generation_request(books, profile, fields)
+        if not wanted:
+            return results
+        response = self.call_groq_api(prompt, max_tokens=self.page_generation_tokens(wanted), priority=priority)
+        return self.store_page_response(results, wanted, response, profile)
+
+    async def generate_page_with_ai_async(self, books: List[Tuple[Dict, float]], input_books: List[Dict],
+                                          profile: ReaderProfile) -> Dict[str, Dict[str, str]]:
+        results, wanted, prompt = await asyncio.to_thread(self.page_generation_request, books, profile)
+        if not wanted:
+            return results
+        response = await self.call_groq_api_async(prompt, max_tokens=self.page_generation_tokens(wanted))
+        return await asyncio.to_thread(self.store_page_response, results, wanted, response, profile)
+
+    def page_generation_request(self, books: List[Tuple[Dict, float]], profile: ReaderProfile,
+                                fields: Tuple[str, ...] = ('explanation', 'why_read')
+                                ) -> Tuple[Dict[str, Dict], Dict[str, Tuple], Optional[str]]:
+        """Cached texts by work id, the (book, score, missing fields) still wanted, and the prompt asking for them"""
+        results = {}
+        wanted = {}
+        for book, score in books:
+            work_id = self.work_id(book)
+            if not work_id:
+                continue
+            texts = {}
+            for field in fields:
+                text = self.llm_cache.get(self.page_cache_key(field, book, profile, score))
+                if text:
+                    texts[field] = text
+            results[work_id] = texts
+            missing = [field for field in fields if field not in texts]
+            if missing:
+                wanted[work_id] = (book, score, missing)
+
+        if not wanted:
+            return results, wanted, None
+
+        book_blocks = []
+        for work_id, (book, score, missing) in wanted.items():
+            shared_subjects = set(book.get('subjects', [])) & profile.subject_set
+            book_blocks.append(f"""- id: {work_id}
+          Title: {book.get('title', '')}
+          Author: {book.get('author_name', ['Unknown'])[0] if book.get('author_name') else 'Unknown'}
+          Genres: {', '.join(book.get('subjects', [])[:5]) if book.get('subjects') else 'Unknown'}
+          Shared Genres: {', '.join(list(shared_subjects)[:3])}
+          Similarity Score: {score:.1f}%
+          Needed: {', '.join(missing)}""")
+
+        avg_year = profile.mean_year
+        prompt = f"""Write book recommendation text for a reader with these preferences:
+        - Favorite Genres: {', '.join(profile.favorite_genres)}
+        - Preferred Era: Around {int(avg_year) if avg_year else 'Unknown'}
+        Books:
+        {chr(10).join(book_blocks)}
+        For each book, write only the fields listed under Needed:
+        - "explanation": why this book would appeal to the reader, focusing on specific connections and shared elements. Concise (4-5 sentences) and analytical.
+        - "why_read": an enthusiastic, persuasive case for reading it - its standout features, the reading experience it offers, its significance and who would enjoy it (4-6 sentences).
+        Use 2nd person like you and your. Do not mention dates.
+        Respond with only a JSON object mapping each book id to an object with the requested fields, for example:
+        {{"OL123W": {{"explanation": "...", "why_read": "..."}}}}"""
+        return results, wanted, prompt
+
+    @staticmethod
+    def page_generation_tokens(wanted: Dict[str, Tuple]) -> int:
+        return AI_BATCH_TOKENS_PER_FIELD * sum(len(missing) for _, _, missing in wanted.values())
+
+    def store_page_response(self, results: Dict[str, Dict], wanted: Dict[str, Tuple], response: Optional[str],
+                            profile: ReaderProfile) -> Dict[str, Dict[str, str]]:
+        """Merge the parsed batched reply into results and cache each new text"""
+        parsed = self.parse_batch_response(response) if response else {}
+
+        for work_id, (book, score, missing) in wanted.items():
+            generated = parsed.get(work_id)
+            if not isinstance(generated, dict):
+                continue
+            for field in missing:
+                text = generated.get(field)
+                if not isinstance(text, str) or len(text.strip()) <= 10:
+                    continue
+                text = text.strip()
+                results[work_id][field] = text
+                self.llm_cache.set(self.page_cache_key(field, book, profile, score), text)
+
+        return results
+
+    @staticmethod
+    def parse_batch_response(response: str) -> Dict[str, Any]:
+        """Pull the JSON object out of a batched reply, tolerating code fences and surrounding prose"""
+        text = re.sub(r'```(?:json)?', '', response).strip()
+        start, end = text.find('{'), text.rfind('}')
+        list_start = text.find('[')
+        if -1 < list_start < start:
+            start, end = list_start, text.rfind(']')
+        if start == -1 or end <= start:
+            logger.warning("Batched AI response contained no JSON object")
+            return {}
+        try:
+            parsed = json.loads(text[start:end + 1])
+        except ValueError as e:
+            logger.warning("Could not parse batched AI response: %s", e)
+            return {}
+        if isinstance(parsed, dict) and isinstance(parsed.get('books'), list):
+            parsed = parsed['books']
+        if isinstance(parsed, list):
+            # Also accept a list of objects carrying their own id
+            parsed = {item.get('id'): item for item in parsed if isinstance(item, dict) and item.get('id')}
+        if not isinstance(parsed, dict):
+            return {}
+        # Models sometimes echo the full key ("/works/OL123W")
+        return {str(key).split('/')[-1]: value for key, value in parsed.items()}
+
+    def page_details(self, recommendations: List[Dict], details: Optional[Dict[str, Dict]]) -> List[Tuple[Dict, Dict]]:
+        """(recommendation, work details) pairs, using details kept from earlier stages where available"""
+        page = []
+        for recommendation in recommendations:
+            book_details = (details or {}).get(recommendation['id']) or self.get_book_details(recommendation['id'])
+            if book_details:
+                page.append((recommendation, book_details))
+        return page
+
+    @STAGE_SECONDS.labels('ai_enrichment').time()
+    def enrich_recommendations(self, recommendations: List[Dict], input_books: List[Dict],
+                               profile: ReaderProfile, deadline: float = AI_PAGE_DEADLINE,
+                               details: Optional[Dict[str, Dict]] = None):
+        """Replace template explanation/why_read text with AI text for the current page.
+
+        In batch mode the page is a single Groq call; otherwise both prompts for every book are in
+        flight at once on the shared AI pool. Anything not finished by the deadline keeps its template
+        text; late results still land in the LLM cache.
+        """
+        if AI_BATCH_MODE:
+            return self.enrich_recommendations_batched(recommendations, input_books, profile, deadline, details)
+
+        jobs = {}
+        for recommendation, book_details in self.page_details(recommendations, details):
+            explanation_job = submit_in_context(
+                ai_executor, self.generate_similarity_explanation_with_ai,
+                book_details, input_books, recommendation['similarity_score'], profile
+            )
+            why_read_job = submit_in_context(
+                ai_executor, self.generate_reading_recommendation_with_ai, book_details, input_books
+            )
+            jobs[explanation_job] = (recommendation, 'explanation', book_details)
+            jobs[why_read_job] = (recommendation, 'why_read', book_details)
+
+        done, not_done = wait(jobs, timeout=deadline)
+        if not_done:
+            logger.warning("AI enrichment deadline reached with %d generations outstanding", len(not_done))
+
+        for job, (recommendation, field, book_details) in jobs.items():
+            text = None
+            if job in done:
+                try:
+                    text = job.result()
+                except Exception as e:
+                    logger.warning("Error enhancing recommendation %s: %s", recommendation['id'], e)
+            else:
+                job.cancel()  # Only cancels generations that have not started yet
+
+            if text and len(text.strip()) > 10:
+                recommendation[field] = text
+            elif not recommendation.get(field):
+                # Ensure fallback content is present
+                if field == 'explanation':
+                    recommendation['explanation'] = self.generate_explanation(
+                        book_details, input_books, recommendation['similarity_score'], profile
+                    )
+                else:
+                    recommendation['why_read'] = self.generate_reading_recommendation(book_details, input_books)
+
+    def enrich_recommendations_batched(self, recommendations: List[Dict], input_books: List[Dict],
+                                       profile: ReaderProfile, deadline: float,
+                                       details: Optional[Dict[str, Dict]] = None):
+        """Batch-mode enrichment: one generation for the page, template text for anything it misses"""
+        page = self.page_details(recommendations, details)
+        if not page:
+            return
+
+        generated = {}
+        job = submit_in_context(
+            ai_executor, self.generate_page_with_ai,
+            [(book_details, recommendation['similarity_score']) for recommendation, book_details in page],
+            input_books, profile
+        )
+        try:
+            generated = job.result(timeout=deadline)
+        except FutureTimeoutError:
+            logger.warning("AI enrichment deadline reached before the batched generation finished")
+        except Exception as e:
+            logger.exception("Error in batched AI generation: %s", e)
+        self.apply_page_texts(page, generated, input_books, profile)
+
+    async def enrich_recommendations_async(self, recommendations: List[Dict], input_books: List[Dict],
+                                           profile: ReaderProfile, deadline: float = AI_PAGE_DEADLINE,
+                                           details: Optional[Dict[str, Dict]] = None):
+        """enrich_recommendations on the event loop - generations are awaited instead of holding pool threads.
+
+        Generations still running at the deadline are left to finish in the background, so their
+        text still lands in the LLM cache.
+        """
+        with STAGE_SECONDS.labels('ai_enrichment').time():
+            page = []
+            for recommendation in recommendations:
+                book_details = ((details or {}).get(recommendation['id'])
+                                or await self.get_book_details_async(recommendation['id']))
+                if book_details:
+                    page.append((recommendation, book_details))
+            if not page:
+                return
+
+            if AI_BATCH_MODE:
+                jobs = {asyncio.ensure_future(self.generate_page_with_ai_async(
+                    [(book_details, recommendation['similarity_score']) for recommendation, book_details in page],
+                    input_books, profile
+                )): None}
+            else:
+                jobs = {}
+                for recommendation, book_details in page:
+                    explanation_job = asyncio.ensure_future(self.generate_similarity_explanation_with_ai_async(
+                        book_details, input_books, recommendation['similarity_score'], profile
+                    ))
+                    why_read_job = asyncio.ensure_future(
+                        self.generate_reading_recommendation_with_ai_async(book_details, input_books)
+                    )
+                    jobs[explanation_job] = (self.work_id(book_details), 'explanation')
+                    jobs[why_read_job] = (self.work_id(book_details), 'why_read')
+
+            done, not_done = await asyncio.wait(jobs, timeout=deadline)
+            if not_done:
+                logger.warning("AI enrichment deadline reached with %d generations outstanding", len(not_done))
+                for job in not_done:
+                    self.keep_running(job)
+
+            generated = {}
+            for job in done:
+                try:
+                    result = job.result()
+                except Exception as e:
+                    logger.exception("Error in AI generation: %s", e)
+                    continue
+                if jobs[job] is None:
+                    generated = result
+                else:
+                    work_id, field = jobs[job]
+                    generated.setdefault(work_id, {})[field] = result
+            self.apply_page_texts(page, generated, input_books, profile)
+
+    def keep_running(self, task: asyncio.Future):
+        """Hold a reference to a task nobody awaits any more, so it isn't garbage collected mid-flight"""
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def apply_page_texts(self, page: List[Tuple[Dict, Dict]], generated: Dict[str, Dict[str, str]],
+                         input_books: List[Dict], profile: ReaderProfile):
+        """Set generated texts on the page's recommendations, template text for anything missing"""
+        for recommendation, book_details in page:
+            texts = generated.get(self.work_id(book_details)) or {}
+            if texts.get('explanation'):
+                recommendation['explanation'] = texts['explanation']
+            elif not recommendation.get('explanation'):
+                recommendation['explanation'] = self.generate_explanation(
+                    book_details, input_books, recommendation['similarity_score'], profile
+                )
+            if texts.get('why_read'):
+                recommendation['why_read'] = texts['why_read']
+            elif not recommendation.get('why_read'):
+                recommendation['why_read'] = self.generate_reading_recommendation(book_details, input_books)
+
+    def stream_enrichment(self, recommendations: List[Dict], input_books: List[Dict], profile: ReaderProfile,
+                          stream_tokens: bool = False, deadline: float = AI_PAGE_DEADLINE,
+                          details: Optional[Dict[str, Dict]] = None):
+        """Yield explanation/why_read events for the page as each generation finishes.
+
+        With stream_tokens every field is its own streamed Groq call and '<field>_delta' events carry
+        fragments as they arrive; the final '<field>' event always holds the authoritative text.
+        Fields still outstanding at the deadline keep the template text already sent to the client.
+        """
+        page = [
+            (recommendation['id'], recommendation['similarity_score'], book_details)
+            for recommendation, book_details in self.page_details(recommendations, details)
+        ]
+
+        events = queue.Queue()
+
+        def run_batch():
+            generated = self.generate_page_with_ai(
+                [(book_details, score) for _, score, book_details in page], input_books, profile
+            )
+            for rec_id, _, book_details in page:
+                texts = generated.get(self.work_id(book_details)) or {}
+                for field in ('explanation', 'why_read'):
+                    if texts.get(field):
+                        events.put({'event': field, 'id': rec_id, 'text': texts[field]})
+
+        def run_field(rec_id: str, score: float, book_details: Dict, field: str):
+            on_delta = None
+            if stream_tokens:
+                on_delta = lambda delta: events.put({'event': f'{field}_delta', 'id': rec_id, 'delta': delta})
+            if field == 'explanation':
+                text = self.generate_similarity_explanation_with_ai(book_details, input_books, score, profile, on_delta)
+            else:
+                text = self.generate_reading_recommendation_with_ai(book_details, input_books, on_delta)
+            if text:
+                events.put({'event': field, 'id': rec_id, 'text': text})
+
+        if not page:
+            jobs = []
+        elif AI_BATCH_MODE and not stream_tokens:
+            jobs = [submit_in_context(ai_executor, run_batch)]
+        else:
+            jobs = [submit_in_context(ai_executor, run_field, rec_id, score, book_details, field)
+                    for rec_id, score, book_details in page
+                    for field in ('explanation', 'why_read')]
+        for job in jobs:
+            job.add_done_callback(lambda _: events.put(None))  # Completion marker
+
+        end = time.monotonic() + deadline
+        remaining = len(jobs)
+        try:
+            while remaining:
+                try:
+                    event = events.get(timeout=max(0, end - time.monotonic()))
+                except queue.Empty:
+                    logger.warning("AI enrichment deadline reached with %d generations outstanding", remaining)
+                    break
+                if event is None:
+                    remaining -= 1
+                else:
+                    yield event
+        finally:
+            # Also runs when the client disconnects; started generations still fill the LLM cache
+            for job in jobs:
+                job.cancel()
+
+class CacheWarmer:
+    """Background prefetcher that keeps the caches warm for popular titles and subjects.
+
+    Every WARMER_INTERVAL seconds it resolves the most requested titles (plus seeds), runs the most
+    common subject searches, fetches the works they return and generates why_read text that isn't
+    cached yet. Searches and works already cached are re-fetched once less than WARMER_REFRESH_SHARE
+    of their TTL is left, so popular entries never lapse. The warmer reads caches with peek, so its
+    checks don't show up in the hit/miss stats. Only the worker holding WARMER_LOCK_PATH warms; the
+    rest just record history.
+
+    Live traffic always goes first: OpenLibrary calls draw on the warmer's own slow token bucket
+    and stop while the circuit breaker is not closed, and Groq is only used at prefetch priority
+    while this worker has nothing queued and most of the (instance-wide) quota is unused.
+    """
+
+    LLM_BATCH_SIZE = 5  # why_read texts per batched Groq call in AI_BATCH_MODE
+
+    def __init__(self, recommender: 'BookRecommender', seed_path: Optional[str] = None):
+        self.recommender = recommender
+        self.seeds = self.load_seeds(seed_path)
+        self.politeness = TokenBucket(max(1.0, WARMER_OPENLIB_RATE * 5), WARMER_OPENLIB_RATE)
+        self.stats = Counter()
+        self.last_cycle = None
+        self._lock_file = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def load_seeds(path: Optional[str]) -> Dict[str, List[str]]:
+        seeds = {'titles': [], 'subjects': []}
+        if not path:
+            return seeds
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read cache warmer seeds from %s: %s", path, e)
+            return seeds
+        for kind in seeds:
+            seeds[kind] = [value for value in data.get(kind, []) if isinstance(value, str) and value.strip()]
+        return seeds
+
+    def start(self):
+        threading.Thread(target=self.run, name='cache-warmer', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        if self._stop.wait(WARMER_INITIAL_DELAY):
+            return
+        while True:
+            if self.is_leader():
+                try:
+                    self.warm()
+                except Exception as e:
+                    logger.exception("Cache warming cycle failed: %s", e)
+            if self._stop.wait(WARMER_INTERVAL):
+                return
+
+    def is_leader(self) -> bool:
+        """Take (or keep) the instance-wide warmer lock; only its holder warms"""
+        if self._lock_file is not None or fcntl is None:
+            return True
+        try:
+            lock_file = open(WARMER_LOCK_PATH, 'a')
+        except OSError as e:
+            logger.warning("Could not open cache warmer lock %s: %s", WARMER_LOCK_PATH, e)
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held until this process exits, then another worker takes over on its next cycle
+        self._lock_file = lock_file
+        logger.info("This worker is now the cache warmer")
+        return True
+
+    def upstream_allowed(self) -> bool:
+        """Wait for the warmer's OpenLibrary budget; False if the upstream is failing or we're stopping"""
+        while not self._stop.is_set():
+            if self.recommender.openlibrary.breaker.state != 'closed':
+                return False
+            wait_for = self.politeness.wait_time(1, time.monotonic())
+            if wait_for <= 0:
+                self.politeness.take(1)
+                return True
+            self._stop.wait(wait_for)
+        return False
+
+    def count(self, action: str, amount: int = 1):
+        self.stats[action] += amount
+        WARMER_ACTIONS.labels(action).inc(amount)
+
+    def warm(self):
+        start_time = time.perf_counter()
+        history = self.recommender.history
+        titles = list(dict.fromkeys(self.seeds['titles'] + history.top('title', WARMER_TOP_TITLES)))
+        subjects = list(dict.fromkeys(self.seeds['subjects'] + history.top('subject', WARMER_TOP_SUBJECTS)))
+        work_ids = self.warm_searches(titles, subjects)
+        works = self.warm_works(work_ids)
+        self.warm_why_read(works)
+        self.count('cycles')
+        self.last_cycle = {
+            'finished_at': time.time(),
+            'seconds': round(time.perf_counter() - start_time, 2),
+            'titles': len(titles),
+            'subjects': len(subjects),
+            'works': len(works)
+        }
+        logger.info("Cache warming cycle finished: %d titles, %d subjects, %d works in %.1fs",
+                    len(titles), len(subjects), len(works), self.last_cycle['seconds'])
+
+    @staticmethod
+    def fresh(cache: TieredCache, key: str) -> Optional[Any]:
+        """The cached value if more than WARMER_REFRESH_SHARE of its TTL is left, else None"""
+        entry = cache.peek(key)
+        if entry is not None and entry[1] > cache.ttl * WARMER_REFRESH_SHARE:
+            return entry[0]
+        return None
+
+    def warm_searches(self, titles: List[str], subjects: List[str]) -> List[str]:
+        """Refresh title and subject searches in the search cache; returns the work ids they found.
+
+        Searches the local catalog answers need no cache entry and are only read for their ids.
+        """
+        recommender = self.recommender
+        catalog = recommender.catalog
+        work_ids = []
+        searches = [('title', title) for title in titles] + [('subject', subject) for subject in subjects]
+        for kind, value in searches:
+            if kind == 'title':
+                params = recommender.title_search_params(value)
+                docs = catalog.search_title(value, limit=1) if catalog else []
+            else:
+                params = recommender.subject_search_params(value, CANDIDATES_PER_SUBJECT, {})
+                docs = catalog.search_subject(value, CANDIDATES_PER_SUBJECT) if catalog else []
+            if not docs and not OPENLIBRARY_OFFLINE:
+                data = self.fresh(recommender.search_cache, recommender.search_cache_key(params))
+                if data is None:
+                    if not self.upstream_allowed():
+                        self.count('skipped_upstream')
+                        break
+                    data = recommender.fetch_search(params)
+                    self.count(kind)
+                else:
+                    self.count('fresh')
+                docs = data.get('docs', []) if data else []
+            if kind == 'title':
+                recommender.remember_title(value, {'docs': docs})
+            work_ids.extend(doc.get('key', '').split('/')[-1] for doc in docs if doc.get('key'))
+        return list(dict.fromkeys(work_ids))
+
+    def warm_works(self, work_ids: List[str]) -> List[Dict]:
+        """Work details for the ids, (re-)fetching the missing or nearly expired ones within the politeness budget"""
+        recommender = self.recommender
+        works = []
+        for work_id in work_ids:
+            book = recommender.catalog.get_work(work_id) if recommender.catalog else None
+            if book is None:
+                book = self.fresh(recommender.work_cache, work_id)
+                if book is not None:
+                    self.count('fresh')
+                elif not OPENLIBRARY_OFFLINE:
+                    if not self.upstream_allowed():
+                        self.count('skipped_upstream')
+                        break
+                    book = recommender.fetch_book_details(work_id)
+                    self.count('work')
+            if book:
+                works.append(book)
+        return works
+
+    def warm_why_read(self, works: List[Dict]):
+        """Generate missing why_read text while the Groq quota is idle.
+
+        Fills the entries the page path will read: the batched prompt's keys in AI_BATCH_MODE,
+        the single-book prompt's otherwise.
+        """
+        missing = []
+        for book in works:
+            if len(missing) >= WARMER_LLM_PER_CYCLE:
+                break
+            cache_key = (self.recommender.page_cache_key('why_read', book) if AI_BATCH_MODE
+                         else self.recommender.why_read_cache_key(book))
+            if cache_key and self.recommender.llm_cache.peek(cache_key) is None:
+                missing.append(book)
+
+        batch_size = self.LLM_BATCH_SIZE if AI_BATCH_MODE else 1
+        for start in range(0, len(missing), batch_size):
+            if self._stop.is_set() or not self.recommender.rate_limiter.is_idle(WARMER_LLM_IDLE_SHARE):
+                self.count('skipped_llm_busy')
+                break
+            batch = missing[start:start + batch_size]
+            if AI_BATCH_MODE:
+                self.recommender.generate_page_with_ai(
+                    [(book, 0.0) for book in batch], [], self.recommender.build_reader_profile(batch),
+                    fields=('why_read',), priority=PRIORITY_PREFETCH
+                )
+            else:
+                self.recommender.generate_reading_recommendation_with_ai(batch[0], [], priority=PRIORITY_PREFETCH)
+            self.count('why_read', len(batch))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'leader': self._lock_file is not None or fcntl is None,
+            'seeds': {kind: len(values) for kind, values in self.seeds.items()},
+            'last_cycle': self.last_cycle,
+            **self.stats
+        }
+
+# Shared by all requests in this worker so total LLM concurrency stays bounded
+ai_executor = ThreadPoolExecutor(max_workers=AI_ENRICHMENT_WORKERS, thread_name_prefix='ai-enrichment')
+# Likewise for the OpenLibrary searches and work fetches behind fetch_candidates
+candidate_executor = ThreadPoolExecutor(max_workers=CANDIDATE_FETCH_WORKERS, thread_name_prefix='candidate-fetch')
 
 # Initialize recommender - if this fails, we'll catch it
 try:
     recommender = BookRecommender()
-    print("✓ BookRecommender initialized successfully")
+    logger.info("BookRecommender initialized successfully")
 except Exception as e:
-    print(f"✗ ERROR initializing BookRecommender: {e}")
-    import traceback
-    traceback.print_exc()
+    logger.exception("ERROR initializing BookRecommender: %s", e)
     # Create a dummy recommender to allow app to start
     recommender = None
 
+if recommender and STARTUP_WARMUP:
+    threading.Thread(target=recommender.warm_up, name='warm-up', daemon=True).start()
+
+cache_warmer = None
+if recommender and WARMER_ENABLED:
+    cache_warmer = CacheWarmer(recommender, WARMER_SEED_PATH)
+    cache_warmer.start()
+
+# Job state is read straight from the shared store so any gunicorn worker can answer a poll,
+# whichever one runs the job. Without a shared database jobs are only visible to their own worker.
+job_store = TieredCache('jobs', max_entries=0, ttl_seconds=JOB_TTL, db_path=CACHE_DB_PATH,
+                        disk_max_entries=JOB_DISK_MAX_ENTRIES)
+if not job_store.db_path:
+    job_store.max_entries = JOB_MEMORY_MAX_ENTRIES
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+job_slots = threading.BoundedSemaphore(JOB_WORKERS + JOB_QUEUE_MAX)  # Running plus queued jobs
+job_event_streams = threading.BoundedSemaphore(JOB_EVENTS_MAX_STREAMS)
+
+# Each job records the worker that owns it and a heartbeat that worker refreshes while the job is
+# unfinished, so a poll served by any worker can tell a job whose worker died from a slow one.
+JOB_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+active_jobs = {}  # job_id -> state dict, for this worker's queued and running jobs
+active_jobs_lock = threading.Lock()  # Guards active_jobs and every change to the state dicts in it
+
+def save_job(job: Dict[str, Any], **changes):
+    """Apply changes to one of this worker's jobs and write it to the job store with a fresh heartbeat"""
+    with active_jobs_lock:
+        now = time.time()
+        job.update(changes, updated_at=now, heartbeat_at=now)
+        if job['status'] in ('completed', 'failed'):
+            active_jobs.pop(job['job_id'], None)
+        else:
+            active_jobs[job['job_id']] = job
+        job_store.set(job['job_id'], copy.deepcopy(job))
+
+def beat_jobs():
+    """Refresh the heartbeat of this worker's unfinished jobs, forever"""
+    while True:
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+        with active_jobs_lock:
+            for job in active_jobs.values():
+                job['heartbeat_at'] = time.time()
+                try:
+                    job_store.set(job['job_id'], copy.deepcopy(job))
+                except Exception as e:
+                    log_sampled(logging.WARNING, "Could not refresh heartbeat of job %s: %s", job['job_id'], e)
+
+def owner_gone(owner: Optional[str]) -> bool:
+    """True if owner names a worker process on this host that no longer exists"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False  # Exists, but belongs to someone else
+    return False
+
+def check_orphaned(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Mark an unfinished job failed if its worker has died or stopped sending heartbeats; returns the job"""
+    if job['status'] in ('completed', 'failed') or job.get('owner') == JOB_OWNER:
+        return job
+    stale = time.time() - job.get('heartbeat_at', job['updated_at']) > JOB_STALE_AFTER
+    if not stale and not owner_gone(job.get('owner')):
+        return job
+    logger.warning("Recommendation job %s lost its worker %s, marking it failed", job['job_id'], job.get('owner'))
+    job = dict(job, status='failed', stage=None, updated_at=time.time(),
+               error='The server running this job stopped, please resubmit your books')
+    job_store.set(job['job_id'], copy.deepcopy(job))
+    JOBS.labels('orphaned').inc()
+    return job
+
+threading.Thread(target=beat_jobs, name='job-heartbeat', daemon=True).start()
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once this worker can serve recommendations, 503 until then.
+
+    Point App Service's WEBSITE_WARMUP_PATH (or a load balancer health check) here.
+    """
+    warmed_up = bool(recommender) and (recommender.warmed_up.is_set() or not STARTUP_WARMUP)
+    subject_index = 'disabled'
+    if recommender and recommender.catalog and SUBJECT_INDEX_ENABLED and recommender.use_enhanced_algorithm:
+        # Informational - until it is built, candidates come from catalog/OpenLibrary searches
+        subject_index = 'ready' if recommender.subject_index is not None else 'building'
+    return jsonify({
+        'status': 'ready' if warmed_up else 'starting',
+        'recommender': recommender is not None,
+        'warmed_up': warmed_up,
+        'subject_index': subject_index,
+        'pid': os.getpid()
+    }), 200 if warmed_up else 503
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters for this worker's caches"""
+    if not recommender:
+        return jsonify({'error': 'Recommender not initialized'}), 503
+    return jsonify({
+        'works': recommender.work_cache.get_stats(),
+        'search': recommender.search_cache.get_stats(),
+        'llm': recommender.llm_cache.get_stats(),
+        'subjects': subject_table.get_stats(),
+        'llm_scheduler': recommender.rate_limiter.get_stats(),
+        'coalescing': {
+            'openlibrary': recommender.openlibrary.flight.get_stats(),
+            'openlibrary_async': recommender.openlibrary_async.flight.get_stats(),
+            'llm': recommender.llm_flight.get_stats(),
+            'llm_async': recommender.llm_flight_async.get_stats()
+        },
+        'catalog': recommender.catalog.get_stats() if recommender.catalog else None,
+        'subject_index': recommender.subject_index.get_stats() if recommender.subject_index else None,
+        'title_index': recommender.title_index.get_stats() if recommender.title_index else None,
+        'jobs': job_store.get_stats(),
+        'warmer': cache_warmer.get_stats() if cache_warmer else None
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint, aggregated across gunicorn workers in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus.REGISTRY
+    return Response(prometheus.generate_latest(registry), content_type=prometheus.CONTENT_TYPE_LATEST)
+
+def load_snapshot(book_titles: List[str], result_token: Optional[str],
+                  filters: Optional[Dict] = None) -> Tuple[Optional[str], Optional[Dict]]:
+    """Cached snapshot for a result token or the submitted titles, building and caching it if needed.
+
+    An unfiltered snapshot serves any filters through apply_filters, so it is always preferred.
+    Otherwise the filters are pushed down into retrieval and the snapshot is cached under a token
+    that includes them. A snapshot built for other filters is never re-sliced.
+    """
+    result_token, snapshot, book_titles, pushed = find_snapshot(book_titles, result_token, filters)
+    if snapshot is None and book_titles:
+        snapshot = recommender.build_recommendations(book_titles, pushed)
+        if snapshot is not None:
+            recommender.result_cache.set(result_token, snapshot)
+    return result_token, snapshot
+
+async def load_snapshot_async(book_titles: List[str], result_token: Optional[str],
+                              filters: Optional[Dict] = None) -> Tuple[Optional[str], Optional[Dict]]:
+    """load_snapshot for the async route - the cache lookups and history writes run on worker threads"""
+    result_token, snapshot, book_titles, pushed = await asyncio.to_thread(find_snapshot, book_titles,
+                                                                          result_token, filters)
+    if snapshot is None and book_titles:
+        snapshot = await recommender.build_recommendations_async(book_titles, pushed)
+        if snapshot is not None:
+            await asyncio.to_thread(recommender.result_cache.set, result_token, snapshot)
+    return result_token, snapshot
+
+def find_snapshot(book_titles: List[str], result_token: Optional[str],
+                  filters: Optional[Dict] = None) -> Tuple[Optional[str], Optional[Dict], List[str], Dict]:
+    """The cache lookups of load_snapshot.
+
+    Returns (result token, cached snapshot or None, titles to build from, pushed-down filters).
+    With no snapshot and no titles there is nothing to build and the token is returned as given.
+    """
+    pushed = pushdown_filters(filters)
+    if book_titles and recommender.history:
+        recommender.history.record('title', book_titles)
+    snapshot = recommender.result_cache.get(result_token) if result_token else None
+    if snapshot is not None and snapshot.get('filters') and snapshot['filters'] != pushed:
+        book_titles = book_titles or snapshot.get('book_titles', [])
+        snapshot = None
+    if snapshot is None and not book_titles:
+        return result_token, None, book_titles, pushed
+
+    if snapshot is None:
+        result_token = make_result_token(book_titles)
+        snapshot = recommender.result_cache.get(result_token)
+
+    if snapshot is None and pushed:
+        result_token = make_result_token(book_titles, pushed)
+        snapshot = recommender.result_cache.get(result_token)
+
+    if snapshot is not None:
+        logger.info("Serving cached results for token %s", result_token)
+    return result_token, snapshot, book_titles, pushed
+
+def snapshot_page(snapshot: Dict, filters: Dict, page: int, per_page: int) -> Tuple[List[Dict], int]:
+    """Filter the sorted snapshot and slice out one page: (page entries, total matching entries)"""
+    with STAGE_SECONDS.labels('filter_sort').time():
+        all_recommendations = apply_filters(snapshot['recommendations'], filters)
+        start_idx = (page - 1) * per_page
+        return all_recommendations[start_idx:start_idx + per_page], len(all_recommendations)
+
+def pagination_summary(page: int, per_page: int, total_items: int) -> Dict[str, int]:
+    return {
+        'current_page': page,
+        'per_page': per_page,
+        'total_items': total_items,
+        'total_pages': math.ceil(total_items / per_page) or 1
+    }
+
 @app.route('/api/recommend', methods=['POST', 'OPTIONS'])  
 def get_recommendations():
     # OPTIONS requests are handled by before_request handler
-    print(f"✓ Route /api/recommend called - method: {request.method}")
+    logger.debug("Route /api/recommend called - method: %s", request.method)
     try:
-        print("Received recommendation request")
         data = request.json
         book_titles = data.get('books', [])
         filters = data.get('filters', {})
@@ -907,214 +4380,369 @@ def get_recommendations():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 2))
         
-        print(f"\n--- Starting recommendation process for books: {book_titles} (page {page}, per_page {per_page}) ---")
+        logger.info("Starting recommendation process for books: %s (page %d, per_page %d)",
+                    book_titles, page, per_page)
 
-        if not book_titles:
+        # A result token (body field or ?cursor=) points at a cached, fully scored snapshot
+        result_token = data.get('result_token') or request.args.get('cursor')
+
+        if not book_titles and not result_token:
             response = jsonify({'error': 'No books provided'})
             response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
             return response, 400
 
-        input_books = []
-        input_book_ids = set()
-        input_authors = set()
-
         try:
-            # Process input books (unchanged)
-            for title in book_titles:
-                print(f"Processing book: {title}")
-                response = requests.get(
-                    OPEN_LIBRARY_SEARCH,
-                    params={'q': title, 'fields': 'key,title,author_name,first_publish_year,subject,cover_i', 'limit': 1},
-                    timeout=OPENLIB_TIMEOUT
-                )
-
-                if not response.ok:
-                    print(f"OpenLibrary API error for {title}: {response.status_code}")
-                    print(f"Response content: {response.text}")
-                    continue
-
-                if response.json().get('docs'):
-                    book = response.json()['docs'][0]
-                    book_id = book.get('key', '').split('/')[-1]
-                    input_book_ids.add(book_id)
-                    if book.get('author_name'):
-                        input_authors.add(book.get('author_name')[0])
-                    book_details = recommender.get_book_details(book_id)
-                    if book_details:
-                        input_books.append(book_details)
-                    else:
-                        print(f"Could not get details for book: {title}")
-
-            if not input_books:
-                response = jsonify({'error': 'Could not process any of the input books'})
+            result_token, snapshot = load_snapshot(book_titles, result_token, filters)
+            if snapshot is None:
+                message = ('Results have expired, please resubmit your books' if not book_titles
+                           else 'Could not process any of the input books')
+                response = jsonify({'error': message})
                 response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
                 return response, 400
 
-            print(f"Successfully processed {len(input_books)} books")
-
-            # Analyze subjects (unchanged)
-            all_subjects = []
-            for book in input_books:
-                subjects = book.get('subjects', [])
-                all_subjects.extend(subjects)
-
-            common_subjects = Counter(all_subjects).most_common(10)
-            seen_books = set()
-            recommendations = []
-
-            # Find recommendations (unchanged)
-            for (subject, _) in common_subjects:
-                response = requests.get(
-                    OPEN_LIBRARY_SEARCH,
-                    params={
-                        'q': f'subject:{subject}',
-                        'fields': 'key,title,author_name,first_publish_year,subject,cover_i',
-                        'limit': 20
-                    }
-                )
+            input_books = snapshot['input_books']
+            profile = recommender.build_reader_profile(input_books)
+            page_entries, total_recommendations = snapshot_page(snapshot, filters, page, per_page)
 
-                if response.ok:
-                    for b in response.json().get('docs', []):
-                        book_id = b.get('key', '').split('/')[-1]
-                        author = b.get('author_name', ['Unknown'])[0] if b.get('author_name') else 'Unknown'
-
-                        if book_id not in input_book_ids and book_id not in seen_books and author not in input_authors:
-                            book_details = recommender.get_book_details(book_id)
-                            if book_details:
-                                similarity_score = recommender.calculate_similarity_score(book_details, input_books)
-                                explanation = recommender.generate_explanation(book_details, input_books, similarity_score * 100)
-                                basic_reading_rec = recommender.generate_reading_recommendation(book_details, input_books)
-
-                                cover_id = b.get('cover_i')
-
-                                recommendation = {
-                                    'id': book_id,
-                                    'title': b.get('title', ''),
-                                    'author': author,
-                                    'year': b.get('first_publish_year'),
-                                    'genres': b.get('subject', [])[:5] if b.get('subject') else [],
-                                    'similarity_score': round(similarity_score * 100, 1),
-                                    'explanation': explanation,
-                                    'why_read': basic_reading_rec,
-                                    'cover_url': f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None,
-                                }
-
-                                recommendations.append(recommendation)
-                                seen_books.add(book_id)
-
-            # Filter and sort all recommendations
-            filtered_recommendations = apply_filters(recommendations, filters)
-            all_recommendations = sorted(
-                filtered_recommendations,
-                key=lambda x: x['similarity_score'],
-                reverse=True
-            )
-            
-            # Apply pagination
-            total_recommendations = len(all_recommendations)
-            start_idx = (page - 1) * per_page
-            end_idx = min(start_idx + per_page, total_recommendations)
-            
-            if start_idx >= total_recommendations:
+            if not page_entries:
                 response = jsonify({
                     'status': 'completed',
+                    'result_token': result_token,
                     'recommendations': [],
-                    'pagination': {
-                        'current_page': page,
-                        'per_page': per_page,
-                        'total_items': total_recommendations,
-                        'total_pages': math.ceil(total_recommendations / per_page) or 1
-                    }
+                    'pagination': pagination_summary(page, per_page, total_recommendations)
                 })
                 response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
                 return response
             
-            paged_recommendations = all_recommendations[start_idx:end_idx]
+            # Text and covers are only produced for the page being returned
+            paged_recommendations, details = recommender.decorate_recommendations(page_entries, input_books, profile)
 
             # Enhance recommendations (only for the current page)
-            for recommendation in paged_recommendations:
-                try:
-                    book_id = recommendation['id']
-                    book_details = recommender.get_book_details(book_id)
-                    if book_details:
-                        max_retries = 3
-                        for attempt in range(max_retries):
-                            try:
-                                print(f"Attempt {attempt + 1} for AI content generation for {book_id}")
-
-                                # Generate explanation first
-                                new_explanation = recommender.generate_similarity_explanation_with_ai(
-                                    book_details, input_books, recommendation['similarity_score']
-                                )
-                                if new_explanation and len(new_explanation.strip()) > 10:
-                                    recommendation['explanation'] = new_explanation
-                                    print(f"Successfully generated explanation: {len(new_explanation)} chars")
-
-                                # Add a small delay between API calls
-                                time.sleep(1)
-
-                                # Then generate why_read
-                                why_read = recommender.generate_reading_recommendation_with_ai(book_details, input_books)
-                                if why_read and len(why_read.strip()) > 10:
-                                    recommendation['why_read'] = why_read
-                                    print(f"Successfully generated why_read: {len(why_read)} chars")
-                                    break  # Break only if both generations are successful
-
-                                if not why_read or not new_explanation:
-                                    raise Exception("Empty AI response")
-
-                            except Exception as retry_e:
-                                print(f"Retry {attempt + 1} failed: {str(retry_e)}")
-                                if attempt == max_retries - 1:
-                                    # On final retry failure, ensure we have fallback content
-                                    if not recommendation.get('explanation'):
-                                        recommendation['explanation'] = recommender.generate_explanation(
-                                            book_details, input_books, recommendation['similarity_score']
-                                        )
-                                    if not recommendation.get('why_read'):
-                                        recommendation['why_read'] = recommender.generate_reading_recommendation(
-                                            book_details, input_books
-                                        )
-                                    break
-                                time.sleep(2 ** attempt)  # Exponential backoff
-                except Exception as e:
-                    print(f"Error enhancing recommendation: {str(e)}")
-                    # Ensure fallback content is present
-                    if not recommendation.get('explanation'):
-                        recommendation['explanation'] = recommender.generate_explanation(
-                            book_details, input_books, recommendation['similarity_score']
-                        )
-                    if not recommendation.get('why_read'):
-                        recommendation['why_read'] = recommender.generate_reading_recommendation(
-                            book_details, input_books
-                        )
+            recommender.enrich_recommendations(paged_recommendations, input_books, profile, details=details)
 
             # Return final JSON response with pagination metadata
             response = jsonify({
                 'status': 'completed',
+                'result_token': result_token,
                 'recommendations': paged_recommendations,
-                'pagination': {
-                    'current_page': page,
-                    'per_page': per_page,
-                    'total_items': total_recommendations,
-                    'total_pages': math.ceil(total_recommendations / per_page) or 1
-                }
+                'pagination': pagination_summary(page, per_page, total_recommendations)
             })
             # Ensure CORS headers are set (flask-cors should handle this, but adding as backup)
             response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
             return response
 
         except Exception as inner_e:
-            print(f"Error in book processing: {str(inner_e)}")
+            logger.exception("Error in book processing: %s", inner_e)
             response = jsonify({'error': f'Error processing books: {str(inner_e)}'})
             response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
             return response, 500
 
     except Exception as e:
-        print(f"Error generating recommendations: {str(e)}")
+        logger.exception("Error generating recommendations: %s", e)
         response = jsonify({'error': str(e)})
         response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
         return response, 500
+
+async def recommend_async(data: Any, args: Dict[str, str]) -> Tuple[Dict[str, Any], int]:
+    """POST /api/recommend under the async server (see asgi.py): same contract as get_recommendations.
+
+    Takes the parsed JSON body and query arguments, returns (response body, status).
+    """
+    try:
+        book_titles = data.get('books', [])
+        filters = data.get('filters', {})
+        page = int(args.get('page', 1))
+        per_page = int(args.get('per_page', 2))
+
+        logger.info("Starting recommendation process for books: %s (page %d, per_page %d)",
+                    book_titles, page, per_page)
+        result_token = data.get('result_token') or args.get('cursor')
+        if not book_titles and not result_token:
+            return {'error': 'No books provided'}, 400
+
+        try:
+            result_token, snapshot = await load_snapshot_async(book_titles, result_token, filters)
+            if snapshot is None:
+                message = ('Results have expired, please resubmit your books' if not book_titles
+                           else 'Could not process any of the input books')
+                return {'error': message}, 400
+
+            input_books = snapshot['input_books']
+            profile = recommender.build_reader_profile(input_books)
+            page_entries, total_recommendations = snapshot_page(snapshot, filters, page, per_page)
+
+            paged_recommendations = []
+            if page_entries:
+                paged_recommendations, details = recommender.decorate_recommendations(
+                    page_entries, input_books, profile
+                )
+                await recommender.enrich_recommendations_async(paged_recommendations, input_books, profile,
+                                                               details=details)
+            return {
+                'status': 'completed',
+                'result_token': result_token,
+                'recommendations': paged_recommendations,
+                'pagination': pagination_summary(page, per_page, total_recommendations)
+            }, 200
+
+        except Exception as inner_e:
+            logger.exception("Error in book processing: %s", inner_e)
+            return {'error': f'Error processing books: {str(inner_e)}'}, 500
+
+    except Exception as e:
+        logger.exception("Error generating recommendations: %s", e)
+        return {'error': str(e)}, 500
+
+def run_recommendation_job(job: Dict[str, Any], book_titles: List[str], result_token: Optional[str],
+                           filters: Dict, page: int, per_page: int):
+    """Job-pool body of /api/jobs/recommend: the /api/recommend pipeline, saving state as it goes.
+
+    The page is stored with template text as soon as it is ranked, then each AI text as it arrives.
+    """
+    try:
+        save_job(job, status='running', stage='build')
+        token, snapshot = load_snapshot(book_titles, result_token, filters)
+        if snapshot is None:
+            message = ('Results have expired, please resubmit your books' if not book_titles
+                       else 'Could not process any of the input books')
+            save_job(job, status='failed', stage=None, error=message)
+            JOBS.labels('failed').inc()
+            return
+
+        input_books = snapshot['input_books']
+        profile = recommender.build_reader_profile(input_books)
+        page_entries, total_recommendations = snapshot_page(snapshot, filters, page, per_page)
+        recommendations, details = [], {}
+        if page_entries:
+            recommendations, details = recommender.decorate_recommendations(page_entries, input_books, profile)
+        save_job(job, stage='enrich', result_token=token, recommendations=recommendations,
+                 pagination=pagination_summary(page, per_page, total_recommendations))
+
+        by_id = {recommendation['id']: recommendation for recommendation in recommendations}
+        last_saved = time.monotonic()
+        with STAGE_SECONDS.labels('ai_enrichment').time():
+            for event in recommender.stream_enrichment(recommendations, input_books, profile, details=details):
+                with active_jobs_lock:
+                    by_id[event['id']][event['event']] = event['text']
+                # Texts arriving together go out in one save; the completed save carries any left over
+                if time.monotonic() - last_saved >= JOB_SAVE_INTERVAL:
+                    save_job(job)
+                    last_saved = time.monotonic()
+        save_job(job, status='completed', stage=None)
+        JOBS.labels('completed').inc()
+    except Exception as e:
+        logger.exception("Recommendation job %s failed: %s", job['job_id'], e)
+        save_job(job, status='failed', stage=None, error=f'Error processing books: {str(e)}')
+        JOBS.labels('failed').inc()
+    finally:
+        job_slots.release()
+
+@app.route('/api/jobs/recommend', methods=['POST', 'OPTIONS'])
+def submit_recommendation_job():
+    """Start a recommendation run on the job pool and return its id straight away (202).
+
+    Takes the same body and page/per_page/cursor arguments as /api/recommend. Poll
+    GET /api/jobs/<id> for the status and partial results, or follow /api/jobs/<id>/events.
+    """
+    data = request.get_json(silent=True) or {}
+    book_titles = data.get('books', [])
+    result_token = data.get('result_token') or request.args.get('cursor')
+    if not book_titles and not result_token:
+        response = jsonify({'error': 'No books provided'})
+        response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+        return response, 400
+    if not recommender:
+        response = jsonify({'error': 'Recommender not initialized'})
+        response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+        return response, 503
+    if not job_slots.acquire(blocking=False):
+        JOBS.labels('rejected').inc()
+        response = jsonify({'error': 'Too many recommendation jobs queued, please retry shortly'})
+        response.headers['Retry-After'] = '5'
+        response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+        return response, 503
+
+    now = time.time()
+    job = {
+        'job_id': uuid.uuid4().hex,
+        'status': 'queued',
+        'stage': None,
+        'created_at': now,
+        'updated_at': now,
+        'result_token': None,
+        'recommendations': [],
+        'pagination': None,
+        'error': None,
+        'owner': JOB_OWNER
+    }
+    save_job(job)
+    try:
+        submit_in_context(job_executor, run_recommendation_job, job, book_titles, result_token,
+                          data.get('filters', {}), int(request.args.get('page', 1)),
+                          int(request.args.get('per_page', 2)))
+    except Exception:
+        job_slots.release()
+        raise
+    logger.info("Queued recommendation job %s for books: %s", job['job_id'], book_titles)
+
+    response = jsonify({
+        'job_id': job['job_id'],
+        'status': 'queued',
+        'status_url': f"/api/jobs/{job['job_id']}",
+        'events_url': f"/api/jobs/{job['job_id']}/events"
+    })
+    response.headers['Location'] = f"/api/jobs/{job['job_id']}"
+    response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+    return response, 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    """Current status (queued, running, completed or failed), stage and results so far"""
+    job = job_store.get(job_id)
+    if job is None:
+        response = jsonify({'error': 'Unknown or expired job'})
+        response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+        return response, 404
+    response = jsonify(check_orphaned(job))
+    response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+    return response
+
+def poll_job_events(job_id: str, last_update: Optional[float], deadline: float) -> Tuple[str, Optional[float], bool]:
+    """One check of a job for its events stream: (lines to send, updated_at now seen, whether the stream ends)"""
+    job = job_store.get(job_id)
+    if job is None:
+        return json.dumps({'job_id': job_id, 'status': 'expired'}) + '\n', last_update, True
+    job = check_orphaned(job)
+    lines = ''
+    if job['updated_at'] != last_update:
+        last_update = job['updated_at']
+        lines = json.dumps(job) + '\n'
+    if job['status'] in ('completed', 'failed'):
+        return lines, last_update, True
+    if time.monotonic() >= deadline:
+        return lines + json.dumps({'job_id': job_id, 'status': job['status'], 'event': 'reconnect'}) + '\n', last_update, True
+    return lines, last_update, False
+
+async def job_events_async(job_id: str) -> Optional[AsyncIterator[str]]:
+    """job_events for the event loop: the same lines, polled without holding a thread; None for an unknown job"""
+    if await asyncio.to_thread(job_store.get, job_id) is None:
+        return None
+
+    async def generate():
+        last_update = None
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        while True:
+            lines, last_update, finished = await asyncio.to_thread(poll_job_events, job_id, last_update, deadline)
+            if lines:
+                yield lines
+            if finished:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return generate()
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id: str):
+    """Newline-delimited JSON: the job state each time it changes, ending once it completes or fails.
+
+    A stream is held open for at most JOB_EVENTS_MAX_SECONDS. If the job is still unfinished then,
+    the last line is {"job_id", "status", "event": "reconnect"} and the client should request the
+    stream again (or poll GET /api/jobs/<id>). Each open stream holds a thread, so at most
+    JOB_EVENTS_MAX_STREAMS are served at once and the rest get a 503; asgi.py serves this route on
+    the event loop instead.
+    """
+    if job_store.get(job_id) is None:
+        response = jsonify({'error': 'Unknown or expired job'})
+        response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+        return response, 404
+    if not job_event_streams.acquire(blocking=False):
+        response = jsonify({'error': 'Too many event streams open, please poll the job instead'})
+        response.headers['Retry-After'] = '5'
+        response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+        return response, 503
+
+    def generate():
+        last_update = None
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        while True:
+            lines, last_update, finished = poll_job_events(job_id, last_update, deadline)
+            if lines:
+                yield lines
+            if finished:
+                return
+            time.sleep(JOB_POLL_INTERVAL)
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Runs even if the client goes away before the stream starts
+    response.call_on_close(job_event_streams.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+    return response
+
+@app.route('/api/recommend/stream', methods=['POST', 'OPTIONS'])
+def stream_recommendations():
+    """Streaming /api/recommend: newline-delimited JSON events as each stage finishes.
+
+    Events: started, recommendations (the ranked page with template text), explanation/why_read
+    per book (plus *_delta fragments when stream_tokens is set), pagination, done - or error.
+    """
+    logger.debug("Route /api/recommend/stream called - method: %s", request.method)
+    data = request.json or {}
+    book_titles = data.get('books', [])
+    filters = data.get('filters', {})
+    stream_tokens = bool(data.get('stream_tokens', False))
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 2))
+    result_token = data.get('result_token') or request.args.get('cursor')
+
+    if not book_titles and not result_token:
+        response = jsonify({'error': 'No books provided'})
+        response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+        return response, 400
+
+    def event_line(event: Dict) -> str:
+        return json.dumps(event) + '\n'
+
+    def generate():
+        yield event_line({'event': 'started'})
+        try:
+            token, snapshot = load_snapshot(book_titles, result_token, filters)
+            if snapshot is None:
+                message = ('Results have expired, please resubmit your books' if not book_titles
+                           else 'Could not process any of the input books')
+                yield event_line({'event': 'error', 'error': message})
+                return
+
+            input_books = snapshot['input_books']
+            profile = recommender.build_reader_profile(input_books)
+            page_entries, total_recommendations = snapshot_page(snapshot, filters, page, per_page)
+            paged_recommendations, details = recommender.decorate_recommendations(page_entries, input_books, profile)
+
+            yield event_line({
+                'event': 'recommendations',
+                'result_token': token,
+                'recommendations': paged_recommendations
+            })
+            with STAGE_SECONDS.labels('ai_enrichment').time():
+                for event in recommender.stream_enrichment(paged_recommendations, input_books, profile,
+                                                           stream_tokens, details=details):
+                    yield event_line(event)
+            yield event_line({
+                'event': 'pagination',
+                'pagination': pagination_summary(page, per_page, total_recommendations)
+            })
+            yield event_line({'event': 'done', 'status': 'completed'})
+        except Exception as e:
+            logger.exception("Error streaming recommendations: %s", e)
+            yield event_line({'event': 'error', 'error': str(e)})
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let proxies buffer the stream
+    response.headers.add('Access-Control-Allow-Origin', 'https://lemon-water-065707a1e.4.azurestaticapps.net')
+    return response
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
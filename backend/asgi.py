@@ -0,0 +1,146 @@
+"""ASGI entry point for the async server (startup.sh with SERVER_MODE=async, the default).
+
+POST /api/recommend is served by recommend_async on the event loop, so one worker can hold
+hundreds of requests that are waiting on OpenLibrary or Groq. GET /api/jobs/<id>/events is
+streamed from the loop too, so a client following a job doesn't hold a thread for up to a minute.
+Every other route, OPTIONS preflights included, is the Flask app on a thread pool, unchanged.
+
+    gunicorn --config gunicorn.conf.py --worker-class uvicorn.workers.UvicornWorker asgi:application
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+
+from app import (REQUEST_SECONDS, allowed_origin, app, job_events_async, logger, recommend_async, recommender,
+                 request_id_var)
+
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 8))  # Per worker, for the routes still served by Flask
+ASYNC_ROUTE = '/api/recommend'
+JOB_EVENTS_ROUTE = re.compile(r'^/api/jobs/([^/]+)/events$')
+
+# Same headers Flask's after_request adds
+CORS_HEADERS = [
+    (b'access-control-allow-origin', allowed_origin.encode()),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'Content-Type, Accept, Authorization'),
+    (b'access-control-allow-credentials', b'true'),
+    (b'access-control-max-age', b'3600'),
+]
+
+flask_application = WSGIMiddleware(app, workers=WSGI_THREADS)
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionError('Client disconnected before sending the request body')
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+async def send_json(send, payload: dict, status: int, request_id: str):
+    # Serialized like Flask's jsonify
+    body = (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                    (b'x-request-id', request_id.encode('latin-1'))] + CORS_HEADERS,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def recommend(scope, receive, send):
+    started = time.perf_counter()
+    headers = dict(scope.get('headers') or [])
+    request_id = (headers.get(b'x-request-id', b'').decode('latin-1') or uuid.uuid4().hex)[:64]
+    token = request_id_var.set(request_id)
+    status = 500
+    try:
+        try:
+            data = json.loads(await read_body(receive))
+        except ValueError as e:
+            logger.exception("Error generating recommendations: %s", e)
+            payload = {'error': str(e)}
+        else:
+            args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+            payload, status = await recommend_async(data, args)
+        await send_json(send, payload, status, request_id)
+    finally:
+        REQUEST_SECONDS.labels(ASYNC_ROUTE, 'POST', str(status)).observe(time.perf_counter() - started)
+        request_id_var.reset(token)
+
+async def job_events(scope, receive, send, job_id: str):
+    started = time.perf_counter()
+    headers = dict(scope.get('headers') or [])
+    request_id = (headers.get(b'x-request-id', b'').decode('latin-1') or uuid.uuid4().hex)[:64]
+    token = request_id_var.set(request_id)
+    status = 500
+    try:
+        try:
+            # Past the (empty) request body the only message left is the disconnect
+            await read_body(receive)
+        except ConnectionError:
+            return
+        lines = await job_events_async(job_id)
+        if lines is None:
+            status = 404
+            await send_json(send, {'error': 'Unknown or expired job'}, status, request_id)
+            return
+        status = 200
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/x-ndjson'), (b'cache-control', b'no-cache'),
+                        (b'x-accel-buffering', b'no'), (b'x-request-id', request_id.encode('latin-1'))] + CORS_HEADERS,
+        })
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            while True:
+                # Stop polling as soon as the client goes away, not at the next change
+                next_lines = asyncio.ensure_future(lines.__anext__())
+                await asyncio.wait({next_lines, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    next_lines.cancel()
+                    await asyncio.gather(next_lines, return_exceptions=True)
+                    return
+                try:
+                    chunk = next_lines.result()
+                except StopAsyncIteration:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await lines.aclose()
+    finally:
+        REQUEST_SECONDS.labels('/api/jobs/<job_id>/events', 'GET', str(status)).observe(time.perf_counter() - started)
+        request_id_var.reset(token)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if recommender:
+                await recommender.openlibrary_async.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == ASYNC_ROUTE:
+        await recommend(scope, receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'GET' and JOB_EVENTS_ROUTE.match(scope['path']):
+        await job_events(scope, receive, send, JOB_EVENTS_ROUTE.match(scope['path']).group(1))
+    else:
+        await flask_application(scope, receive, send)
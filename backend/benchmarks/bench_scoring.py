@@ -0,0 +1,322 @@
+"""Scoring micro-benchmarks for LightweightBookRecommender and BookRecommender.
+
+Runs every scoring entry point over synthetic and fixture candidate sets of increasing size,
+against input lists of several lengths, and writes ops/sec, per-call p50/p99 latency and
+tracemalloc allocation figures to a JSON file so runs from different versions can be compared.
+
+    python -m benchmarks.bench_scoring                          # full sweep, 200 -> 100k candidates
+    python -m benchmarks.bench_scoring --sizes 200,1000 --inputs 3
+    python -m benchmarks.bench_scoring --compare benchmarks/results/old.json benchmarks/results/new.json
+    python -m benchmarks.bench_scoring --record                 # refresh the fixture from OpenLibrary
+
+Run from the backend directory.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import app
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_PATH = os.path.join(BENCH_DIR, 'fixtures', 'works.json')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+DEFAULT_SIZES = [200, 1000, 10000, 100000]
+DEFAULT_INPUTS = [1, 3, 10]
+LATENCY_SAMPLES = 2000  # Individually timed calls per case for p50/p99
+SEED = 1234
+
+SYNTHETIC_SUBJECTS = [
+    'Fiction', 'Fantasy', 'Science fiction', 'Dystopias', 'Magic', 'Wizards', 'Dragons', 'Love stories',
+    'Horror tales', 'Mystery fiction', 'Detective and mystery stories', 'Historical fiction', 'Space opera',
+    'Young adult fiction', 'Juvenile fiction', 'Adventure stories', 'Political fiction', 'Time travel',
+    'Artificial intelligence', 'Vampires', 'Quests (Expeditions)', 'Good and evil', 'Friendship',
+    'Families', 'War stories', 'Coming of age', 'Humorous fiction', 'Short stories', 'Classic literature',
+] + [f'Subject {i}' for i in range(2000)]
+SYNTHETIC_LAST_NAMES = ['Smith', 'Tolkien', 'Le Guin', 'Herbert', 'Asimov', 'Austen', 'Orwell', 'Pratchett',
+                        'Rowling', 'Gibson', 'Shelley', 'Stoker', 'Collins', 'Simmons', 'Weir']
+
+
+# Datasets
+
+def synthetic_works(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Work records shaped like OpenLibrary details, with a skewed subject distribution"""
+    rnd = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(SYNTHETIC_SUBJECTS))]
+    works = []
+    for i in range(count):
+        subjects = list(dict.fromkeys(rnd.choices(SYNTHETIC_SUBJECTS, weights, k=rnd.randint(0, 12))))
+        work = {
+            'key': f'/works/OL{i + 1}W',
+            'title': f'Synthetic Book {i + 1}',
+            'subjects': subjects,
+            'author_name': [f'{chr(65 + rnd.randint(0, 25))}. {rnd.choice(SYNTHETIC_LAST_NAMES)}'],
+            'edition_count': rnd.choice([0, 0, 1, 3, 12, 80]),
+        }
+        if rnd.random() < 0.85:
+            work['first_publish_date'] = str(rnd.randint(1800, 2024))
+        works.append(work)
+    return works
+
+def fixture_works(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Fixture records cycled (with distinct keys) up to count"""
+    with open(FIXTURE_PATH) as f:
+        base = json.load(f)['works']
+    rnd = random.Random(seed)
+    works = []
+    for i in range(count):
+        work = dict(rnd.choice(base))
+        work['key'] = f"{work['key']}-{i}"
+        works.append(work)
+    return works
+
+DATASETS = {
+    'synthetic': synthetic_works,
+    'fixture': fixture_works,
+}
+
+def as_recommendation(book: Dict[str, Any], rnd: random.Random) -> Dict[str, Any]:
+    """Snapshot-style entry for apply_filters"""
+    year = app.recommender.extract_year(book.get('first_publish_date', ''))
+    return {
+        'id': book['key'].split('/')[-1],
+        'title': book.get('title', ''),
+        'genres': book.get('subjects', [])[:5],
+        'year': year,
+        'similarity_score': round(rnd.uniform(0, 100), 1),
+    }
+
+
+# Measurement
+
+def percentile_us(samples_ns: List[int], q: float) -> float:
+    return float(np.percentile(samples_ns, q)) / 1000 if samples_ns else 0.0
+
+def measure(run_all: Callable[[], Any], call_one: Optional[Callable[[int], Any]], ops: int, repeat: int,
+            sample_count: int) -> Dict[str, Any]:
+    """Time repeat full passes (ops/sec) plus individually timed calls (latency) and one traced pass"""
+    run_all()  # Warm-up: fills the subject intern table and other memoized state
+
+    gc.collect()
+    gc.disable()
+    try:
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            run_all()
+            durations.append(time.perf_counter_ns() - start)
+
+        samples = []
+        if call_one is not None:
+            for i in range(min(sample_count, ops)):
+                start = time.perf_counter_ns()
+                call_one(i)
+                samples.append(time.perf_counter_ns() - start)
+        else:
+            samples = durations
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        run_all()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    allocated_blocks = sum(max(stat.count_diff, 0) for stat in stats)
+
+    median_ns = float(np.median(durations))
+    return {
+        'runs': repeat,
+        'ops_per_run': ops,
+        'ops_per_sec': ops / (median_ns / 1e9) if median_ns else 0.0,
+        'run_median_ms': median_ns / 1e6,
+        'p50_us': percentile_us(samples, 50),
+        'p99_us': percentile_us(samples, 99),
+        'latency_unit': 'call' if call_one is not None else 'run',
+        'peak_alloc_bytes': peak,
+        'retained_blocks': allocated_blocks,
+    }
+
+def build_cases(candidates: List[Dict[str, Any]], input_books: List[Dict[str, Any]]) -> Dict[str, Tuple]:
+    """name -> (run over every candidate, run one candidate by index or None, ops per run)"""
+    recommender = app.recommender
+    lightweight = recommender.lightweight_recommender
+    profile = recommender.build_reader_profile(input_books)
+    input_subjects = list(profile.subjects)
+    rnd = random.Random(SEED)
+    recommendations = [as_recommendation(book, rnd) for book in candidates]
+    filters = {'genre': 'Fantasy', 'yearRange': [1950, 2000], 'minScore': 40}
+    n = len(candidates)
+
+    def basic_score(book):
+        # The non-enhanced path of BookRecommender.calculate_similarity_score
+        enhanced = recommender.use_enhanced_algorithm
+        recommender.use_enhanced_algorithm = False
+        try:
+            return recommender.calculate_similarity_score(book, input_books, profile)
+        finally:
+            recommender.use_enhanced_algorithm = enhanced
+
+    per_book = {
+        'subject_match': lambda book: lightweight.calculate_subject_match(book.get('subjects', []), input_subjects),
+        'subject_depth': lambda book: lightweight.calculate_subject_depth(book.get('subjects', []), input_subjects),
+        'author_relation': lambda book: lightweight.calculate_author_relation(book, input_books, profile),
+        'enhanced_similarity': lambda book: lightweight.calculate_enhanced_similarity(book, input_books, profile),
+        'basic_similarity_score': basic_score,
+    }
+    cases = {
+        name: (lambda fn=fn: [fn(book) for book in candidates], lambda i, fn=fn: fn(candidates[i]), n)
+        for name, fn in per_book.items()
+    }
+    cases['enhanced_similarity_batch'] = (
+        lambda: lightweight.calculate_enhanced_similarity_batch(candidates, input_books, profile), None, n
+    )
+    cases['apply_filters'] = (lambda: app.apply_filters(recommendations, filters), None, n)
+    return cases
+
+def repeats_for(size: int, requested: int) -> int:
+    # Keep the 100k cases to a few seconds each
+    return max(1, min(requested, 200000 // size)) if size > 1000 else requested
+
+
+# Commands
+
+def run(args) -> Dict[str, Any]:
+    sizes = [int(s) for s in args.sizes.split(',')]
+    input_sizes = [int(s) for s in args.inputs.split(',')]
+    selected = set(args.only.split(',')) if args.only else None
+    results = []
+
+    for dataset in args.datasets.split(','):
+        make = DATASETS[dataset]
+        for size in sizes:
+            candidates = make(size, SEED)
+            for input_size in input_sizes:
+                input_books = make(input_size, SEED + 1)
+                for name, (run_all, call_one, ops) in build_cases(candidates, input_books).items():
+                    if selected and name not in selected:
+                        continue
+                    result = measure(run_all, call_one, ops, repeats_for(size, args.repeat), LATENCY_SAMPLES)
+                    result.update({'benchmark': name, 'dataset': dataset, 'candidates': size, 'inputs': input_size})
+                    results.append(result)
+                    print(f"{dataset:9} n={size:<6} inputs={input_size:<3} {name:26} "
+                          f"{result['ops_per_sec']:>12,.0f} ops/s  p50 {result['p50_us']:9.1f}us  "
+                          f"p99 {result['p99_us']:9.1f}us  peak {result['peak_alloc_bytes'] / 1024:9.0f}KiB")
+
+    return {'meta': run_metadata(args), 'results': results}
+
+def run_metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=BENCH_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'sizes': args.sizes,
+        'inputs': args.inputs,
+        'repeat': args.repeat,
+        'seed': SEED,
+    }
+
+def compare(old_path: str, new_path: str, threshold: float):
+    """Print ops/sec ratios between two result files, flagging slowdowns beyond threshold"""
+    def load(path):
+        with open(path) as f:
+            data = json.load(f)
+        return {(r['benchmark'], r['dataset'], r['candidates'], r['inputs']): r for r in data['results']}, data['meta']
+
+    old, old_meta = load(old_path)
+    new, new_meta = load(new_path)
+    print(f"old: {old_meta.get('commit')} {old_meta.get('timestamp')}\nnew: {new_meta.get('commit')} {new_meta.get('timestamp')}")
+    regressions = 0
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key]['ops_per_sec'] / old[key]['ops_per_sec'] if old[key]['ops_per_sec'] else float('inf')
+        flag = ''
+        if ratio < 1 - threshold:
+            flag = '  <-- slower'
+            regressions += 1
+        print(f"{key[1]:9} n={key[2]:<6} inputs={key[3]:<3} {key[0]:26} {ratio:6.2f}x{flag}")
+    return regressions
+
+def record(limit: int):
+    """Refresh the fixture with live OpenLibrary records for the works already in it"""
+    with open(FIXTURE_PATH) as f:
+        fixture = json.load(f)
+    refreshed = []
+    for work in fixture['works'][:limit]:
+        work_id = work['key'].split('/')[-1]
+        details = app.recommender.openlibrary.get_work(work_id)
+        if not details:
+            print(f"Keeping the existing record for {work_id}")
+            refreshed.append(work)
+            continue
+        search = app.recommender.openlibrary.search({'q': f'key:/works/{work_id}', 'fields': 'author_name,edition_count'})
+        doc = (search or {}).get('docs', [{}])[0] if (search or {}).get('docs') else {}
+        refreshed.append({
+            'key': details.get('key', work['key']),
+            'title': details.get('title', work.get('title')),
+            'author_name': doc.get('author_name', work.get('author_name')),
+            'first_publish_date': details.get('first_publish_date', work.get('first_publish_date')),
+            'subjects': details.get('subjects', []),
+            'edition_count': doc.get('edition_count', work.get('edition_count', 0)),
+        })
+    fixture['works'] = refreshed
+    with open(FIXTURE_PATH, 'w') as f:
+        json.dump(fixture, f, indent=1)
+    print(f"Recorded {len(refreshed)} works to {FIXTURE_PATH}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Scoring micro-benchmarks')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='candidate counts')
+    parser.add_argument('--inputs', default=','.join(map(str, DEFAULT_INPUTS)), help='input list sizes')
+    parser.add_argument('--datasets', default=','.join(DATASETS), help='synthetic and/or fixture')
+    parser.add_argument('--only', help='comma-separated benchmark names')
+    parser.add_argument('--repeat', type=int, default=5, help='timed passes per case')
+    parser.add_argument('--output', help='result file (default benchmarks/results/scoring-<time>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slowdown flagged by --compare')
+    parser.add_argument('--record', action='store_true', help='refresh the fixture from OpenLibrary')
+    parser.add_argument('--record-limit', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    if args.record:
+        record(args.record_limit)
+        return
+
+    report = run(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"scoring-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {len(report['results'])} results to {output}")
+
+
+if __name__ == '__main__':
+    main()
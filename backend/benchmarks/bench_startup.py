@@ -0,0 +1,214 @@
+"""Startup benchmarks: how long a fresh worker takes to import the app and become ready.
+
+Each sample is a fresh interpreter, as on a cold start or gunicorn worker recycle. It records
+the time to `import app`, the time until /ready answers 200 (with and without the background
+warm-up), the whole process wall time, and the slowest imports from `python -X importtime`.
+With --gunicorn it also times gunicorn from launch to the first ready worker.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --gunicorn
+    python -m benchmarks.bench_startup --compare benchmarks/results/old.json benchmarks/results/new.json
+
+Run from the backend directory.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+READY_TIMEOUT = 60  # Seconds before a sample counts as never ready
+IMPORT_TIME_TOP = 15  # Slowest modules reported from -X importtime
+RESULT_MARKER = 'BENCH_STARTUP '
+
+# Runs in the fresh interpreter; the app logs to stdout, so the result line is marked
+CHILD_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+ready = None
+if app.recommender is not None:
+    client = app.app.test_client()
+    while time.perf_counter() - imported < {READY_TIMEOUT}:
+        if client.get('/ready').status_code == 200:
+            ready = time.perf_counter()
+            break
+        time.sleep(0.002)
+print({RESULT_MARKER!r} + json.dumps({{
+    'import_s': imported - start,
+    'ready_s': ready - start if ready else None,
+    'modules': len(sys.modules),
+}}), flush=True)
+"""
+
+
+def child_env(warmup: bool, work_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        'STARTUP_WARMUP': 'true' if warmup else 'false',
+        'LOG_LEVEL': 'WARNING',
+        'CACHE_DB_PATH': os.path.join(work_dir, 'cache.sqlite3'),
+        'SUBJECT_TABLE_PATH': os.path.join(work_dir, 'subjects.json'),
+    })
+    return env
+
+def sample(warmup: bool, work_dir: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', CHILD_SCRIPT], cwd=BACKEND_DIR, capture_output=True,
+                               text=True, env=child_env(warmup, work_dir), timeout=READY_TIMEOUT * 2)
+    process_s = time.perf_counter() - start
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+            result['process_s'] = process_s
+            return result
+    raise RuntimeError(f"startup sample failed:\n{completed.stdout[-2000:]}\n{completed.stderr[-2000:]}")
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary = {'samples': len(samples), 'modules': samples[-1]['modules']}
+    for key in ('import_s', 'ready_s', 'process_s'):
+        values = [s[key] for s in samples if s[key] is not None]
+        summary[key] = {
+            'min': round(min(values), 4) if values else None,
+            'median': round(statistics.median(values), 4) if values else None,
+            'max': round(max(values), 4) if values else None,
+        }
+    return summary
+
+def slowest_imports(work_dir: str) -> List[Dict[str, Any]]:
+    """Top modules by cumulative import time (microseconds), from one -X importtime run"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, env=child_env(False, work_dir), timeout=120)
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        modules.append({'module': name, 'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    modules.sort(key=lambda module: -module['cumulative_us'])
+    return modules[:IMPORT_TIME_TOP]
+
+def gunicorn_ready(workers: int, threads: int, work_dir: str) -> Optional[float]:
+    """Seconds from launching gunicorn (as startup.sh does) to the first 200 from /ready"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = child_env(True, work_dir)
+    env['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(dir=work_dir)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        ['gunicorn', '--bind', f'127.0.0.1:{port}', '--config', 'gunicorn.conf.py', '--workers', str(workers),
+         '--threads', str(threads), '--worker-class', 'gthread', 'app:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < READY_TIMEOUT:
+            try:
+                if requests.get(f'http://127.0.0.1:{port}/ready', timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.01)
+        return None
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+def run_metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=BENCH_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+    }
+
+def run(args) -> Dict[str, Any]:
+    report = {'meta': run_metadata(args), 'results': {}}
+    with tempfile.TemporaryDirectory(prefix='bookrec-startup-') as work_dir:
+        sample(False, work_dir)  # Untimed: writes the .pyc files and the cache database
+        for warmup in (False, True):
+            name = 'warmup' if warmup else 'lazy'
+            report['results'][name] = summarize([sample(warmup, work_dir) for _ in range(args.repeat)])
+            result = report['results'][name]
+            print(f"{name:7} import {result['import_s']['median'] * 1000:7.1f}ms  "
+                  f"ready {result['ready_s']['median'] * 1000:7.1f}ms  "
+                  f"process {result['process_s']['median'] * 1000:7.1f}ms  (medians of {args.repeat})")
+        report['slowest_imports'] = slowest_imports(work_dir)
+        for module in report['slowest_imports'][:5]:
+            print(f"        {module['module']:40} {module['cumulative_us'] / 1000:7.1f}ms cumulative")
+        if args.gunicorn:
+            seconds = gunicorn_ready(args.workers, args.threads, work_dir)
+            report['results']['gunicorn_ready_s'] = round(seconds, 4) if seconds is not None else None
+            print(f"gunicorn launch to first ready worker: "
+                  f"{seconds * 1000:.1f}ms" if seconds is not None else "gunicorn never became ready")
+    return report
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Print median ratios between two result files, flagging slowdowns beyond threshold"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old['meta'].get('commit')} {old['meta'].get('timestamp')}\n"
+          f"new: {new['meta'].get('commit')} {new['meta'].get('timestamp')}")
+    regressions = 0
+    for name in ('lazy', 'warmup'):
+        for key in ('import_s', 'ready_s', 'process_s'):
+            before = (old['results'].get(name) or {}).get(key, {}).get('median')
+            after = (new['results'].get(name) or {}).get(key, {}).get('median')
+            if not before or not after:
+                continue
+            ratio = after / before
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  <-- slower'
+                regressions += 1
+            print(f"{name:7} {key:10} {before * 1000:8.1f}ms -> {after * 1000:8.1f}ms  {ratio:5.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time and startup benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per mode')
+    parser.add_argument('--gunicorn', action='store_true', help='also time gunicorn to the first ready worker')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--output', help='result file (default benchmarks/results/startup-<time>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slowdown flagged by --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    report = run(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote startup results to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+"""Local OpenLibrary catalog built from the bulk data dumps.
+
+Streams the works, editions and authors dumps (https://openlibrary.org/developers/dumps - the
+gzipped `type<TAB>key<TAB>revision<TAB>last_modified<TAB>json` files, or JSON lines) into a
+compact SQLite store the recommender can search and hydrate candidates from without the network.
+
+Ingestion reads one batch at a time, so memory stays flat however large the dump is, and it
+records its position after every batch: an interrupted run resumes where it stopped, and a
+re-run with a newer dump only rewrites works whose last_modified moved forward.
+
+    python catalog.py ingest --db catalog.sqlite3 --authors ol_dump_authors.txt.gz \\
+        --works ol_dump_works.txt.gz --editions ol_dump_editions.txt.gz
+    python catalog.py stats --db catalog.sqlite3
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('bookrec.catalog')
+
+INGEST_BATCH_SIZE = 5000  # Records per transaction (and per resume checkpoint)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS works (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    title_norm TEXT NOT NULL,
+    author_keys TEXT NOT NULL,
+    first_publish_date TEXT,
+    first_publish_year INTEGER,
+    subjects TEXT NOT NULL,
+    cover_id INTEGER,
+    last_modified TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_works_title ON works (title_norm);
+CREATE TABLE IF NOT EXISTS work_subjects (
+    subject TEXT NOT NULL,
+    work_id TEXT NOT NULL,
+    PRIMARY KEY (subject, work_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS authors (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS edition_counts (
+    work_id TEXT PRIMARY KEY,
+    edition_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    source TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    finished INTEGER NOT NULL
+);
+"""
+
+def normalize_title(title: str) -> str:
+    return ' '.join(re.sub(r'[^\w\s]', ' ', str(title).lower()).split())
+
+def normalize_catalog_subject(subject: str) -> str:
+    return ' '.join(str(subject).lower().split())
+
+def olid(key: str) -> str:
+    """'/works/OL45883W' -> 'OL45883W'"""
+    return str(key or '').rstrip('/').split('/')[-1]
+
+def extract_year(date_str: Optional[str]) -> Optional[int]:
+    match = re.search(r'\d{4}', str(date_str or ''))
+    return int(match.group()) if match else None
+
+def dump_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+def read_dump(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (last_modified, record) for every line of a TSV or JSON-lines dump, gzipped or not"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            try:
+                if line.startswith('{'):
+                    record = json.loads(line)
+                    last_modified = record.get('last_modified')
+                    if isinstance(last_modified, dict):
+                        last_modified = last_modified.get('value')
+                else:
+                    columns = line.split('\t')
+                    record = json.loads(columns[-1])
+                    last_modified = columns[3] if len(columns) >= 5 else None
+            except (ValueError, IndexError):
+                # Still yield so record counts (and resume positions) stay aligned with the file
+                yield '', {}
+                continue
+            yield last_modified or '', record
+
+
+class LocalCatalog:
+    """Read/write access to the local catalog database"""
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._local = threading.local()
+        if not read_only:
+            self._connect().executescript(SCHEMA)
+
+    @classmethod
+    def open_if_exists(cls, path: Optional[str]) -> Optional['LocalCatalog']:
+        """Read-only catalog for the recommender, or None if no catalog has been built"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            catalog = cls(path, read_only=True)
+            # Touch the schema only - counting works would scan the table on every worker start
+            catalog._connect().execute("SELECT 1 FROM works LIMIT 1").fetchone()
+            logger.info("Local catalog %s opened", path)
+            return catalog
+        except sqlite3.Error as e:
+            logger.warning("Could not open local catalog %s: %s", path, e)
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread (and per process, since connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            if self.read_only:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # Reads - shaped like the OpenLibrary API responses they stand in for
+
+    def _author_names(self, conn: sqlite3.Connection, author_keys: List[str]) -> List[str]:
+        names = []
+        for key in author_keys:
+            row = conn.execute("SELECT name FROM authors WHERE id = ?", (key,)).fetchone()
+            if row:
+                names.append(row[0])
+        return names
+
+    def _search_doc(self, conn: sqlite3.Connection, row: Tuple) -> Dict[str, Any]:
+        work_id, title, author_keys, first_publish_year, subjects, cover_id = row
+        doc = {
+            'key': f"/works/{work_id}",
+            'title': title,
+            'first_publish_year': first_publish_year,
+            'subject': json.loads(subjects),
+            'cover_i': cover_id
+        }
+        author_names = self._author_names(conn, json.loads(author_keys))
+        if author_names:
+            doc['author_name'] = author_names
+        return {k: v for k, v in doc.items() if v not in (None, [])}
+
+    def get_work(self, work_id: str) -> Optional[Dict[str, Any]]:
+        """Work details in the shape of /works/<id>.json, or None if the catalog doesn't have it"""
+        row = self._connect().execute("""
+            SELECT w.title, w.author_keys, w.first_publish_date, w.subjects, w.cover_id, e.edition_count
+            FROM works w
+            LEFT JOIN edition_counts e ON e.work_id = w.id
+            WHERE w.id = ?""", (work_id,)).fetchone()
+        if not row:
+            return None
+        title, author_keys, first_publish_date, subjects, cover_id, edition_count = row
+        work = {
+            'key': f"/works/{work_id}",
+            'title': title,
+            'authors': [{'author': {'key': f"/authors/{key}"}} for key in json.loads(author_keys)],
+            'subjects': json.loads(subjects)
+        }
+        if first_publish_date:
+            work['first_publish_date'] = first_publish_date
+        if cover_id:
+            work['covers'] = [cover_id]
+        if edition_count:
+            # Not part of the works API response, but the scorer's popularity signal reads it
+            work['edition_count'] = edition_count
+        return work
+
+    def search_subject(self, subject: str, limit: int, genre: Optional[str] = None,
+                       year_range: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Search docs for works tagged with subject, most-published first.
+
+        genre keeps works listing it among their first five subjects and year_range bounds the
+        first publish year - the same checks as the API's genre and yearRange filters.
+        """
+        conditions = ["s.subject = ?"]
+        params = [normalize_catalog_subject(subject)]
+        if genre:
+            conditions.append("EXISTS (SELECT 1 FROM json_each(w.subjects) j WHERE j.key < 5 AND j.value = ?)")
+            params.append(genre)
+        if year_range:
+            conditions.append("w.first_publish_year BETWEEN ? AND ?")
+            params.extend(year_range)
+
+        conn = self._connect()
+        rows = conn.execute(f"""
+            SELECT w.id, w.title, w.author_keys, w.first_publish_year, w.subjects, w.cover_id
+            FROM work_subjects s
+            JOIN works w ON w.id = s.work_id
+            LEFT JOIN edition_counts e ON e.work_id = w.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY COALESCE(e.edition_count, 0) DESC, w.id
+            LIMIT ?""", (*params, limit)).fetchall()
+        return [self._search_doc(conn, row) for row in rows]
+
+    def search_title(self, title: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Search docs for an exact (normalized) title, falling back to a prefix match"""
+        norm = normalize_title(title)
+        if not norm:
+            return []
+        conn = self._connect()
+        query = """
+            SELECT w.id, w.title, w.author_keys, w.first_publish_year, w.subjects, w.cover_id
+            FROM works w
+            LEFT JOIN edition_counts e ON e.work_id = w.id
+            WHERE {condition}
+            ORDER BY COALESCE(e.edition_count, 0) DESC, w.id
+            LIMIT ?"""
+        rows = conn.execute(query.format(condition="w.title_norm = ?"), (norm, limit)).fetchall()
+        if not rows:
+            rows = conn.execute(
+                query.format(condition="w.title_norm >= ? AND w.title_norm < ?"), (norm, norm + '\uffff', limit)
+            ).fetchall()
+        return [self._search_doc(conn, row) for row in rows]
+
+    def search_doc(self, work_id: str) -> Optional[Dict[str, Any]]:
+        """Search doc for a single work id"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT id, title, author_keys, first_publish_year, subjects, cover_id FROM works WHERE id = ?",
+            (work_id,)
+        ).fetchone()
+        return self._search_doc(conn, row) if row else None
+
+    def iter_index_rows(self) -> Iterator[Tuple[str, List[str], Optional[str], Optional[str], int]]:
+        """Stream (work id, subjects, first publish date, first author name, edition count) for every work"""
+        rows = self._connect().execute("""
+            SELECT w.id, w.subjects, w.first_publish_date, a.name, COALESCE(e.edition_count, 0)
+            FROM works w
+            LEFT JOIN authors a ON a.id = json_extract(w.author_keys, '$[0]')
+            LEFT JOIN edition_counts e ON e.work_id = w.id""")
+        for work_id, subjects, first_publish_date, author, edition_count in rows:
+            yield work_id, json.loads(subjects), first_publish_date, author, edition_count
+
+    def iter_titles(self, limit: int) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Stream (work id, title, first author name) for the limit most-published works"""
+        rows = self._connect().execute("""
+            SELECT w.id, w.title, a.name
+            FROM works w
+            LEFT JOIN authors a ON a.id = json_extract(w.author_keys, '$[0]')
+            LEFT JOIN edition_counts e ON e.work_id = w.id
+            ORDER BY COALESCE(e.edition_count, 0) DESC, w.id
+            LIMIT ?""", (limit,))
+        yield from rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        stats = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                 for table in ('works', 'authors', 'work_subjects', 'edition_counts')}
+        stats['sources'] = {
+            source: {'records': records, 'finished': bool(finished)}
+            for source, records, finished in conn.execute("SELECT source, records, finished FROM ingest_state")
+        }
+        return stats
+
+    # Ingestion
+
+    def ingest(self, source: str, path: str, batch_size: int = INGEST_BATCH_SIZE):
+        """Stream one dump into the catalog, resuming an interrupted run of the same file"""
+        handlers = {
+            'authors': self._apply_authors,
+            'works': self._apply_works,
+            'editions': self._apply_editions
+        }
+        apply_batch = handlers[source]
+        conn = self._connect()
+        fingerprint = dump_fingerprint(path)
+
+        row = conn.execute(
+            "SELECT fingerprint, records, finished FROM ingest_state WHERE source = ?", (source,)
+        ).fetchone()
+        if row and row[0] == fingerprint and row[2]:
+            print(f"{source}: {path} already ingested ({row[1]} records)")
+            return
+        if row and row[0] == fingerprint:
+            skip = row[1]
+            print(f"{source}: resuming {path} after {skip} records")
+        else:
+            skip = 0
+            with conn:
+                conn.execute("BEGIN")
+                if source == 'editions':
+                    # Counts are recomputed from scratch for each new editions dump
+                    conn.execute("DELETE FROM edition_counts")
+                conn.execute(
+                    "INSERT OR REPLACE INTO ingest_state (source, fingerprint, records, finished) VALUES (?, ?, 0, 0)",
+                    (source, fingerprint)
+                )
+
+        position = 0
+        batch = []
+        start = time.time()
+        for last_modified, record in read_dump(path):
+            position += 1
+            if position <= skip:
+                continue
+            if record:
+                batch.append((last_modified, record))
+            if len(batch) >= batch_size:
+                self._commit_batch(source, apply_batch, batch, position)
+                batch = []
+                if position % (batch_size * 20) == 0:
+                    print(f"{source}: {position} records ({position / max(time.time() - start, 1e-6):.0f}/s)")
+
+        self._commit_batch(source, apply_batch, batch, position, finished=True)
+        print(f"{source}: finished {path} ({position} records)")
+
+    def _commit_batch(self, source: str, apply_batch, batch: List[Tuple[str, Dict]], position: int,
+                      finished: bool = False):
+        # The batch and its checkpoint land together, so a resumed run never applies a record twice
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            apply_batch(conn, batch)
+            conn.execute(
+                "UPDATE ingest_state SET records = ?, finished = ? WHERE source = ?",
+                (position, int(finished), source)
+            )
+
+    def _apply_authors(self, conn: sqlite3.Connection, batch: List[Tuple[str, Dict]]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO authors (id, name) VALUES (?, ?)",
+            [(olid(record.get('key')), record['name']) for _, record in batch
+             if record.get('key') and isinstance(record.get('name'), str)]
+        )
+
+    def _apply_works(self, conn: sqlite3.Connection, batch: List[Tuple[str, Dict]]):
+        for last_modified, record in batch:
+            work_id = olid(record.get('key'))
+            title = record.get('title')
+            if not work_id or not isinstance(title, str):
+                continue
+            author_keys = [
+                olid(entry['author']['key']) for entry in record.get('authors', [])
+                if isinstance(entry, dict) and isinstance(entry.get('author'), dict) and entry['author'].get('key')
+            ]
+            subjects = [s for s in record.get('subjects', []) if isinstance(s, str)]
+            covers = [c for c in record.get('covers', []) if isinstance(c, int) and c > 0]
+            first_publish_date = record.get('first_publish_date')
+
+            # Only replace a work with a newer revision of itself (incremental re-ingest)
+            changed = conn.execute("""
+                INSERT INTO works (id, title, title_norm, author_keys, first_publish_date, first_publish_year,
+                                   subjects, cover_id, last_modified)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    title = excluded.title, title_norm = excluded.title_norm, author_keys = excluded.author_keys,
+                    first_publish_date = excluded.first_publish_date,
+                    first_publish_year = excluded.first_publish_year, subjects = excluded.subjects,
+                    cover_id = excluded.cover_id, last_modified = excluded.last_modified
+                WHERE excluded.last_modified >= works.last_modified""",
+                (work_id, title, normalize_title(title), json.dumps(author_keys), first_publish_date,
+                 extract_year(first_publish_date), json.dumps(subjects), covers[0] if covers else None,
+                 last_modified)
+            ).rowcount
+            if changed:
+                conn.execute("DELETE FROM work_subjects WHERE work_id = ?", (work_id,))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO work_subjects (subject, work_id) VALUES (?, ?)",
+                    [(normalize_catalog_subject(subject), work_id) for subject in subjects]
+                )
+
+    def _apply_editions(self, conn: sqlite3.Connection, batch: List[Tuple[str, Dict]]):
+        counts = Counter()
+        for _, record in batch:
+            for work in record.get('works', []):
+                if isinstance(work, dict) and work.get('key'):
+                    counts[olid(work['key'])] += 1
+        conn.executemany("""
+            INSERT INTO edition_counts (work_id, edition_count) VALUES (?, ?)
+            ON CONFLICT (work_id) DO UPDATE SET edition_count = edition_count + excluded.edition_count""",
+            counts.items()
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect the local OpenLibrary catalog')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subcommands.add_parser('ingest', help='Stream dump files into the catalog (resumable)')
+    ingest.add_argument('--db', default=os.environ.get('LOCAL_CATALOG_PATH', 'catalog.sqlite3'))
+    ingest.add_argument('--authors', help='authors dump (.txt.gz TSV or .jsonl)')
+    ingest.add_argument('--works', help='works dump')
+    ingest.add_argument('--editions', help='editions dump')
+    ingest.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE)
+
+    stats = subcommands.add_parser('stats', help='Print catalog row counts and ingest progress')
+    stats.add_argument('--db', default=os.environ.get('LOCAL_CATALOG_PATH', 'catalog.sqlite3'))
+
+    args = parser.parse_args()
+    catalog = LocalCatalog(args.db)
+    if args.command == 'ingest':
+        for source in ('authors', 'works', 'editions'):
+            path = getattr(args, source)
+            if path:
+                catalog.ingest(source, path, args.batch_size)
+    print(json.dumps(catalog.get_stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
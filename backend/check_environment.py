@@ -0,0 +1,103 @@
+"""Build-time check that the Python environment can run the app, so app.py doesn't have to at import.
+
+Azure's Python images put /agents/python (with an old typing_extensions that lacks Sentinel) on
+PYTHONPATH ahead of site-packages, which breaks groq/pydantic. This script verifies, once, that
+the interpreter matches runtime.txt, that nothing shadows site-packages and that every dependency
+imports with the features the app relies on. It exits non-zero with diagnostics otherwise.
+
+    python check_environment.py          # the deploy workflow runs this after pip install
+    python check_environment.py --quiet  # startup.sh: only print on failure
+
+Run from the backend directory.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+SHADOWING_PATH = '/agents/python'
+
+# Module -> attribute the app needs from it (None: importing is enough)
+REQUIRED_MODULES = {
+    'flask': None,
+    'flask_cors': 'CORS',
+    'werkzeug': None,
+    'requests': None,
+    'dotenv': 'load_dotenv',
+    'numpy': None,
+    'prometheus_client.multiprocess': 'MultiProcessCollector',
+    'typing_extensions': 'Sentinel',  # Needed by pydantic, which groq is built on
+    'groq': 'AsyncGroq',
+    'httpx': 'AsyncClient',
+    'uvicorn.workers': 'UvicornWorker',
+    'a2wsgi': 'WSGIMiddleware',
+}
+
+
+def runtime_version(backend_dir: str):
+    """(major, minor) from runtime.txt, e.g. python-3.12 -> (3, 12)"""
+    try:
+        with open(os.path.join(backend_dir, 'runtime.txt')) as f:
+            version = f.read().strip().split('-')[-1]
+        return tuple(int(part) for part in version.split('.')[:2])
+    except (OSError, ValueError):
+        return None
+
+def site_packages_diagnostics() -> list:
+    lines = [f"PYTHONPATH: {os.environ.get('PYTHONPATH', 'not set')}", f"sys.path (first 10): {sys.path[:10]}"]
+    for path in sys.path:
+        if 'site-packages' in str(path) and os.path.isdir(path):
+            typing_related = [name for name in os.listdir(path) if 'typing' in name.lower()]
+            suffix = f" (typing-related: {typing_related})" if typing_related else ''
+            lines.append(f"Site-packages path: {path}{suffix}")
+    return lines
+
+def check(backend_dir: str) -> list:
+    """Problems found, as messages; empty when the environment is good"""
+    problems = []
+
+    shadowing = [path for path in sys.path if SHADOWING_PATH in str(path)]
+    if shadowing:
+        problems.append(f"{SHADOWING_PATH} is on sys.path ({shadowing}); strip it from PYTHONPATH before "
+                        f"starting gunicorn (startup.sh does)")
+
+    for module_name, attribute in REQUIRED_MODULES.items():
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            problems.append(f"Could not import {module_name}: {e}")
+            continue
+        location = getattr(module, '__file__', '') or ''
+        if SHADOWING_PATH in location:
+            problems.append(f"{module_name} is loaded from {location}, not site-packages")
+        if attribute and not hasattr(module, attribute):
+            problems.append(f"{module_name} from {location} has no {attribute} - it is too old")
+
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the environment can run the app')
+    parser.add_argument('--quiet', action='store_true', help='only print on failure')
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    expected = runtime_version(backend_dir)
+    if expected and sys.version_info[:2] != expected:
+        # Only a warning - local development often runs another interpreter
+        print(f"! Python {sys.version_info[0]}.{sys.version_info[1]} does not match runtime.txt "
+              f"({expected[0]}.{expected[1]})")
+
+    problems = check(backend_dir)
+    if problems:
+        print("✗ Environment check failed:")
+        for problem in problems:
+            print(f"  - {problem}")
+        for line in site_packages_diagnostics():
+            print(f"  {line}")
+        sys.exit(1)
+    if not args.quiet:
+        print(f"✓ Environment OK: Python {sys.version.split()[0]}, {len(REQUIRED_MODULES)} dependencies checked")
+
+
+if __name__ == '__main__':
+    main()
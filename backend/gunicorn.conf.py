@@ -0,0 +1,7 @@
+# gunicorn.conf.py - loaded by startup.sh alongside its command-line settings
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauge files from the shared Prometheus directory
+    multiprocess.mark_process_dead(worker.pid)
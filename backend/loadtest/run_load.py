@@ -0,0 +1,287 @@
+"""End-to-end load test: the API under gunicorn against the local OpenLibrary and Groq stand-ins.
+
+Starts the stand-ins (see upstreams.py) and the app, then sweeps concurrency levels against
+/api/recommend. For each level it reports throughput, latency percentiles, upstream calls per
+request (by service, endpoint and status, from the stand-ins' counters) and the mean time per
+pipeline stage (from the app's /metrics), and writes everything to a JSON file.
+
+    python -m loadtest.run_load                                   # levels 1,2,4,8,16
+    python -m loadtest.run_load --concurrency 4,16,64 --requests 200 --ol-429-rate 0.05
+    python -m loadtest.run_load --cold                            # disable the app's caches
+    python -m loadtest.run_load --target http://127.0.0.1:5000 --upstreams http://127.0.0.1:8081,http://127.0.0.1:8082
+
+Caches stay warm from one level to the next unless --cold is given. Run from the backend directory.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+from loadtest.upstreams import add_fault_arguments, fault_argv
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(LOADTEST_DIR)
+RESULTS_DIR = os.path.join(LOADTEST_DIR, 'results')
+
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16]
+STARTUP_TIMEOUT = 60  # Seconds to wait for the app and stand-ins to answer
+SEED = 1234
+
+
+# Processes
+
+def wait_until_up(url: str, timeout: float = STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=2).ok:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def start_upstreams(args, log) -> subprocess.Popen:
+    command = [sys.executable, '-m', 'loadtest.upstreams', '--openlibrary-port', str(args.openlibrary_port),
+               '--groq-port', str(args.groq_port)] + fault_argv(args)
+    return subprocess.Popen(command, cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT)
+
+def start_app(args, openlibrary_url: str, groq_url: str, work_dir: str, log) -> subprocess.Popen:
+    """The app as deployed (gunicorn with uvicorn or gthread workers, see startup.sh), or Flask's threaded server"""
+    env = dict(os.environ)
+    env.pop('LOCAL_CATALOG_PATH', None)  # Every lookup should reach the OpenLibrary stand-in
+    env.update({
+        'OPENLIBRARY_BASE_URL': openlibrary_url,
+        'GROQ_BASE_URL': groq_url,
+        'GROQ_API_KEY': 'loadtest',
+        'OPENLIBRARY_OFFLINE': 'false',
+        'CACHE_DB_PATH': os.path.join(work_dir, 'cache.sqlite3'),
+        'SUBJECT_TABLE_PATH': os.path.join(work_dir, 'subjects.json'),
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(work_dir, 'prometheus'),
+        'PYTHONUNBUFFERED': '1',
+        'WARMER_ENABLED': 'false',  # Background warming would mix its upstream calls into the measurements
+    })
+    if args.cold:
+        # Memory-only caches that keep nothing, so every request does the full amount of upstream work
+        env.update({'CACHE_DB_PATH': '', 'WORK_CACHE_MAX_ENTRIES': '0', 'RESULT_CACHE_MAX_ENTRIES': '0',
+                    'LLM_CACHE_MAX_ENTRIES': '0', 'SEARCH_CACHE_MAX_ENTRIES': '0',
+                    'TITLE_INDEX_ENABLED': 'false'})
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+    if args.server == 'gunicorn':
+        command = ['gunicorn', '--bind', f'127.0.0.1:{args.port}', '--config', 'gunicorn.conf.py',
+                   '--timeout', '1200', '--workers', str(args.workers), '--threads', str(args.threads),
+                   '--worker-class', 'gthread', 'app:app']
+    elif args.server == 'gunicorn-async':
+        command = ['gunicorn', '--bind', f'127.0.0.1:{args.port}', '--config', 'gunicorn.conf.py',
+                   '--timeout', '1200', '--workers', str(args.workers),
+                   '--worker-class', 'uvicorn.workers.UvicornWorker', 'asgi:application']
+    else:
+        env.pop('PROMETHEUS_MULTIPROC_DIR')
+        command = [sys.executable, '-c', f'import app; app.app.run(port={args.port}, threaded=True)']
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def stop(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# Measurement
+
+def percentile_ms(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+def upstream_counts(urls: List[str]) -> Dict[str, int]:
+    """'service endpoint status' -> requests served so far, summed over the stand-ins"""
+    counts = {}
+    for url in urls:
+        stats = requests.get(f'{url}/__stats', timeout=5).json()
+        for endpoint, statuses in stats['requests'].items():
+            for status, count in statuses.items():
+                counts[f"{stats['name']} {endpoint} {status}"] = count
+    return counts
+
+def stage_totals(target: str) -> Dict[str, List[float]]:
+    """stage -> [total seconds, observations] from the app's bookrec_stage_seconds histogram"""
+    totals = {}
+    text = requests.get(f'{target}/metrics', timeout=10).text
+    for family in text_string_to_metric_families(text):
+        if family.name != 'bookrec_stage_seconds':
+            continue
+        for sample in family.samples:
+            stage = sample.labels.get('stage')
+            if sample.name.endswith('_sum'):
+                totals.setdefault(stage, [0.0, 0.0])[0] += sample.value
+            elif sample.name.endswith('_count'):
+                totals.setdefault(stage, [0.0, 0.0])[1] += sample.value
+    return totals
+
+def make_workload(titles: List[str], count: int, args, rnd: random.Random) -> List[Dict[str, Any]]:
+    """Request bodies of min..max input titles each"""
+    return [{'books': rnd.sample(titles, rnd.randint(args.min_books, args.max_books)), 'filters': {}}
+            for _ in range(count)]
+
+def run_level(target: str, upstream_urls: List[str], concurrency: int, workload: List[Dict[str, Any]],
+              per_page: int) -> Dict[str, Any]:
+    local = threading.local()
+    url = f'{target}/api/recommend?page=1&per_page={per_page}'
+
+    def send(body):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = session.post(url, json=body, timeout=600).status_code
+        except requests.exceptions.RequestException:
+            status = 'error'
+        return time.perf_counter() - start, status
+
+    upstream_before = upstream_counts(upstream_urls)
+    stages_before = stage_totals(target)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, workload))
+    elapsed = time.perf_counter() - started
+    upstream = {key: count - upstream_before.get(key, 0) for key, count in upstream_counts(upstream_urls).items()
+                if count > upstream_before.get(key, 0)}
+    stages = {stage: [total - stages_before.get(stage, [0, 0])[0], count - stages_before.get(stage, [0, 0])[1]]
+              for stage, (total, count) in stage_totals(target).items()}
+
+    latencies = [latency for latency, status in results if status == 200]
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': percentile_ms(latencies, 0.50),
+            'p90': percentile_ms(latencies, 0.90),
+            'p99': percentile_ms(latencies, 0.99),
+            'max': percentile_ms(latencies, 1.0),
+        },
+        'upstream_calls': upstream,
+        'upstream_calls_per_request': {key: round(count / len(results), 2) for key, count in upstream.items()},
+        'stage_mean_ms': {stage: round(total / count * 1000, 1)
+                          for stage, (total, count) in sorted(stages.items()) if count},
+        'stage_calls_per_request': {stage: round(count / len(results), 2)
+                                    for stage, (_, count) in sorted(stages.items()) if count},
+    }
+
+def print_level(result: Dict[str, Any]):
+    latency = result['latency_ms']
+    errors = result['requests'] - result['statuses'].get('200', 0)
+    print(f"c={result['concurrency']:<4} {result['requests']:>5} req  {result['throughput_rps']:>7} req/s  "
+          f"p50 {latency['p50']}ms  p90 {latency['p90']}ms  p99 {latency['p99']}ms  errors {errors}")
+    for key, per_request in sorted(result['upstream_calls_per_request'].items()):
+        print(f"        {key:32} {per_request:6.2f} per request")
+    for stage, mean in result['stage_mean_ms'].items():
+        print(f"        stage {stage:26} {mean:8.1f}ms mean  x{result['stage_calls_per_request'][stage]}")
+
+def run_metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=LOADTEST_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    meta = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    meta.update({key: value for key, value in vars(args).items() if key != 'output'})
+    return meta
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test against local OpenLibrary and Groq stand-ins')
+    parser.add_argument('--concurrency', default=','.join(map(str, DEFAULT_CONCURRENCY)), help='levels to sweep')
+    parser.add_argument('--requests', type=int, default=50, help='requests per level')
+    parser.add_argument('--min-books', type=int, default=1, help='fewest input titles per request')
+    parser.add_argument('--max-books', type=int, default=3, help='most input titles per request')
+    parser.add_argument('--per-page', type=int, default=2)
+    parser.add_argument('--titles', type=int, default=500, help='size of the title pool requests draw from')
+    parser.add_argument('--cold', action='store_true', help="run the app with its caches disabled")
+    parser.add_argument('--server', choices=['gunicorn', 'gunicorn-async', 'flask'], default='gunicorn',
+                        help='gunicorn: gthread workers (SERVER_MODE=sync); gunicorn-async: uvicorn workers')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (startup.sh uses 2)')
+    parser.add_argument('--threads', type=int, default=2, help='gunicorn threads per worker (startup.sh uses 2)')
+    parser.add_argument('--port', type=int, default=8090, help='port for the app under test')
+    parser.add_argument('--openlibrary-port', type=int, default=8081)
+    parser.add_argument('--groq-port', type=int, default=8082)
+    parser.add_argument('--target', help='test an already running app instead of starting one')
+    parser.add_argument('--upstreams', help='comma-separated stand-in URLs (OpenLibrary first) already running')
+    parser.add_argument('--output', help='result file (default loadtest/results/load-<time>.json)')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bookrec-loadtest-')
+    log_path = os.path.join(work_dir, 'processes.log')
+    upstreams = app_process = None
+    with open(log_path, 'w') as log:
+        try:
+            if args.upstreams:
+                upstream_urls = args.upstreams.split(',')
+            else:
+                upstream_urls = [f'http://127.0.0.1:{args.openlibrary_port}', f'http://127.0.0.1:{args.groq_port}']
+                upstreams = start_upstreams(args, log)
+            for url in upstream_urls:
+                wait_until_up(f'{url}/__stats')
+
+            target = args.target
+            if not target:
+                target = f'http://127.0.0.1:{args.port}'
+                app_process = start_app(args, upstream_urls[0], upstream_urls[1], work_dir, log)
+            wait_until_up(f'{target}/api/test')
+
+            titles = requests.get(f'{upstream_urls[0]}/__titles', params={'limit': args.titles},
+                                  timeout=10).json()['titles']
+            rnd = random.Random(SEED)
+            levels = []
+            for concurrency in (int(c) for c in args.concurrency.split(',')):
+                result = run_level(target, upstream_urls, concurrency,
+                                   make_workload(titles, args.requests, args, rnd), args.per_page)
+                print_level(result)
+                levels.append(result)
+        finally:
+            stop(app_process)
+            stop(upstreams)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'meta': run_metadata(args), 'levels': levels}, f, indent=1)
+    print(f"Wrote {len(levels)} levels to {output} (process logs in {log_path})")
+    if not args.target:
+        shutil.rmtree(os.path.join(work_dir, 'prometheus'), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
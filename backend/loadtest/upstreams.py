@@ -0,0 +1,469 @@
+"""Local stand-ins for OpenLibrary and Groq, for load-testing the API without touching either service.
+
+The OpenLibrary server replays recorded search.json and works responses and answers anything not
+recorded from a seeded synthetic catalog. No recording is committed, so out of the box every
+OpenLibrary answer is synthetic: load-test numbers reflect the catalog's shape (subjects per work,
+works per subject), not real OpenLibrary payloads. Run once with --record-from to capture real
+responses into recordings/openlibrary.json; later runs replay them ahead of the catalog. The Groq server emulates chat completions (plain and
+streamed), answering batched page prompts with the JSON the app expects. Both inject configurable
+latency, 5xx errors and 429s, and count every request by endpoint and status.
+
+    python -m loadtest.upstreams                                  # OpenLibrary on :8081, Groq on :8082
+    python -m loadtest.upstreams --ol-latency 150 --ol-429-rate 0.05 --groq-latency 1200
+    python -m loadtest.upstreams --record-from https://openlibrary.org   # proxy misses and record them
+
+Point the app at them with OPENLIBRARY_BASE_URL=http://127.0.0.1:8081 and
+GROQ_BASE_URL=http://127.0.0.1:8082. Each server also answers GET /__stats and POST /__reset;
+the OpenLibrary one lists workload titles on GET /__titles. Run from the backend directory.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+RECORDINGS_PATH = os.path.join(LOADTEST_DIR, 'recordings', 'openlibrary.json')
+
+SYNTHETIC_WORKS = 5000
+SEED = 1234
+SUBJECTS = [
+    'Fiction', 'Fantasy', 'Science fiction', 'Dystopias', 'Magic', 'Wizards', 'Dragons', 'Love stories',
+    'Horror tales', 'Mystery fiction', 'Detective and mystery stories', 'Historical fiction', 'Space opera',
+    'Young adult fiction', 'Juvenile fiction', 'Adventure stories', 'Political fiction', 'Time travel',
+    'Artificial intelligence', 'Vampires', 'Quests (Expeditions)', 'Good and evil', 'Friendship',
+    'Families', 'War stories', 'Coming of age', 'Humorous fiction', 'Short stories', 'Classic literature',
+] + [f'Subject {i}' for i in range(400)]
+TITLE_WORDS = ['Shadow', 'River', 'Crown', 'Night', 'Glass', 'Winter', 'Empire', 'Garden', 'Storm', 'Silver',
+               'Dream', 'Fire', 'Stone', 'Sea', 'Ash', 'Star', 'Iron', 'Memory', 'Wolf', 'Light']
+LAST_NAMES = ['Smith', 'Tolkien', 'Le Guin', 'Herbert', 'Asimov', 'Austen', 'Orwell', 'Pratchett',
+              'Rowling', 'Gibson', 'Shelley', 'Stoker', 'Collins', 'Simmons', 'Weir']
+
+
+class FaultConfig:
+    """Latency, error and throttling behaviour of one stand-in"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 throttle_rate: float = 0, retry_after: float = 1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+
+    def delay(self, rnd: random.Random) -> float:
+        return max(0.0, self.latency_ms + rnd.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def injected_status(self, rnd: random.Random) -> Optional[int]:
+        roll = rnd.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(vars(self))
+
+
+class SyntheticCatalog:
+    """Seeded OpenLibrary-shaped works with a skewed subject distribution, plus their search indexes"""
+
+    def __init__(self, count: int = SYNTHETIC_WORKS, seed: int = SEED):
+        rnd = random.Random(seed)
+        weights = [1.0 / (rank + 1) for rank in range(len(SUBJECTS))]
+        self.works = {}
+        self.docs = {}
+        self.by_subject = {}
+        self.by_title = {}
+        for i in range(count):
+            work_id = f'OL{i + 1}W'
+            title = f"The {rnd.choice(TITLE_WORDS)} of {rnd.choice(TITLE_WORDS)} {i + 1}"
+            subjects = list(dict.fromkeys(rnd.choices(SUBJECTS, weights, k=rnd.randint(1, 12))))
+            year = rnd.randint(1800, 2024)
+            author = f'{chr(65 + rnd.randint(0, 25))}. {rnd.choice(LAST_NAMES)}'
+            author_key = f"/authors/OL{int(hashlib.md5(author.encode()).hexdigest()[:5], 16)}A"
+            cover_id = rnd.randint(1, 10 ** 7)
+            self.works[work_id] = {
+                'key': f'/works/{work_id}',
+                'title': title,
+                'subjects': subjects,
+                'first_publish_date': str(year),
+                'authors': [{'author': {'key': author_key}}],
+                'covers': [cover_id],
+            }
+            self.docs[work_id] = {
+                'key': f'/works/{work_id}',
+                'title': title,
+                'author_name': [author],
+                'first_publish_year': year,
+                'subject': subjects,
+                'cover_i': cover_id,
+                'edition_count': rnd.choice([1, 1, 2, 3, 12, 80]),
+            }
+            self.by_title[title.lower()] = work_id
+            for subject in subjects:
+                self.by_subject.setdefault(subject.lower(), []).append(work_id)
+        for work_ids in self.by_subject.values():
+            work_ids.sort(key=lambda work_id: -self.docs[work_id]['edition_count'])
+
+    def search(self, query: str, limit: int) -> Dict[str, Any]:
+        """Answer the query shapes the app sends: subject searches (with genre/year clauses),
+        key lookups and title searches"""
+        subject = re.match(r'subject:(.+?)(?: AND |$)', query)
+        if subject:
+            work_ids = self.by_subject.get(subject.group(1).strip('"').lower(), [])
+            genre = re.search(r'AND subject:"([^"]*)"', query)
+            years = re.search(r'first_publish_year:\[(\d+) TO (\d+)\]', query)
+            docs = []
+            for work_id in work_ids:
+                doc = self.docs[work_id]
+                if genre and genre.group(1).lower() not in (s.lower() for s in doc['subject']):
+                    continue
+                if years and not int(years.group(1)) <= doc['first_publish_year'] <= int(years.group(2)):
+                    continue
+                docs.append(doc)
+        elif query.startswith('key:'):
+            work_id = query.split('/')[-1]
+            docs = [self.docs[work_id]] if work_id in self.docs else []
+        else:
+            text = query.lower().strip()
+            exact = self.by_title.get(text)
+            if exact:
+                docs = [self.docs[exact]]
+            else:
+                docs = [self.docs[w] for title, w in self.by_title.items() if text in title][:limit]
+        return {'numFound': len(docs), 'start': 0, 'docs': docs[:limit]}
+
+    def titles(self, limit: int, seed: int) -> List[str]:
+        rnd = random.Random(seed)
+        titles = [doc['title'] for doc in self.docs.values()]
+        return rnd.sample(titles, min(limit, len(titles)))
+
+
+class Recordings:
+    """Recorded OpenLibrary responses keyed by path and query string, optionally filled by proxying"""
+
+    def __init__(self, path: str, record_from: Optional[str] = None):
+        self.path = path
+        self.record_from = record_from.rstrip('/') if record_from else None
+        self.responses = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.responses = json.load(f).get('responses', {})
+            print(f"Loaded {len(self.responses)} recorded OpenLibrary responses from {path}")
+        elif not record_from:
+            print(f"No recordings at {path}; answering OpenLibrary requests from the synthetic catalog only")
+
+    @staticmethod
+    def request_key(path: str, params: Dict[str, str]) -> str:
+        return path + '?' + '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+
+    def lookup(self, path: str, params: Dict[str, str]) -> Optional[Tuple[int, Any]]:
+        key = self.request_key(path, params)
+        with self.lock:
+            recorded = self.responses.get(key)
+        if recorded is not None or not self.record_from:
+            return (recorded['status'], recorded['body']) if recorded else None
+
+        query = '&'.join(f"{k}={urllib.request.quote(str(v))}" for k, v in params.items())
+        url = f"{self.record_from}{path}" + (f"?{query}" if query else '')
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                recorded = {'status': response.status, 'body': json.loads(response.read())}
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                return None
+            recorded = {'status': 404, 'body': {'error': 'notfound'}}
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"Could not record {url}: {e}")
+            return None
+        with self.lock:
+            self.responses[key] = recorded
+        return recorded['status'], recorded['body']
+
+    def titles(self) -> List[str]:
+        """Title queries present in the recordings (searches that are not subject or key lookups)"""
+        titles = []
+        for key in self.responses:
+            path, _, query = key.partition('?')
+            q = dict(parse_qsl(query)).get('q', '')
+            if path == '/search.json' and q and not q.startswith(('subject:', 'key:')):
+                titles.append(q)
+        return titles
+
+    def save(self):
+        if not self.record_from:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            data = {'recorded_from': self.record_from, 'responses': self.responses}
+        with open(self.path, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        print(f"Saved {len(data['responses'])} recorded responses to {self.path}")
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, handler, name: str, faults: FaultConfig, seed: int):
+        super().__init__(address, handler)
+        self.name = name
+        self.faults = faults
+        self.rnd = random.Random(seed)
+        self.rnd_lock = threading.Lock()
+        self.counts = Counter()  # (endpoint, status) -> requests
+        self.counts_lock = threading.Lock()
+
+    def count(self, endpoint: str, status: int):
+        with self.counts_lock:
+            self.counts[(endpoint, status)] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.counts_lock:
+            by_endpoint = {}
+            for (endpoint, status), count in sorted(self.counts.items()):
+                by_endpoint.setdefault(endpoint, {})[str(status)] = count
+        return {'name': self.name, 'faults': self.faults.as_dict(), 'requests': by_endpoint}
+
+    def roll(self) -> Tuple[float, Optional[int]]:
+        with self.rnd_lock:
+            return self.faults.delay(self.rnd), self.faults.injected_status(self.rnd)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real services
+
+    def log_message(self, format, *args):
+        pass  # One line per request would swamp the load test's own output
+
+    def send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def control(self) -> bool:
+        """Answer the /__ control endpoints; True if the request was one"""
+        path = urlsplit(self.path).path
+        if path == '/__stats':
+            self.send_json(200, self.server.stats())
+        elif path == '/__reset':
+            with self.server.counts_lock:
+                self.server.counts.clear()
+            self.send_json(200, {'status': 'ok'})
+        else:
+            return False
+        return True
+
+    def inject_fault(self, endpoint: str) -> bool:
+        """Sleep for the configured latency, then answer with an injected 429/503 if one is due"""
+        delay, status = self.server.roll()
+        time.sleep(delay)
+        if status is None:
+            return False
+        self.server.count(endpoint, status)
+        if status == 429:
+            self.send_json(429, {'error': {'message': 'Rate limit reached (injected)', 'type': 'requests',
+                                           'code': 'rate_limit_exceeded'}},
+                           {'Retry-After': str(self.server.faults.retry_after)})
+        else:
+            self.send_json(503, {'error': 'Service unavailable (injected)'})
+        return True
+
+
+class OpenLibraryHandler(StandInHandler):
+    def do_GET(self):
+        if self.control():
+            return
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+        if parts.path == '/__titles':
+            limit = int(params.get('limit', 500))
+            titles = self.server.recordings.titles() + self.server.catalog.titles(limit, int(params.get('seed', SEED)))
+            self.send_json(200, {'titles': titles[:limit]})
+            return
+
+        if parts.path == '/search.json':
+            endpoint = 'search'
+        elif re.fullmatch(r'/works/OL\d+W\.json', parts.path):
+            endpoint = 'works'
+        else:
+            self.server.count('other', 404)
+            self.send_json(404, {'error': 'notfound'})
+            return
+        if self.inject_fault(endpoint):
+            return
+
+        recorded = self.server.recordings.lookup(parts.path, params)
+        if recorded is not None:
+            status, body = recorded
+        elif endpoint == 'search':
+            status, body = 200, self.server.catalog.search(params.get('q', ''), int(params.get('limit', 100)))
+        else:
+            work = self.server.catalog.works.get(parts.path.split('/')[-1][:-len('.json')])
+            status, body = (200, work) if work else (404, {'error': 'notfound'})
+        self.server.count(endpoint, status)
+        self.send_json(status, body)
+
+
+class GroqHandler(StandInHandler):
+    def do_GET(self):
+        if not self.control():
+            self.send_json(404, {'error': {'message': 'Unknown path'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self.control():
+            return
+        if urlsplit(self.path).path != '/openai/v1/chat/completions':
+            self.server.count('other', 404)
+            self.send_json(404, {'error': {'message': 'Unknown path'}})
+            return
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            self.server.count('chat', 400)
+            self.send_json(400, {'error': {'message': 'Invalid JSON'}})
+            return
+        if self.inject_fault('chat'):
+            return
+
+        prompt = ''.join(m.get('content') or '' for m in request.get('messages', []))
+        content = self.completion_text(prompt)
+        usage = {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        completion_id = 'chatcmpl-' + hashlib.md5(prompt.encode()).hexdigest()[:24]
+        model = request.get('model', 'groq/compound')
+        self.server.count('chat', 200)
+
+        if not request.get('stream'):
+            self.send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop', 'logprobs': None}],
+                'usage': usage,
+            })
+            return
+
+        # Server-sent events, one chunk per word; the connection closes at the end of the stream
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        words = re.findall(r'\S+\s*', content)
+        for i, word in enumerate(words):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': {'content': word}, 'finish_reason': None}]}
+            if i == len(words) - 1:
+                chunk['choices'][0]['finish_reason'] = 'stop'
+                chunk['x_groq'] = {'id': completion_id, 'usage': usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    @staticmethod
+    def completion_text(prompt: str) -> str:
+        """Batched page prompts get the JSON object they ask for; anything else gets prose"""
+        ids = re.findall(r'- id: (\S+)', prompt)
+        if not ids:
+            return ("You will find the same careful character work and layered world-building you enjoyed, "
+                    "with themes that echo your favourite books while still taking you somewhere new.")
+        needed = re.findall(r'Needed: ([^\n]+)', prompt)
+        reply = {}
+        for i, work_id in enumerate(ids):
+            fields = [f.strip() for f in needed[i].split(',')] if i < len(needed) else ['explanation', 'why_read']
+            reply[work_id] = {
+                field: f"Generated {field} for {work_id}: this book shares the themes and tone you enjoy "
+                       f"and offers a fresh angle on them."
+                for field in fields
+            }
+        return json.dumps(reply)
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    """Fault-injection flags for both stand-ins, shared with run_load"""
+    for prefix, name, latency in (('ol', 'OpenLibrary', 80.0), ('groq', 'Groq', 600.0)):
+        parser.add_argument(f'--{prefix}-latency', type=float, default=latency, help=f'{name} mean latency (ms)')
+        parser.add_argument(f'--{prefix}-jitter', type=float, default=latency / 2, help=f'{name} latency jitter (ms)')
+        parser.add_argument(f'--{prefix}-error-rate', type=float, default=0.0, help=f'{name} share of 503s')
+        parser.add_argument(f'--{prefix}-429-rate', type=float, default=0.0, help=f'{name} share of 429s')
+    parser.add_argument('--retry-after', type=float, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--groq-token-ms', type=float, default=5, help='delay between streamed chunks (ms)')
+
+def fault_config(args, prefix: str) -> FaultConfig:
+    return FaultConfig(
+        latency_ms=getattr(args, f'{prefix}_latency'),
+        jitter_ms=getattr(args, f'{prefix}_jitter'),
+        error_rate=getattr(args, f'{prefix}_error_rate'),
+        throttle_rate=getattr(args, f'{prefix}_429_rate'),
+        retry_after=args.retry_after,
+    )
+
+def fault_argv(args) -> List[str]:
+    """The fault flags of a parsed namespace, for passing on to a stand-in subprocess"""
+    argv = []
+    for prefix in ('ol', 'groq'):
+        for option in ('latency', 'jitter', 'error_rate', '429_rate'):
+            argv += [f"--{prefix}-{option.replace('_', '-')}", str(getattr(args, f'{prefix}_{option}'))]
+    return argv + ['--retry-after', str(args.retry_after), '--groq-token-ms', str(args.groq_token_ms)]
+
+def serve(args) -> Tuple[StandInServer, StandInServer]:
+    openlibrary = StandInServer((args.host, args.openlibrary_port), OpenLibraryHandler, 'openlibrary',
+                                fault_config(args, 'ol'), SEED)
+    openlibrary.catalog = SyntheticCatalog(args.works, SEED)
+    openlibrary.recordings = Recordings(args.recordings, args.record_from)
+    groq = StandInServer((args.host, args.groq_port), GroqHandler, 'groq', fault_config(args, 'groq'), SEED + 1)
+    groq.token_delay = args.groq_token_ms / 1000
+    for server in (openlibrary, groq):
+        threading.Thread(target=server.serve_forever, name=f'{server.name}-stand-in', daemon=True).start()
+    return openlibrary, groq
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenLibrary and Groq stand-ins for load testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--openlibrary-port', type=int, default=8081)
+    parser.add_argument('--groq-port', type=int, default=8082)
+    parser.add_argument('--works', type=int, default=SYNTHETIC_WORKS, help='synthetic catalog size')
+    parser.add_argument('--recordings', default=RECORDINGS_PATH, help='recorded OpenLibrary responses')
+    parser.add_argument('--record-from', help='proxy unrecorded requests to this OpenLibrary and record them')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    openlibrary, groq = serve(args)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # Still save recordings when stopped by run_load
+    print(f"OpenLibrary stand-in on http://{args.host}:{args.openlibrary_port}, "
+          f"Groq stand-in on http://{args.host}:{args.groq_port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        openlibrary.recordings.save()
+        openlibrary.shutdown()
+        groq.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -26,9 +26,6 @@ echo "Files in current directory:"
 ls -la | head -20
 echo "============================"
 
-# Force install typing_extensions to override Azure system version
-pip install --no-cache-dir --ignore-installed --upgrade "typing_extensions>=4.10,<5"
-
 # Remove /agents/python from PYTHONPATH (Azure includes it first, breaks imports)
 export PYTHONPATH=$(echo $PYTHONPATH | tr ':' '\n' | grep -v '/agents/python' | tr '\n' ':' | sed 's/:$//')
 
@@ -68,11 +65,38 @@ echo "Found app.py: $(ls -la app.py)"
 # Ensure app directory is in PYTHONPATH
 export PYTHONPATH="$APP_DIR:$PYTHONPATH"
 
-# Run Gunicorn
+# The environment was validated at build time; re-check it once per container start and only
+# fall back to reinstalling typing_extensions if this image still shadows it
+if ! python check_environment.py --quiet; then
+    echo "Environment check failed, reinstalling typing_extensions"
+    pip install --no-cache-dir --ignore-installed --upgrade "typing_extensions>=4.10,<5"
+    python check_environment.py || exit 1
+fi
+
+# Prometheus multiprocess mode - workers write metrics here and /metrics aggregates them.
+# Cleared on every start so counters from a previous run don't leak in.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/bookrec_prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Run Gunicorn. SERVER_MODE=async (default) serves /api/recommend on uvicorn event-loop workers
+# (see asgi.py), so requests waiting on OpenLibrary/Groq don't each hold a thread; sync is the
+# original gthread setup.
+if [ "${SERVER_MODE:-async}" = "sync" ]; then
+    exec gunicorn --bind=0.0.0.0:$PORT \
+                  --config gunicorn.conf.py \
+                  --timeout 1200 \
+                  --workers 2 \
+                  --threads 2 \
+                  --worker-class gthread \
+                  --log-level info \
+                  app:app
+fi
+
 exec gunicorn --bind=0.0.0.0:$PORT \
+              --config gunicorn.conf.py \
               --timeout 1200 \
               --workers 2 \
-              --threads 2 \
-              --worker-class gthread \
+              --worker-class uvicorn.workers.UvicornWorker \
               --log-level info \
-              app:app
+              asgi:application
@@ -0,0 +1,53 @@
+"""Shared setup for the backend tests.
+
+app builds its recommender, caches and background threads at import, so the environment is
+pointed at a throwaway cache database (and the background work is switched off) before anything
+imports it. make_works provides synthetic work records.
+Run from the backend directory: python -m pytest -q
+"""
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['CACHE_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bookrec-tests-'), 'cache.sqlite3')
+os.environ['STARTUP_WARMUP'] = 'false'
+os.environ['WARMER_ENABLED'] = 'false'
+os.environ['TITLE_INDEX_ENABLED'] = 'false'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+SUBJECTS = [
+    'Fiction', 'Fantasy', 'Science fiction', 'Dystopias', 'Magic', 'Wizards', 'Dragons', 'Love stories',
+    'Horror tales', 'Mystery fiction', 'Detective and mystery stories', 'Historical fiction', 'Space opera',
+    'Young adult fiction', 'Juvenile fiction', 'Adventure stories', 'Political fiction', 'Time travel',
+    'Artificial intelligence', 'Vampires', 'Quests (Expeditions)', 'Good and evil', 'Friendship',
+    'Families', 'War stories', 'Coming of age', 'Humorous fiction', 'Short stories', 'Classic literature',
+] + [f'Subject {i}' for i in range(300)]
+LAST_NAMES = ['Smith', 'Tolkien', 'Le Guin', 'Herbert', 'Asimov', 'Austen', 'Orwell', 'Pratchett',
+              'Rowling', 'Gibson', 'Shelley', 'Stoker', 'Collins', 'Simmons', 'Weir']
+
+
+@pytest.fixture(scope='session')
+def make_works():
+    """make_works(count, seed): work details shaped like OpenLibrary's, with a skewed subject distribution"""
+    def make(count, seed):
+        rnd = random.Random(seed)
+        weights = [1.0 / (rank + 1) for rank in range(len(SUBJECTS))]
+        works = []
+        for i in range(count):
+            work = {
+                'key': f'/works/OL{i + 1}W',
+                'title': f'Synthetic Book {i + 1}',
+                'subjects': list(dict.fromkeys(rnd.choices(SUBJECTS, weights, k=rnd.randint(0, 12)))),
+                'author_name': [f'{chr(65 + rnd.randint(0, 25))}. {rnd.choice(LAST_NAMES)}'],
+                'edition_count': rnd.choice([0, 0, 1, 3, 12, 80]),
+            }
+            if rnd.random() < 0.85:
+                work['first_publish_date'] = str(rnd.randint(1800, 2024))
+            works.append(work)
+        return works
+    return make
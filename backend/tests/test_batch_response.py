@@ -0,0 +1,58 @@
+"""parse_batch_response: the JSON object out of a batched Groq reply, keyed by bare work id."""
+import pytest
+
+import app
+
+parse = app.BookRecommender.parse_batch_response
+
+EXPECTED = {
+    'OL1W': {'explanation': 'Because of dragons.', 'why_read': 'It has dragons.'},
+    'OL2W': {'explanation': 'Because of ships.', 'why_read': 'It has ships.'},
+}
+OBJECT = ('{"OL1W": {"explanation": "Because of dragons.", "why_read": "It has dragons."}, '
+          '"OL2W": {"explanation": "Because of ships.", "why_read": "It has ships."}}')
+
+
+@pytest.mark.parametrize('response', [
+    OBJECT,
+    f"```json\n{OBJECT}\n```",
+    f"```\n{OBJECT}\n```",
+    f"Here are the texts you asked for:\n{OBJECT}\nLet me know if you need anything else.",
+    OBJECT.replace('"OL1W"', '"/works/OL1W"').replace('"OL2W"', '"/works/OL2W"'),
+])
+def test_object_replies(response):
+    assert parse(response) == EXPECTED
+
+
+def test_list_of_objects_with_ids():
+    response = ('[{"id": "OL1W", "explanation": "Because of dragons.", "why_read": "It has dragons."}, '
+                '{"id": "/works/OL2W", "explanation": "Because of ships.", "why_read": "It has ships."}, '
+                '{"explanation": "No id, dropped."}, "not an object"]')
+    parsed = parse(response)
+    assert set(parsed) == {'OL1W', 'OL2W'}
+    assert parsed['OL1W']['why_read'] == 'It has dragons.'
+    assert parsed['OL2W']['explanation'] == 'Because of ships.'
+
+
+def test_books_wrapper_in_prose():
+    response = ('Sure! {"books": [{"id": "OL1W", "explanation": "Because of dragons.", '
+                '"why_read": "It has dragons."}]} Enjoy.')
+    assert parse(response) == {'OL1W': {'id': 'OL1W', 'explanation': 'Because of dragons.',
+                                        'why_read': 'It has dragons.'}}
+
+
+def test_braces_inside_strings_are_kept():
+    assert parse('{"OL1W": {"why_read": "A {curly} tale"}}') == {'OL1W': {'why_read': 'A {curly} tale'}}
+
+
+@pytest.mark.parametrize('response', [
+    '',
+    'I cannot help with that.',
+    '{"OL1W": {"explanation": "cut off mid-',
+    '} backwards {',
+    '```json\n```',
+    '"just a string"',
+    '[1, 2, 3]',
+])
+def test_unusable_replies_give_nothing(response):
+    assert parse(response) == {}
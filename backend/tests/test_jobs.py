@@ -0,0 +1,121 @@
+"""Recommendation jobs: state expiry, lost-worker detection, events streams and partial-result saves."""
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import app
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def make_job(job_id, **changes):
+    now = app.time.time()
+    job = {'job_id': job_id, 'status': 'running', 'stage': 'enrich', 'created_at': now, 'updated_at': now,
+           'heartbeat_at': now, 'result_token': None, 'recommendations': [], 'pagination': None,
+           'error': None, 'owner': app.JOB_OWNER}
+    job.update(changes)
+    app.job_store.set(job_id, job)
+    return job
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def test_job_state_expires_after_ttl(clock, client):
+    make_job('ttl', status='completed', stage=None)
+    assert client.get('/api/jobs/ttl').status_code == 200
+    clock.now += app.JOB_TTL + 1
+    assert client.get('/api/jobs/ttl').status_code == 404
+    assert client.get('/api/jobs/ttl/events').status_code == 404
+
+
+def test_check_orphaned(clock):
+    host = socket.gethostname()
+    alive = make_job('alive', owner='elsewhere:1')
+    assert app.check_orphaned(alive) is alive
+    assert app.check_orphaned(make_job('mine', heartbeat_at=0))['status'] == 'running'
+    assert app.check_orphaned(make_job('done', status='completed', owner=f'{host}:{dead_pid()}'))['status'] == 'completed'
+
+    dead = app.check_orphaned(make_job('dead', owner=f'{host}:{dead_pid()}'))
+    assert (dead['status'], dead['stage']) == ('failed', None)
+    assert 'resubmit' in dead['error']
+    assert app.job_store.get('dead')['status'] == 'failed'
+
+    clock.now += app.JOB_STALE_AFTER + 1  # No heartbeat since
+    assert app.check_orphaned(app.job_store.get('alive'))['status'] == 'failed'
+
+
+def test_events_stream_ends_with_reconnect(client, monkeypatch):
+    monkeypatch.setattr(app, 'JOB_EVENTS_MAX_SECONDS', 0)
+    make_job('slow')
+    lines = [json.loads(line) for line in client.get('/api/jobs/slow/events').get_data(as_text=True).splitlines()]
+    assert lines[0]['status'] == 'running'
+    assert lines[-1] == {'job_id': 'slow', 'status': 'running', 'event': 'reconnect'}
+
+
+def test_events_streams_are_capped(client, monkeypatch):
+    monkeypatch.setattr(app, 'JOB_EVENTS_MAX_SECONDS', 0)
+    monkeypatch.setattr(app, 'job_event_streams', threading.BoundedSemaphore(1))
+    make_job('capped')
+    for _ in range(2):
+        response = client.get('/api/jobs/capped/events')
+        assert response.status_code == 200
+        response.close()  # Gives the slot back, as the server does when the stream ends
+    app.job_event_streams.acquire()
+    response = client.get('/api/jobs/capped/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert client.get('/api/jobs/capped').status_code == 200
+
+
+def test_partial_text_saves_are_throttled(monkeypatch):
+    recommendation = {'id': 'OL1W', 'explanation': 'Template.', 'why_read': 'Template.'}
+    monkeypatch.setattr(app, 'load_snapshot', lambda *args: ('token', {'input_books': []}))
+    monkeypatch.setattr(app, 'snapshot_page', lambda *args: (['entry'], 1))
+    monkeypatch.setattr(app.recommender, 'decorate_recommendations', lambda *args: ([recommendation], {}))
+
+    def stream_enrichment(*args, **kwargs):
+        for i in range(50):
+            yield {'id': 'OL1W', 'event': 'explanation', 'text': f'Text {i}'}
+
+    monkeypatch.setattr(app.recommender, 'stream_enrichment', stream_enrichment)
+    job = make_job('saves', status='queued', stage=None)
+    saves = []
+    set_job = app.job_store.set
+
+    def record_save(key, value, *args, **kwargs):
+        saves.append(value['stage'])
+        set_job(key, value, *args, **kwargs)
+
+    monkeypatch.setattr(app.job_store, 'set', record_save)
+    assert app.job_slots.acquire(blocking=False)
+    app.run_recommendation_job(job, ['A book'], None, {}, 1, 2)
+    assert saves == ['build', 'enrich', None]
+    stored = app.job_store.get('saves')
+    assert stored['status'] == 'completed'
+    assert stored['recommendations'][0]['explanation'] == 'Text 49'
@@ -0,0 +1,113 @@
+"""Generated explanation and why_read text is cached, and Groq is only called on a miss."""
+import pytest
+
+import app
+
+BOOK = {'key': '/works/OL1W', 'title': 'The Dragon Road', 'author_name': ['A. Smith'],
+        'subjects': ['Fantasy', 'Dragons', 'Quests (Expeditions)'], 'first_publish_date': '1990'}
+READER = [{'key': '/works/OL2W', 'title': 'Wyrms', 'subjects': ['Fantasy', 'Dragons', 'Magic'],
+           'author_name': ['B. Jones'], 'first_publish_date': '1985'}]
+OTHER_READER = [{'key': '/works/OL3W', 'title': 'Cold Stars', 'subjects': ['Science fiction', 'Space opera'],
+                 'author_name': ['C. Brown'], 'first_publish_date': '2010'}]
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    """Prompts sent to Groq; the recommender gets an empty memory-only LLM cache"""
+    recommender = app.recommender
+    prompts = []
+
+    def call_groq_api(prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return f"Generated text number {len(prompts)}, long enough to keep."
+
+    monkeypatch.setattr(recommender, 'llm_cache', app.TieredCache('llm', max_entries=100, ttl_seconds=60))
+    monkeypatch.setattr(recommender, 'call_groq_api', call_groq_api)
+    return prompts
+
+
+def explain(input_books, score=87.5):
+    recommender = app.recommender
+    return recommender.generate_similarity_explanation_with_ai(
+        BOOK, input_books, score, recommender.build_reader_profile(input_books)
+    )
+
+
+def test_explanation_hit_skips_groq(groq):
+    first = explain(READER)
+    assert explain(READER) == first
+    assert len(groq) == 1
+
+
+def test_explanation_misses_for_another_reader(groq):
+    assert explain(READER) != explain(OTHER_READER)
+    assert len(groq) == 2
+
+
+def test_explanation_misses_when_any_prompt_input_changes(groq):
+    explain(READER)
+    # Same cleaned subjects, but the raw ones (and so the shared genres) differ
+    explain([dict(READER[0], subjects=['Fantasy', 'dragons', 'Magic'])])
+    # Same subjects, but the first three - the favorite genres - differ
+    explain([dict(READER[0], subjects=['Magic', 'Fantasy', 'Wizards', 'Dragons'])])
+    explain(READER, score=60.0)
+    assert len(groq) == 4
+    explain(READER, score=87.54)  # Renders as the same 87.5%
+    assert len(groq) == 4
+
+
+def test_favorite_genres_keep_input_order():
+    profile = app.recommender.build_reader_profile(READER + OTHER_READER + READER)
+    assert profile.favorite_genres == ('Fantasy', 'Dragons', 'Magic', 'Science fiction', 'Space opera')
+
+
+def test_explanation_misses_after_prompt_version_change(groq, monkeypatch):
+    explain(READER)
+    monkeypatch.setattr(app, 'EXPLANATION_PROMPT_VERSION', 'test-next')
+    explain(READER)
+    assert len(groq) == 2
+
+
+def test_why_read_is_shared_by_readers_and_versioned(groq, monkeypatch):
+    recommender = app.recommender
+    first = recommender.generate_reading_recommendation_with_ai(BOOK, READER)
+    assert recommender.generate_reading_recommendation_with_ai(BOOK, OTHER_READER) == first
+    assert len(groq) == 1
+    monkeypatch.setattr(app, 'WHY_READ_PROMPT_VERSION', 'test-next')
+    recommender.generate_reading_recommendation_with_ai(BOOK, READER)
+    assert len(groq) == 2
+
+
+@pytest.mark.parametrize('batch_mode', [False, True])
+def test_enrichment_reads_the_cache_before_calling_groq(groq, monkeypatch, batch_mode):
+    monkeypatch.setattr(app, 'AI_BATCH_MODE', batch_mode)
+    recommender = app.recommender
+    profile = recommender.build_reader_profile(READER)
+    if batch_mode:
+        explanation_key = recommender.page_cache_key('explanation', BOOK, profile, 87.5)
+        why_read_key = recommender.page_cache_key('why_read', BOOK)
+    else:
+        explanation_key = recommender.explanation_cache_key(BOOK, profile, 87.5)
+        why_read_key = recommender.why_read_cache_key(BOOK)
+    recommender.llm_cache.set(explanation_key, 'Cached explanation for this reader.')
+    recommender.llm_cache.set(why_read_key, 'Cached reasons to read this book.')
+
+    recommendation = {'id': 'OL1W', 'similarity_score': 87.5}
+    recommender.enrich_recommendations([recommendation], READER, profile, details={'OL1W': BOOK})
+    assert recommendation['explanation'] == 'Cached explanation for this reader.'
+    assert recommendation['why_read'] == 'Cached reasons to read this book.'
+    assert groq == []
+
+
+def test_cache_keys():
+    recommender = app.recommender
+    profile = recommender.build_reader_profile(READER)
+    assert recommender.explanation_cache_key(BOOK, profile, 87.5) == (
+        f"explanation:{app.EXPLANATION_PROMPT_VERSION}:OL1W:{profile.fingerprint}:87.5"
+    )
+    assert recommender.page_cache_key('explanation', BOOK, profile, 87.5) == (
+        f"page_explanation:{app.PAGE_PROMPT_VERSION}:OL1W:{profile.fingerprint}:87.5"
+    )
+    assert recommender.why_read_cache_key(BOOK) == f"why_read:{app.WHY_READ_PROMPT_VERSION}:OL1W"
+    assert recommender.explanation_cache_key({'title': 'No key'}, profile, 87.5) is None
+    assert profile.fingerprint == recommender.build_reader_profile(list(READER)).fingerprint
@@ -0,0 +1,106 @@
+"""LLMScheduler: callers are served by priority, reservations are reconciled with reported usage,
+and the shared quota is one budget for every worker."""
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app
+
+
+def test_queued_callers_are_served_by_priority():
+    scheduler = app.LLMScheduler(1000, 600)  # 10 tokens a second
+    assert scheduler.acquire(600)
+    granted = []
+
+    def caller(priority):
+        assert scheduler.acquire(3, priority, timeout=5)
+        granted.append(priority)
+
+    prefetch = threading.Thread(target=caller, args=(app.PRIORITY_PREFETCH,))
+    prefetch.start()
+    while scheduler.get_stats()['waiting'] == 0:
+        time.sleep(0.01)
+    page = threading.Thread(target=caller, args=(app.PRIORITY_PAGE,))
+    page.start()
+    prefetch.join()
+    page.join()
+    assert granted == [app.PRIORITY_PAGE, app.PRIORITY_PREFETCH]
+    assert scheduler.get_stats()['granted'] == 3
+
+
+def test_reservations_are_reconciled_with_reported_usage():
+    scheduler = app.LLMScheduler(1000, 600)
+    assert scheduler.acquire(500)
+    assert scheduler.get_stats()['tokens_available'] == pytest.approx(100, abs=1)
+    scheduler.reconcile(500, 200)  # Used less than reserved - the rest goes back
+    assert scheduler.get_stats()['tokens_available'] == pytest.approx(400, abs=1)
+    scheduler.reconcile(100, 500)  # Used more - the bucket goes into debt
+    assert scheduler.get_stats()['tokens_available'] == pytest.approx(0, abs=1)
+    assert not scheduler.acquire(50, timeout=0)
+    assert scheduler.get_stats()['reconciled'] == 2
+
+
+def test_shared_quota_is_one_budget(tmp_path):
+    db_path = str(tmp_path / 'quota.sqlite3')
+    first = app.LLMScheduler(1000, 600, db_path=db_path)
+    second = app.LLMScheduler(1000, 600, db_path=db_path)
+    assert first.get_stats()['shared_quota']
+    assert first.acquire(500)
+    assert second.get_stats()['tokens_available'] == pytest.approx(100, abs=1)
+    second.reconcile(500, 200)
+    assert first.get_stats()['tokens_available'] == pytest.approx(400, abs=1)
+
+
+def test_shared_levels_are_read_during_a_write(tmp_path):
+    db_path = str(tmp_path / 'quota.sqlite3')
+    scheduler = app.LLMScheduler(1000, 600, db_path=db_path)
+    assert scheduler.acquire(500)
+    writer = sqlite3.connect(db_path, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        start = time.monotonic()
+        # Falling back to the worker's own (full) buckets would report 600
+        assert scheduler.get_stats()['tokens_available'] == pytest.approx(100, abs=1)
+        assert time.monotonic() - start < 1
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()
+
+
+def test_throttle_honours_retry_after():
+    scheduler = app.LLMScheduler(1000, 600)
+    scheduler.throttle('2')
+    assert scheduler.get_stats()['tokens_available'] == pytest.approx(-20, abs=1)
+    assert not scheduler.acquire(1, timeout=0)
+    assert scheduler.get_stats()['throttled'] == 1
+
+
+def test_retries_wait_on_the_scheduler_not_a_sleep(monkeypatch):
+    recommender = app.recommender
+    calls = []
+
+    class ServerError(Exception):
+        status_code = 500
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            raise ServerError('unavailable')
+        message = SimpleNamespace(content='A reply long enough to keep.')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(recommender, '_groq_client', client)
+    monkeypatch.setattr(recommender, '_groq_client_attempted', True)
+    monkeypatch.setattr(recommender, 'rate_limiter', app.LLMScheduler(1000, 60000))
+
+    def no_sleep(seconds):
+        raise AssertionError('request_completion slept')
+
+    monkeypatch.setattr(app.time, 'sleep', no_sleep)
+    assert recommender.request_completion('prompt', max_tokens=16) == 'A reply long enough to keep.'
+    assert len(calls) == 3
+    assert recommender.rate_limiter.get_stats()['granted'] == 3
@@ -0,0 +1,58 @@
+"""calculate_enhanced_similarity_batch must agree with the per-book scorer, book for book."""
+import numpy as np
+import pytest
+
+import app
+
+FEATURES = ('subject_match', 'subject_depth', 'year_relevance', 'author_relation', 'popularity')
+
+
+@pytest.fixture(scope='module')
+def scorer():
+    return app.LightweightBookRecommender()
+
+
+def assert_batch_matches(scorer, books, input_books):
+    profile = scorer.build_reader_profile(input_books)
+    scores, components = scorer.calculate_enhanced_similarity_batch(books, input_books, profile)
+    assert len(scores) == len(books)
+    for i, book in enumerate(books):
+        expected, expected_components = scorer.calculate_enhanced_similarity(book, input_books, profile)
+        # subject_depth sums its terms in a different order, so allow for the last float bit
+        assert scores[i] == pytest.approx(expected, rel=1e-12, abs=1e-12), book.get('key')
+        for feature in FEATURES:
+            assert components[feature][i] == pytest.approx(expected_components[feature], rel=1e-12, abs=1e-12)
+
+
+@pytest.mark.parametrize('input_count', [1, 3, 10])
+def test_batch_matches_per_book(scorer, make_works, input_count):
+    assert_batch_matches(scorer, make_works(300, 7), make_works(input_count, 99))
+
+
+def test_batch_matches_per_book_on_sparse_records(scorer):
+    books = [
+        {'key': '/works/OL1W', 'title': 'No fields at all'},
+        {'key': '/works/OL2W', 'subjects': []},
+        {'key': '/works/OL3W', 'subjects': ['The', 'And'], 'first_publish_date': 'sometime'},
+        {'key': '/works/OL4W', 'subjects': ['Fantasy fiction'], 'author_name': 'J. R. R. Tolkien',
+         'publisher': ['Allen & Unwin'], 'number_of_pages_median': 310},
+        {'key': '/works/OL5W', 'subjects': ['Science fiction', 'Fantasy'], 'first_publish_date': 'May 1, 1965',
+         'author_name': ['Christopher Tolkien'], 'edition_count': 4},
+    ]
+    input_books = [
+        {'key': '/works/OL9W', 'subjects': ['Fantasy', 'Fantasy fiction', 'Dragons'], 'author_name': ['J. R. R. Tolkien']},
+        {'key': '/works/OL8W', 'title': 'Nothing known'},
+    ]
+    assert_batch_matches(scorer, books, input_books)
+
+
+def test_batch_matches_per_book_without_input_years_or_subjects(scorer, make_works):
+    input_books = [{'key': '/works/OL9W', 'title': 'Bare', 'author_name': ['A. Smith']}]
+    assert_batch_matches(scorer, make_works(50, 3), input_books)
+
+
+def test_empty_batch(scorer, make_works):
+    scores, components = scorer.calculate_enhanced_similarity_batch([], make_works(2, 1))
+    assert isinstance(scores, np.ndarray)
+    assert len(scores) == 0
+    assert all(len(values) == 0 for values in components.values())
@@ -0,0 +1,144 @@
+"""SingleFlight / AsyncSingleFlight: one call per key in flight, its outcome shared by every caller."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Call flight.do from callers threads at once; returns each caller's result or exception"""
+    barrier = threading.Barrier(callers)
+
+    def call():
+        barrier.wait()
+        try:
+            return flight.do(key, fn)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        return list(pool.map(lambda _: call(), range(callers)))
+
+
+def test_duplicates_share_one_call():
+    flight = app.SingleFlight('test', timeout=5)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'docs': [1, 2]}
+
+    results = run_concurrently(flight, 'k', fn, 8)
+    assert len(calls) == 1
+    assert all(result == {'docs': [1, 2]} for result in results)
+    stats = flight.get_stats()
+    assert (stats['leader'], stats['shared'], stats['in_flight']) == (1, 7, 0)
+
+
+def test_error_reaches_every_caller():
+    flight = app.SingleFlight('test', timeout=5)
+
+    def fn():
+        time.sleep(0.2)
+        raise KeyError('boom')
+
+    results = run_concurrently(flight, 'k', fn, 4)
+    assert all(isinstance(result, KeyError) for result in results)
+    assert flight.get_stats()['in_flight'] == 0
+
+
+def test_share_gives_duplicates_their_own_copy():
+    flight = app.SingleFlight('test', timeout=5, share=dict)
+    results = run_concurrently(flight, 'k', lambda: time.sleep(0.2) or {'a': 1}, 3)
+    assert all(result == {'a': 1} for result in results)
+    assert len({id(result) for result in results}) == 3
+
+
+def test_duplicate_times_out():
+    flight = app.SingleFlight('test', timeout=0.1)
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('k', release.wait))
+    leader.start()
+    while flight.get_stats()['in_flight'] == 0:
+        time.sleep(0.01)
+    with pytest.raises(app.SingleFlightTimeout):
+        flight.do('k', lambda: 'never called')
+    release.set()
+    leader.join()
+    assert flight.get_stats()['timeout'] == 1
+
+
+def test_different_keys_and_later_calls_run_separately():
+    flight = app.SingleFlight('test', timeout=5)
+    calls = []
+    assert flight.do('a', lambda: calls.append('a') or 1) == 1
+    assert flight.do('b', lambda: calls.append('b') or 2) == 2
+    assert flight.do('a', lambda: calls.append('a') or 3) == 3
+    assert calls == ['a', 'b', 'a']
+
+
+def test_async_duplicates_share_one_call():
+    async def main():
+        flight = app.AsyncSingleFlight('test', timeout=5)
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'value'
+
+        results = await asyncio.gather(*(flight.do('k', fn) for _ in range(5)))
+        return calls, results, flight.get_stats()
+
+    calls, results, stats = asyncio.run(main())
+    assert len(calls) == 1
+    assert results == ['value'] * 5
+    assert (stats['leader'], stats['shared'], stats['in_flight']) == (1, 4, 0)
+
+
+def test_async_leader_cancelled_does_not_cancel_the_call():
+    async def main():
+        flight = app.AsyncSingleFlight('test', timeout=5)
+
+        async def fn():
+            await asyncio.sleep(0.1)
+            return 'value'
+
+        leader = asyncio.ensure_future(flight.do('k', fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('k', fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(main()) == ('value', True)
+
+
+def test_async_error_and_timeout():
+    async def main():
+        flight = app.AsyncSingleFlight('test', timeout=0.05)
+
+        async def fails():
+            await asyncio.sleep(0.01)
+            raise KeyError('boom')
+
+        errors = await asyncio.gather(flight.do('e', fails), flight.do('e', fails), return_exceptions=True)
+
+        async def slow():
+            await asyncio.sleep(0.2)
+            return 'late'
+
+        leader = asyncio.ensure_future(flight.do('s', slow))
+        await asyncio.sleep(0)
+        with pytest.raises(app.SingleFlightTimeout):
+            await flight.do('s', slow)
+        return errors, await leader
+
+    errors, late = asyncio.run(main())
+    assert all(isinstance(error, KeyError) for error in errors)
+    assert late == 'late'
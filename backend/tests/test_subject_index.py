@@ -0,0 +1,99 @@
+"""SubjectIndex.top_k must return exactly the brute-force top k under the enhanced scorer."""
+import pytest
+
+import app
+
+CATALOG_SIZE = 3000
+
+
+@pytest.fixture(scope='module')
+def scorer():
+    return app.LightweightBookRecommender()
+
+
+@pytest.fixture(scope='module')
+def works(make_works):
+    works = {}
+    for work in make_works(CATALOG_SIZE, 11):
+        work_id = work['key'].split('/')[-1]
+        works[work_id] = dict(work, key=f"/works/{work_id}")
+    return works
+
+
+@pytest.fixture(scope='module')
+def index(scorer, works):
+    index = app.SubjectIndex(scorer.weights)
+    index.build(
+        ((work_id, work['subjects'], work.get('first_publish_date'), work['author_name'][0], work['edition_count'])
+         for work_id, work in works.items()),
+        scorer.extract_year
+    )
+    return index
+
+
+def ranked(index, scorer, works, input_ids, k, keep=None, min_score=None):
+    input_books = [works[work_id] for work_id in input_ids]
+    profile = scorer.build_reader_profile(input_books)
+    exclude_authors = {book['author_name'][0] for book in input_books}
+
+    def score_works(work_ids):
+        scores, _ = scorer.calculate_enhanced_similarity_batch([works[w] for w in work_ids], input_books, profile)
+        return [float(score) for score in scores]
+
+    def author_relation(name):
+        return scorer.calculate_author_relation({'author_name': [name]}, input_books, profile)
+
+    top = index.top_k(profile, k, score_works, author_relation, set(input_ids), exclude_authors,
+                      keep=keep, min_score=min_score)
+
+    # Brute force: every work sharing a subject with the reader, under the same exclusions
+    candidates = [work_id for work_id, work in works.items()
+                  if work_id not in input_ids and work['author_name'][0] not in exclude_authors
+                  and (keep is None or keep(work_id))]
+    scores, components = scorer.calculate_enhanced_similarity_batch(
+        [works[w] for w in candidates], input_books, profile
+    )
+    expected = sorted(
+        ((work_id, float(score)) for work_id, score, subject_match in zip(candidates, scores, components['subject_match'])
+         if subject_match > 0 and (min_score is None or round(score * 100, 1) >= min_score)),
+        key=lambda item: -item[1]
+    )
+    return top, expected
+
+
+def assert_exact(top, expected, k):
+    assert [score for _, score in top] == pytest.approx([score for _, score in expected[:k]], abs=1e-12)
+    # Which of several equal scores makes the cut is a tie-break; everything above the k-th must be there
+    if len(expected) > k:
+        cutoff = expected[k - 1][1]
+        assert {w for w, s in expected if s > cutoff + 1e-12} <= {w for w, _ in top}
+    else:
+        assert {w for w, _ in top} == {w for w, _ in expected}
+
+
+@pytest.mark.parametrize('input_ids', [['OL1W'], ['OL2W', 'OL3W', 'OL5W'], [f'OL{i}W' for i in range(10, 20)]])
+@pytest.mark.parametrize('k', [1, 10, 200])
+def test_top_k_matches_brute_force(index, scorer, works, input_ids, k):
+    top, expected = ranked(index, scorer, works, input_ids, k)
+    assert top
+    assert_exact(top, expected, k)
+
+
+def test_top_k_with_keep_and_min_score(index, scorer, works):
+    def keep(work_id):
+        return int(work_id[2:-1]) % 2 == 0
+
+    top, expected = ranked(index, scorer, works, ['OL4W', 'OL6W'], 25, keep=keep, min_score=30)
+    assert all(keep(work_id) and round(score * 100, 1) >= 30 for work_id, score in top)
+    assert_exact(top, expected, 25)
+
+
+def test_top_k_larger_than_matches(index, scorer, works):
+    top, expected = ranked(index, scorer, works, ['OL7W'], CATALOG_SIZE)
+    assert len(top) == len(expected)
+    assert_exact(top, expected, CATALOG_SIZE)
+
+
+def test_reader_without_subjects_gets_nothing(index, scorer):
+    profile = scorer.build_reader_profile([{'key': '/works/OL1W', 'title': 'Bare'}])
+    assert index.top_k(profile, 10, lambda ids: [0.5] * len(ids), lambda name: 0.1, set(), set()) == []
@@ -0,0 +1,113 @@
+"""TieredCache: TTL expiry and LRU eviction in memory, and the same rules in the shared SQLite tier."""
+import pytest
+
+import app
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'cache.sqlite3')
+
+
+def test_memory_entries_expire_after_ttl(clock):
+    cache = app.TieredCache('t', max_entries=10, ttl_seconds=60)
+    cache.set('a', {'v': 1})
+    cache.set('b', 2, ttl=5)
+    clock.now += 4.9
+    assert cache.get('a') == {'v': 1}
+    assert cache.get('b') == 2
+    clock.now += 0.2
+    assert cache.get('b') is None
+    clock.now += 55
+    assert cache.get('a') is None
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (2, 2, 2, 0)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = app.TieredCache('t', max_entries=2, ttl_seconds=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # Now most recently used
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_memory_tier_disabled():
+    cache = app.TieredCache('t', max_entries=0, ttl_seconds=60)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+    assert cache.get_stats().get('evictions', 0) == 0
+
+
+def test_disk_tier_is_shared_and_expires(clock, db_path):
+    writer = app.TieredCache('t', max_entries=10, ttl_seconds=60, db_path=db_path)
+    reader = app.TieredCache('t', max_entries=10, ttl_seconds=60, db_path=db_path)
+    other = app.TieredCache('other', max_entries=10, ttl_seconds=60, db_path=db_path)
+    writer.set('a', {'docs': [1]})
+    assert reader.get('a') == {'docs': [1]}
+    assert other.get('a') is None
+    assert reader.get_stats()['disk_hits'] == 1
+
+    writer.set('b', 2)
+    clock.now += 61
+    assert reader.get('b') is None
+    # Promoted into memory with the stored expiry, not a fresh one
+    assert reader.get('a') is None
+
+
+def test_disk_tier_prunes_expired_then_oldest(clock, db_path):
+    cache = app.TieredCache('t', max_entries=0, ttl_seconds=60, db_path=db_path, disk_max_entries=3)
+    cache.PRUNE_INTERVAL = 1
+    cache.set('short', 0, ttl=1)
+    clock.now += 2
+    for i in range(4):
+        cache.set(f'k{i}', i)
+        clock.now += 1
+    rows = cache._connect().execute(
+        "SELECT key FROM cache_entries WHERE namespace = 't' ORDER BY expires_at"
+    ).fetchall()
+    assert [key for (key,) in rows] == ['k1', 'k2', 'k3']
+    stats = cache.get_stats()
+    assert (stats['disk_expirations'], stats['disk_evictions']) == (1, 1)
+
+
+def test_peek_is_not_a_lookup(clock, db_path):
+    cache = app.TieredCache('t', max_entries=2, ttl_seconds=60, db_path=db_path)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    clock.now += 10
+    assert cache.peek('a') == (1, pytest.approx(50))
+    assert cache.peek('missing') is None
+    cache.set('c', 3)  # 'a' is still least recently used, so it goes
+    assert 'a' not in cache._entries
+    assert cache.peek('a') == (1, pytest.approx(50))  # Still on disk
+    clock.now += 51
+    assert cache.peek('b') is None
+    stats = cache.get_stats()
+    assert stats.get('hits', 0) == stats.get('misses', 0) == 0
+
+
+def test_delete_removes_both_tiers(db_path):
+    cache = app.TieredCache('t', max_entries=10, ttl_seconds=60, db_path=db_path)
+    cache.set('a', 1)
+    cache.delete('a')
+    assert cache.get('a') is None
+    assert app.TieredCache('t', max_entries=10, ttl_seconds=60, db_path=db_path).get('a') is None
@@ -0,0 +1,91 @@
+"""TitleIndex: exact and fuzzy title resolution, expiry of stored resolutions, and eviction once full."""
+import pytest
+
+import app
+
+TITLES = ['Dune', 'Emma', 'Ulysses', 'Beloved', 'Rebecca', 'Middlemarch', 'Frankenstein', 'Dracula',
+          'Persuasion', 'Neuromancer', 'Hyperion', 'Foundation']
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, 'time', clock)
+    return clock
+
+
+def doc(number, title):
+    return {'key': f'/works/OL{number}W', 'title': title, 'author_name': ['A. Smith']}
+
+
+def resolved(index, title):
+    found = index.lookup(title)
+    return found and found['key'].split('/')[-1]
+
+
+def test_exact_match_expires_and_is_renewed(clock):
+    index = app.TitleIndex(None, ttl_seconds=100)
+    index.add('The Dune', doc(1, 'Dune'))
+    assert index.lookup('dune') == doc(1, 'Dune')
+    clock.now += 100
+    assert index.lookup('Dune') is None
+    assert resolved(index, 'Dunes') is None  # Expired entries don't match fuzzily either
+    index.add('Dune', doc(1, 'Dune'))
+    assert resolved(index, 'Dune') == 'OL1W'
+    stats = index.get_stats()
+    assert (stats['exact_hits'], stats['expired']) == (2, 1)
+
+
+def test_fuzzy_match_needs_similarity_and_a_clear_winner(clock):
+    index = app.TitleIndex(None, min_similarity=0.75, min_margin=0.1)
+    index.add('Middlemarch', doc(1, 'Middlemarch'))
+    index.add('Frankenstein', doc(2, 'Frankenstein'))
+    assert resolved(index, 'Midlemarch') == 'OL1W'
+    assert resolved(index, 'Frankenstien') is None  # Similarity 0.69
+
+    index.add('Harry Potter and the Goblet of Fire', doc(3, 'Harry Potter and the Goblet of Fire'))
+    index.add('Harry Potter and the Goblet of Fires', doc(3, 'Harry Potter and the Goblet of Fires'))
+    # Both near titles belong to the same work, so there is no runner-up
+    assert resolved(index, 'harry potter and the goblet of fir') == 'OL3W'
+    index.add('Harry Potter and the Goblet of Fyre', doc(4, 'Harry Potter and the Goblet of Fyre'))
+    assert resolved(index, 'harry potter and the goblet of fir') is None
+    stats = index.get_stats()
+    assert (stats['fuzzy_hits'], stats['misses'], stats['ambiguous']) == (2, 1, 1)
+
+
+def test_full_index_evicts_least_recently_used(clock):
+    index = app.TitleIndex(None, max_entries=10)
+    for number, title in enumerate(TITLES[:10], 1):
+        index.add(title, doc(number, title))
+        clock.now += 1
+    assert resolved(index, 'Dune') == 'OL1W'  # Now the most recently used
+    index.add(TITLES[10], doc(11, TITLES[10]))
+    assert len(index) == 10
+    assert index.get_stats()['evictions'] == 1
+    assert resolved(index, 'Emma') is None
+    # Renumbered entries still match through their remapped postings
+    assert resolved(index, 'Dune') == 'OL1W'
+    assert resolved(index, 'Midlemarch') == 'OL6W'
+    assert resolved(index, 'Hyperions') == 'OL11W'
+
+
+def test_full_index_drops_expired_entries_first(clock):
+    index = app.TitleIndex(None, max_entries=10, ttl_seconds=100)
+    for number, title in enumerate(TITLES[:10], 1):
+        index.add(title, doc(number, title))
+        if number == 5:
+            clock.now += 50
+    clock.now += 60  # The first five have expired
+    index.add(TITLES[10], doc(11, TITLES[10]))
+    assert len(index) == 6
+    stats = index.get_stats()
+    assert (stats['expirations'], stats.get('evictions', 0)) == (5, 0)
+    assert [resolved(index, title) for title in TITLES[5:11]] == [f'OL{number}W' for number in range(6, 12)]
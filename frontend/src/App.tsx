@@ -40,6 +40,8 @@ function App() {
   
   // Save input books for "load more" requests
   const [lastSubmittedBooks, setLastSubmittedBooks] = useState<string[]>([]);
+  // Token for the server-side scored results, lets "load more" skip recomputation
+  const [resultToken, setResultToken] = useState<string | null>(null);
 
   // Handle mobile viewport height
   useEffect(() => {
@@ -112,7 +114,7 @@ function App() {
           'Content-Type': 'application/json',
           'Accept': 'application/json'
         },
-        body: JSON.stringify({ books }),
+        body: JSON.stringify(isLoadMore && resultToken ? { books, result_token: resultToken } : { books }),
         signal: controller.signal
       });
   
@@ -137,6 +139,10 @@ function App() {
         throw new Error(data.error);
       }
 
+      if (data.result_token) {
+        setResultToken(data.result_token);
+      }
+
       if (data.recommendations?.length) {
         // Save pagination data
         if (data.pagination) {
@@ -195,7 +201,7 @@ function App() {
       loadingStateSetter(false);
       if (!isLoadMore) messageSetter("");
     }
-}, [retryCount, setIsLoading, setIsLoadingMore, setLoadingMessage, setRecommendations, setError, setCurrentPage, setPagination, setHasMore, setRetryCount, triggerConfetti]);
+}, [retryCount, resultToken, setIsLoading, setIsLoadingMore, setLoadingMessage, setRecommendations, setError, setCurrentPage, setPagination, setHasMore, setRetryCount, triggerConfetti]);
 
   const handleBookSubmit = async (books: string[]) => {
     if (books.length !== 5) {
@@ -209,6 +215,7 @@ function App() {
     setPagination(null);
     setHasMore(false);
     setError(null);
+    setResultToken(null);
     
     // Save the books for potential "load more" requests
     setLastSubmittedBooks(books);